@@ -33,13 +33,15 @@ import zipfile
 import hashlib
 import torch
 import multiprocessing
+import queue
+import threading
 
 try:
     from typing import Literal
 except ImportError:
     from typing_extensions import Literal
 
-from typing import Optional, Union, Text
+from typing import Optional, Union, Text, Dict
 from pathlib import Path
 from os.path import basename
 import numpy as np
@@ -48,11 +50,13 @@ from glob import glob
 from pyannote.database import FileFinder
 from pyannote.database import get_protocol
 from pyannote.database import get_annotated
+from pyannote.database import get_unique_identifier
 from pyannote.database import Subset
 from pyannote.audio.features.utils import get_audio_duration
 from sortedcontainers import SortedDict
 from torch.utils.tensorboard import SummaryWriter
 from functools import partial
+from pyannote.core import SlidingWindow
 from pyannote.core.utils.helper import get_class_by_name
 import warnings
 from pyannote.audio.train.task import Task
@@ -61,6 +65,7 @@ from pyannote.audio.features import Pretrained
 from pyannote.audio.features import Precomputed
 from pyannote.audio.features.wrapper import Wrapper
 from pyannote.audio.applications.config import load_config
+from pyannote.audio.applications.config import FEATURE_DEFAULT
 
 
 def create_zip(validate_dir: Path):
@@ -516,32 +521,213 @@ class Application:
 # TODO: add support for torch.hub models directly in docopt
 
 
-def apply_pretrained(
+def export_torchscript(
+    validate_dir: Path,
+    epoch: Optional[int] = None,
+    duration: Optional[float] = None,
+) -> Path:
+    """Export pre-trained model to a self-contained TorchScript file
+
+    Model is scripted (or traced, when it cannot be scripted) and saved along
+    with everything needed to apply it (feature extraction, preprocessors,
+    chunk duration, output resolution, pipeline parameters), so that it can
+    be loaded with `Pretrained(validate_dir, backend="torchscript")` without
+    rebuilding it from configuration files.
+
+    Parameters
+    ----------
+    validate_dir : Path
+    epoch : `int`, optional
+        Defaults to reading epoch in validate_dir/params.yml.
+    duration : `float`, optional
+        Chunk duration. Defaults to the one used during training.
+
+    Returns
+    -------
+    path : Path
+        Path to exported model (validate_dir/export/{epoch}.pt).
+
+    Raises
+    ------
+    RuntimeError
+        When exported model does not give the same output as the original one
+        (which might happen with traced models), in which case it is not saved.
+    """
+
+    pretrained = Pretrained(
+        validate_dir=validate_dir, epoch=epoch, duration=duration, device="cpu"
+    )
+    model = pretrained.model_
+    feature_extraction = pretrained.feature_extraction_
+
+    # example of (two) input chunks
+    n_frames = feature_extraction.sliding_window.samples(
+        pretrained.duration, mode="center"
+    )
+    X = torch.randn(2, n_frames, feature_extraction.dimension)
+
+    try:
+        module = torch.jit.script(model)
+    except Exception as e:
+        msg = (
+            f"Could not script model ({type(e).__name__}: {e}). "
+            f"Falling back to tracing."
+        )
+        warnings.warn(msg)
+        with torch.no_grad():
+            module = torch.jit.trace(model, X, check_trace=False)
+
+    # traced models might be specific to the number of frames used for
+    # tracing. make sure this is not the case as shorter chunks are used
+    # for files shorter than chunk duration.
+    short_X = torch.randn(2, n_frames // 2 + 1, feature_extraction.dimension)
+    with torch.no_grad():
+        for X, chunks in [(X, "chunks"), (short_X, "shorter chunks")]:
+            if not torch.allclose(model(X), module(X), atol=1e-4):
+                msg = (
+                    f"Exported model does not behave like the original model on "
+                    f"{chunks} (original chunk duration is {pretrained.duration:g}s): "
+                    f"it was not saved."
+                )
+                raise RuntimeError(msg)
+
+    root_dir = pretrained.validate_dir.parents[3]
+    with open(root_dir / "config.yml", "r") as fp:
+        config = yaml.load(fp, Loader=yaml.SafeLoader)
+
+    resolution = model.resolution
+    if isinstance(resolution, SlidingWindow):
+        resolution = {
+            "start": resolution.start,
+            "duration": resolution.duration,
+            "step": resolution.step,
+        }
+
+    metadata = {
+        "epoch": pretrained.epoch_,
+        "feature_extraction": config.get("feature_extraction", FEATURE_DEFAULT),
+        "preprocessors": config.get("preprocessors", {}),
+        "task": {
+            "duration": pretrained.duration,
+            "min_duration": pretrained.min_duration,
+        },
+        "resolution": resolution,
+        "alignment": model.alignment,
+    }
+
+    try:
+        metadata["classes"] = list(model.classes)
+    except AttributeError as e:
+        pass
+    try:
+        metadata["dimension"] = model.dimension
+    except AttributeError as e:
+        pass
+    try:
+        metadata["params"] = pretrained.pipeline_params_
+    except AttributeError as e:
+        pass
+
+    path = pretrained.validate_dir / "export" / f"{pretrained.epoch_:04d}.pt"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    torch.jit.save(
+        module,
+        str(path),
+        _extra_files={"metadata.yml": yaml.dump(metadata, default_flow_style=False)},
+    )
+
+    return path
+
+
+def quantization_drift(
     validate_dir: Path,
     protocol_name: Text,
-    subset: Subset = "test",
+    subset: Subset = "development",
+    epoch: Optional[int] = None,
     duration: Optional[float] = None,
     step: float = 0.25,
-    device: Optional[torch.device] = None,
     batch_size: int = 32,
-    pretrained: Optional[str] = None,
-    Pipeline: type = None,
-    **kwargs,
-):
-    """Apply pre-trained model
+) -> Dict:
+    """Compare output of dynamically quantized model with the original one
 
     Parameters
     ----------
     validate_dir : Path
     protocol_name : `str`
     subset : 'train' | 'development' | 'test', optional
-        Defaults to 'test'.
+        Defaults to 'development'.
+    epoch : `int`, optional
+        Defaults to reading epoch in validate_dir/params.yml.
     duration : `float`, optional
     step : `float`, optional
-    device : `torch.device`, optional
     batch_size : `int`, optional
-    pretrained : `str`, optional
-    Pipeline : `type`
+
+    Returns
+    -------
+    report : dict
+        "max" (resp. "mean") is the maximum (resp. average) absolute
+        difference between outputs of both models, over all frames of all
+        files. "float_time" and "quantized_time" are the total processing
+        time of both models, in seconds.
+    """
+
+    params = {
+        "validate_dir": validate_dir,
+        "epoch": epoch,
+        "duration": duration,
+        "step": step,
+        "batch_size": batch_size,
+        "device": "cpu",
+    }
+    original = Pretrained(**params)
+    quantized = Pretrained(quantize="dynamic", **params)
+
+    protocol = _get_protocol(original, protocol_name)
+
+    max_drift, sum_drift, n_values = 0.0, 0.0, 0
+    float_time, quantized_time = 0.0, 0.0
+
+    files = getattr(protocol, subset)()
+    for current_file in tqdm(iterable=files, desc=f"{subset.title()}", unit="file"):
+
+        t = time.time()
+        expected = original(current_file).data
+        float_time += time.time() - t
+
+        t = time.time()
+        actual = quantized(current_file).data
+        quantized_time += time.time() - t
+
+        drift = np.abs(actual - expected)
+        max_drift = max(max_drift, float(np.max(drift)))
+        sum_drift += float(np.sum(drift))
+        n_values += drift.size
+
+    return {
+        "max": max_drift,
+        "mean": sum_drift / max(1, n_values),
+        "float_time": float_time,
+        "quantized_time": quantized_time,
+    }
+
+
+def _load_pretrained(
+    validate_dir: Path,
+    pretrained: Optional[str] = None,
+    duration: Optional[float] = None,
+    step: float = 0.25,
+    device: Optional[torch.device] = None,
+    batch_size: int = 32,
+    num_threads: Optional[int] = None,
+):
+    """Load pre-trained model
+
+    Returns
+    -------
+    pretrained : `Pretrained` or `Wrapper`
+        Pre-trained model.
+    output_dir : `Path`
+        Directory where its output should be stored.
     """
 
     if pretrained is None:
@@ -551,6 +737,7 @@ def apply_pretrained(
             step=step,
             batch_size=batch_size,
             device=device,
+            num_threads=num_threads,
         )
         output_dir = validate_dir / "apply" / f"{pretrained.epoch_:04d}"
     else:
@@ -567,6 +754,193 @@ def apply_pretrained(
             batch_size=batch_size,
             device=device,
         )
+        pretrained.num_threads = num_threads
+
+    return pretrained, output_dir
+
+
+def _get_protocol(pretrained, protocol_name: Text):
+    """Get protocol, with preprocessors needed by pre-trained model"""
+    preprocessors = getattr(pretrained, "preprocessors_", dict())
+    if "audio" not in preprocessors:
+        preprocessors["audio"] = FileFinder()
+    if "duration" not in preprocessors:
+        preprocessors["duration"] = get_audio_duration
+    return get_protocol(protocol_name, preprocessors=preprocessors)
+
+
+def _apply_pretrained_worker(
+    rank: int,
+    n_jobs: int,
+    protocol_name: Text,
+    subset: Subset,
+    block_duration: float = None,
+    pretrained=None,
+    output_dir: Path = None,
+    **load_params,
+):
+    """Apply pre-trained model on every `n_jobs`th file, starting at `rank`
+
+    Files whose output has already been dumped are skipped. Outputs are
+    dumped by a background thread, and per-file timing is appended to
+    "timing.txt" file in output directory.
+
+    Parameters
+    ----------
+    rank : int
+        Worker index.
+    n_jobs : int
+        Number of workers.
+    protocol_name : `str`
+    subset : 'train' | 'development' | 'test'
+    block_duration : `float`, optional
+        Files longer than that are processed block by block. Defaults to
+        processing whole files. See `Pretrained.iter_outputs`.
+    pretrained : `Pretrained` or `Wrapper`, optional
+        Pre-trained model. Defaults to loading it with `load_params`.
+    output_dir : `Path`, optional
+        Output directory. Must be provided when `pretrained` is.
+    **load_params
+        See `_load_pretrained`.
+    """
+
+    # load model once per worker
+    if pretrained is None:
+        pretrained, output_dir = _load_pretrained(**load_params)
+
+    # metadata has already been written by the main process. files are
+    # filtered and dumped by two different threads: use one instance each
+    precomputed = Precomputed(root_dir=output_dir)
+    done = Precomputed(root_dir=output_dir)
+
+    protocol = _get_protocol(pretrained, protocol_name)
+
+    def files():
+        for f, current_file in enumerate(getattr(protocol, subset)()):
+            if f % n_jobs != rank:
+                continue
+            # resume where a previous (interrupted) run stopped
+            if current_file in done:
+                continue
+            yield current_file
+
+    # dump outputs in a background thread
+    outputs, errors = queue.Queue(maxsize=8), []
+
+    def write():
+        while True:
+            item = outputs.get()
+            if item is None:
+                break
+            # keep consuming the queue after a failure so that it never blocks
+            if errors:
+                continue
+            try:
+                precomputed.dump(*item)
+            except Exception as e:
+                errors.append(e)
+
+    writer = threading.Thread(target=write, daemon=True)
+    writer.start()
+
+    timing_txt = output_dir / "timing.txt"
+    progress = tqdm(desc=f"{subset.title()} #{rank}", unit="file", position=rank)
+
+    try:
+        t = time.time()
+        for current_file, fX in pretrained.iter_outputs(
+            files(), block_duration=block_duration
+        ):
+
+            if errors:
+                raise errors[0]
+            outputs.put((current_file, fX))
+
+            # keep track of processing time of each file
+            elapsed, t = time.time() - t, time.time()
+            uri = get_unique_identifier(current_file)
+            duration = current_file["duration"]
+            with open(timing_txt, "a") as fp:
+                fp.write(f"{uri}\t{duration:.3f}\t{elapsed:.3f}\n")
+
+            progress.update(1)
+
+    finally:
+        outputs.put(None)
+        writer.join()
+        progress.close()
+
+    if errors:
+        raise errors[0]
+
+
+def apply_pretrained(
+    validate_dir: Path,
+    protocol_name: Text,
+    subset: Subset = "test",
+    duration: Optional[float] = None,
+    step: float = 0.25,
+    device: Optional[torch.device] = None,
+    batch_size: int = 32,
+    pretrained: Optional[str] = None,
+    Pipeline: type = None,
+    storage: Text = "npy",
+    dtype: Text = "float32",
+    value_range=None,
+    n_jobs: int = 1,
+    block_duration: float = 600.0,
+    **kwargs,
+):
+    """Apply pre-trained model
+
+    Parameters
+    ----------
+    validate_dir : Path
+    protocol_name : `str`
+    subset : 'train' | 'development' | 'test', optional
+        Defaults to 'test'.
+    duration : `float`, optional
+    step : `float`, optional
+    device : `torch.device`, optional
+    batch_size : `int`, optional
+    pretrained : `str`, optional
+    Pipeline : `type`
+    storage : {"npy", "packed"}, optional
+        Storage backend of raw model output. See `Precomputed`.
+        Defaults to "npy".
+    dtype : {"float32", "float16", "int8", "uint8"}, optional
+        Storage type of raw model output. See `Precomputed`.
+        Defaults to "float32".
+    value_range : (min, max) tuple, optional
+        Range of values covered by "int8" and "uint8" storage types.
+        See `Precomputed`.
+    n_jobs : `int`, optional
+        Number of worker processes, each of them loading its own copy of the
+        model. Defaults to 1.
+    block_duration : `float`, optional
+        Files longer than that are processed block by block so that memory
+        usage does not grow with their duration. Defaults to 10 minutes.
+
+    Notes
+    -----
+    Files whose output has already been dumped are skipped, so that one can
+    resume an interrupted run by running it again.
+    """
+
+    load_params = {
+        "validate_dir": validate_dir,
+        "pretrained": pretrained,
+        "duration": duration,
+        "step": step,
+        "device": device,
+        "batch_size": batch_size,
+    }
+
+    # share CPUs between workers
+    if n_jobs > 1:
+        load_params["num_threads"] = max(1, multiprocessing.cpu_count() // n_jobs)
+
+    pretrained, output_dir = _load_pretrained(**load_params)
 
     params = {}
     try:
@@ -581,21 +955,45 @@ def apply_pretrained(
     # create metadata file at root that contains
     # sliding window and dimension information
     precomputed = Precomputed(
-        root_dir=output_dir, sliding_window=pretrained.sliding_window, **params
+        root_dir=output_dir,
+        sliding_window=pretrained.sliding_window,
+        storage=storage,
+        dtype=dtype,
+        value_range=value_range,
+        **params,
     )
 
-    # file generator
-    preprocessors = getattr(pretrained, "preprocessors_", dict())
-    if "audio" not in preprocessors:
-        preprocessors["audio"] = FileFinder()
-    if "duration" not in preprocessors:
-        preprocessors["duration"] = get_audio_duration
-    protocol = get_protocol(protocol_name, preprocessors=preprocessors)
+    if n_jobs == 1:
+        _apply_pretrained_worker(
+            0,
+            1,
+            protocol_name,
+            subset,
+            block_duration=block_duration,
+            pretrained=pretrained,
+            output_dir=output_dir,
+        )
 
-    files = getattr(protocol, subset)()
-    for current_file in tqdm(iterable=files, desc=f"{subset.title()}", unit="file"):
-        fX = pretrained(current_file)
-        precomputed.dump(current_file, fX)
+    else:
+        # use "spawn" as forking a process that already uses torch might hang
+        context = multiprocessing.get_context("spawn")
+        workers = [
+            context.Process(
+                target=_apply_pretrained_worker,
+                args=(rank, n_jobs, protocol_name, subset),
+                kwargs=dict(load_params, block_duration=block_duration),
+            )
+            for rank in range(n_jobs)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        failed = [rank for rank, worker in enumerate(workers) if worker.exitcode]
+        if failed:
+            msg = f"Worker(s) {failed} failed: run the same command again to resume."
+            raise RuntimeError(msg)
 
     # do not proceed with the full pipeline
     # when there is no such thing for current task
@@ -610,6 +1008,7 @@ def apply_pretrained(
         return
 
     # instantiate pipeline
+    protocol = _get_protocol(pretrained, protocol_name)
     pipeline = Pipeline(scores=output_dir)
     pipeline.instantiate(pipeline_params)
 
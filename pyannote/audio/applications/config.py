@@ -61,6 +61,49 @@ def merge_cfg(pretrained_cfg, cfg):
     return pretrained_cfg
 
 
+FEATURE_DEFAULT = {"name": "RawAudio", "params": {"sample_rate": 16000}}
+
+
+def load_preprocessors(preprocessors_cfg: Dict) -> Dict:
+    """Instantiate preprocessors from "preprocessors" configuration section"""
+
+    preprocessors = dict()
+
+    for key, preprocessor in preprocessors_cfg.items():
+        # preprocessors:
+        #    key:
+        #       name: package.module.ClassName
+        #       params:
+        #          param1: value1
+        #          param2: value2
+        if isinstance(preprocessor, dict):
+            Klass = get_class_by_name(preprocessor["name"])
+            preprocessors[key] = Klass(**preprocessor.get("params", {}))
+            continue
+
+        try:
+            # preprocessors:
+            #    key: /path/to/database.yml
+            preprocessors[key] = FileFinder(database_yml=preprocessor)
+
+        except FileNotFoundError as e:
+            # preprocessors:
+            #    key: /path/to/{uri}.wav
+            preprocessors[key] = preprocessor
+
+    return preprocessors
+
+
+def load_feature_extraction(feature_cfg: Dict, augmentation=None):
+    """Instantiate feature extraction from "feature_extraction" configuration section"""
+
+    FeatureExtraction = get_class_by_name(
+        feature_cfg["name"], default_module_name="pyannote.audio.features"
+    )
+    feature_params = feature_cfg.get("params", {})
+    return FeatureExtraction(**feature_params, augmentation=augmentation)
+
+
 def load_config(
     config_yml: Path,
     training: bool = False,
@@ -113,31 +156,7 @@ def load_config(
             yaml.dump(cfg, fp, default_flow_style=False)
 
     # preprocessors
-    preprocessors = dict()
-
-    for key, preprocessor in cfg.get("preprocessors", {}).items():
-        # preprocessors:
-        #    key:
-        #       name: package.module.ClassName
-        #       params:
-        #          param1: value1
-        #          param2: value2
-        if isinstance(preprocessor, dict):
-            Klass = get_class_by_name(preprocessor["name"])
-            preprocessors[key] = Klass(**preprocessor.get("params", {}))
-            continue
-
-        try:
-            # preprocessors:
-            #    key: /path/to/database.yml
-            preprocessors[key] = FileFinder(database_yml=preprocessor)
-
-        except FileNotFoundError as e:
-            # preprocessors:
-            #    key: /path/to/{uri}.wav
-            preprocessors[key] = preprocessor
-
-    cfg["preprocessors"] = preprocessors
+    cfg["preprocessors"] = load_preprocessors(cfg.get("preprocessors", {}))
 
     # scheduler
     SCHEDULER_DEFAULT = {
@@ -195,14 +214,9 @@ def load_config(
     cfg["callbacks"] = callbacks
 
     # feature extraction
-    FEATURE_DEFAULT = {"name": "RawAudio", "params": {"sample_rate": 16000}}
     feature_cfg = cfg.get("feature_extraction", FEATURE_DEFAULT)
-    FeatureExtraction = get_class_by_name(
-        feature_cfg["name"], default_module_name="pyannote.audio.features"
-    )
-    feature_params = feature_cfg.get("params", {})
-    cfg["feature_extraction"] = FeatureExtraction(
-        **feature_params, augmentation=augmentation
+    cfg["feature_extraction"] = load_feature_extraction(
+        feature_cfg, augmentation=augmentation
     )
 
     # task
@@ -117,9 +117,8 @@ def process_current_file(
         return e
 
     uri = get_unique_identifier(current_file)
-    path = precomputed.get_path(current_file)
 
-    if os.path.exists(path):
+    if current_file in precomputed:
         return
 
     try:
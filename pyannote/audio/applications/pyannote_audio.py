@@ -35,6 +35,7 @@ Usage:
   pyannote-audio (sad | scd | ovl | emb | dom) train    [--cpu | --gpu] [options] <root>     <protocol>
   pyannote-audio (sad | scd | ovl | emb | dom) validate [--cpu | --gpu] [options] <train>    <protocol>
   pyannote-audio (sad | scd | ovl | emb | dom) apply    [--cpu | --gpu] [options] <validate> <protocol>
+  pyannote-audio (sad | scd | ovl | emb | dom) export   [options] <validate>
   pyannote-audio -h | --help
   pyannote-audio --version
 
@@ -97,6 +98,11 @@ Running a complete speech activity detection experiment on the provided
         * (depending on the task) a file "${DATABASE}.test.eval" containing the
           evaluation result computed with pyannote.metrics.
 
+    * This will export the best model (according to the validation step) to
+      a self-contained TorchScript file (e.g. export/0125.pt) that can be
+      loaded with Pretrained(validate_dir, backend="torchscript"):
+      $ pyannote-audio sad export ${PWD}
+
 pyannote.database support
 ~~~~~~~~~~~~~~~~~~~~~~~~~
 
@@ -206,7 +212,9 @@ Common options
 
   --parallel=<n_jobs>     Use at most that many threads for generating training
                           samples or validating files. Defaults to using all
-                          CPUs but one.
+                          CPUs but one. When applying a model, use that many
+                          worker processes (each of them loading the model).
+                          Defaults to one worker in that case.
 
 
 Speaker embedding
@@ -229,6 +237,24 @@ Pretrained model options
                           This option can also be used to apply a pretrained
                           model. See description of <validate> for more details.
 
+Inference options
+~~~~~~~~~~~~~~~~~
+
+  --packed                Store raw output of the model in a few large shard
+                          files instead of one numpy array per file. This is
+                          much more efficient for large collections of short
+                          files. Output can still be loaded with
+                          pyannote.audio.features.Precomputed API.
+
+  --dtype=<dtype>         Store raw output of the model with this type. Use
+                          "float16" to halve the size of stored output, or
+                          "int8" or "uint8" (with --value-range) to quantize it
+                          [default: float32].
+
+  --value-range=<range>   Range of raw output of the model, as "min,max" (e.g.
+                          "0,1" for probabilities). Output is clipped to that
+                          range. Mandatory with "int8" or "uint8" --dtype.
+
 Validation options
 ~~~~~~~~~~~~~~~~~~
 
@@ -267,6 +293,7 @@ import multiprocessing
 
 import torch
 from .base import apply_pretrained
+from .base import export_torchscript
 from .speech_detection import SpeechActivityDetection
 from .change_detection import SpeakerChangeDetection
 from .overlap_detection import OverlapDetection
@@ -438,4 +465,51 @@ def main():
 
         params["pretrained"] = arg["--pretrained"]
 
+        params["storage"] = "packed" if arg["--packed"] else "npy"
+
+        # check quantization options now rather than after loading the model
+        dtype = arg["--dtype"]
+        if dtype not in ("float32", "float16", "int8", "uint8"):
+            msg = (
+                f'Unsupported --dtype ({dtype}): use "float32", "float16", '
+                f'"int8", or "uint8".'
+            )
+            raise ValueError(msg)
+        params["dtype"] = dtype
+
+        value_range = arg["--value-range"]
+        if value_range is not None:
+            try:
+                low, high = (float(v) for v in value_range.split(","))
+            except ValueError:
+                msg = (
+                    f'--value-range must be formatted as "min,max" '
+                    f"(is: {value_range})."
+                )
+                raise ValueError(msg)
+            if low >= high:
+                msg = f"Empty --value-range ({value_range})."
+                raise ValueError(msg)
+            value_range = (low, high)
+        elif dtype in ("int8", "uint8"):
+            msg = f'Please provide --value-range when using "{dtype}" --dtype.'
+            raise ValueError(msg)
+        params["value_range"] = value_range
+
+        # loading one model per worker is expensive: do not use all CPUs
+        # unless explicitly asked to
+        n_jobs = arg["--parallel"]
+        params["n_jobs"] = 1 if n_jobs is None else int(n_jobs)
+
         apply_pretrained(validate_dir, protocol, **params)
+
+    if arg["export"]:
+
+        validate_dir = Path(arg["<validate>"]).expanduser().resolve(strict=True)
+
+        duration = arg["--duration"]
+        if duration is not None:
+            duration = float(duration)
+
+        path = export_torchscript(validate_dir, duration=duration)
+        print(f"Model exported to {path}.")
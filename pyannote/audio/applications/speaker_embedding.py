@@ -42,11 +42,8 @@ from pyannote.database import FileFinder
 from pyannote.database.protocol import SpeakerDiarizationProtocol
 from pyannote.database.protocol import SpeakerVerificationProtocol
 
-import scipy.optimize
-from scipy.cluster.hierarchy import fcluster
 from pyannote.core.utils.hierarchy import linkage
 
-from pyannote.core.utils.distance import pdist
 from pyannote.core.utils.distance import cdist
 from pyannote.audio.features.precomputed import Precomputed
 
@@ -55,6 +52,7 @@ from pyannote.metrics.diarization import DiarizationPurityCoverageFMeasure
 
 from pyannote.audio.features import Pretrained
 from pyannote.audio.features.utils import get_audio_duration
+from pyannote.audio.utils.sweep import ClusteringThresholdSweep
 
 
 class SpeakerEmbedding(Application):
@@ -114,16 +112,20 @@ class SpeakerEmbedding(Application):
 
     @staticmethod
     def get_embedding(file, pretrained):
-        emb = []
+        emb, counts = [], []
         for f in file.files():
             if isinstance(f["try_with"], Segment):
                 segments = [f["try_with"]]
             else:
                 segments = f["try_with"]
-            for segment in segments:
-                emb.append(pretrained.crop(f, segment, mode="center"))
+            e, c = pretrained.embed_segments(f, segments, return_counts=True)
+            emb.append(e)
+            counts.append(c)
 
-        return np.mean(np.vstack(emb), axis=0, keepdims=True)
+        # average of all chunk embeddings: segments are weighted by their
+        # number of chunks (i.e. longer segments weigh more)
+        weights = np.hstack(counts)
+        return np.average(np.vstack(emb), axis=0, weights=weights)[np.newaxis]
 
     def _validate_epoch_verification(
         self,
@@ -221,8 +223,9 @@ class SpeakerEmbedding(Application):
             preprocessors["duration"] = get_audio_duration
         _protocol = get_protocol(protocol, preprocessors=preprocessors)
 
-        Z, t = dict(), dict()
-        min_d, max_d = np.inf, -np.inf
+        # purity/coverage for every possible threshold
+        _metric = DiarizationPurityCoverageFMeasure(weighted=False)
+        sweep = ClusteringThresholdSweep(weighted=_metric.weighted)
 
         for current_file in getattr(_protocol, subset)():
 
@@ -249,41 +252,32 @@ class SpeakerEmbedding(Application):
             X_ = np.array(X_)
             # apply hierarchical agglomerative clustering
             # all the way up to just one cluster (ie complete dendrogram)
-            D = pdist(X_, metric=metric)
-            min_d = min(np.min(D), min_d)
-            max_d = max(np.max(D), max_d)
-
-            Z[uri] = linkage(X_, method="pool", metric=metric)
-            t[uri] = np.array(t_)
-
-        def fun(threshold):
-
-            _metric = DiarizationPurityCoverageFMeasure(weighted=False)
-
-            for current_file in getattr(_protocol, subset)():
-
-                uri = get_unique_identifier(current_file)
-                uem = get_annotated(current_file)
-                reference = current_file["annotation"]
-
-                clusters = fcluster(Z[uri], threshold, criterion="distance")
-
-                hypothesis = Annotation(uri=uri)
-                for (start_time, end_time), cluster in zip(t[uri], clusters):
-                    hypothesis[Segment(start_time, end_time)] = cluster
-
-                _ = _metric(reference, hypothesis, uem=uem)
-
-            return 1.0 - abs(_metric)
+            Z = linkage(X_, method="pool", metric=metric)
+
+            # co-occurrence between reference speakers and speech turns, as
+            # computed by the metric with each speech turn in its own cluster
+            leaves = Annotation(uri=uri)
+            for i, turn in enumerate(t_):
+                leaves[turn] = i
+            reference, leaves = _metric.uemify(
+                reference,
+                leaves,
+                uem=uem,
+                collar=_metric.collar,
+                skip_overlap=_metric.skip_overlap,
+            )
+            labels = leaves.labels()
+            cooccurrence = np.zeros((len(reference.labels()), len(t_)))
+            cooccurrence[:, labels] = reference * leaves
+            present = np.zeros(len(t_), dtype=bool)
+            present[labels] = True
 
-        res = scipy.optimize.minimize_scalar(
-            fun, bounds=(0.0, 1.0), method="bounded", options={"maxiter": 10}
-        )
+            sweep.add(Z, cooccurrence, present=present)
 
-        threshold = res.x.item()
+        threshold, fscore = sweep.best(bounds=(0.0, 1.0))
 
         return {
             "metric": "diarization_fscore",
             "minimize": False,
-            "value": float(1.0 - res.fun),
+            "value": fscore,
         }
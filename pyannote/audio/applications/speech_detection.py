@@ -32,6 +32,7 @@ import scipy.optimize
 from .base_labeling import BaseLabeling
 from pyannote.database import get_annotated
 from pyannote.audio.features import Pretrained
+from pyannote.audio.utils.sweep import DetectionThresholdSweep
 from pyannote.audio.pipeline import (
     SpeechActivityDetection as SpeechActivityDetectionPipeline,
 )
@@ -79,6 +80,17 @@ class SpeechActivityDetection(BaseLabeling):
         # pipeline
         pipeline = self.Pipeline(scores="@scores", fscore=True)
 
+        # frame-level sweep over all thresholds at once. it ignores minimum
+        # durations below and is therefore only used as a starting point
+        sweep = DetectionThresholdSweep()
+        for current_file in validation_data:
+            sweep.add(
+                pipeline.get_probability(current_file),
+                pipeline.get_reference(current_file),
+                get_annotated(current_file),
+            )
+        seed, _ = sweep.best()
+
         def fun(threshold):
             pipeline.instantiate(
                 {
@@ -100,16 +112,21 @@ class SpeechActivityDetection(BaseLabeling):
 
             return 1.0 - abs(metric)
 
+        # refine around seed threshold
+        bounds = (max(0.0, seed - 0.1), min(1.0, seed + 0.1))
         res = scipy.optimize.minimize_scalar(
-            fun, bounds=(0.0, 1.0), method="bounded", options={"maxiter": 10}
+            fun, bounds=bounds, method="bounded", options={"maxiter": 4}
         )
 
-        threshold = res.x.item()
+        threshold, value = res.x.item(), res.fun
+        seed_value = fun(seed)
+        if seed_value < value:
+            threshold, value = seed, seed_value
 
         return {
             "metric": self.validation_criterion(None),
             "minimize": False,
-            "value": float(1.0 - res.fun),
+            "value": float(1.0 - value),
             "pipeline": pipeline.instantiate(
                 {
                     "onset": threshold,
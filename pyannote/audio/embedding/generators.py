@@ -194,10 +194,11 @@ class SpeechSegmentGenerator(BatchGenerator):
 
         labels = list(self.data_)
 
-        # batch_counter counts samples in current batch.
-        # as soon as it reaches batch_size, a new random duration is selected
-        # so that the next batch will use a different chunk duration
-        batch_counter = 0
+        # chunks (along with their file and label) of current batch. as soon
+        # as it is complete, features of all chunks are extracted at once and
+        # a new random duration is selected so that the next batch will use a
+        # different chunk duration
+        batch = []
         batch_size = self.batch_size
         batch_duration = self.min_duration + np.random.rand() * (
             self.duration - self.min_duration
@@ -232,28 +233,30 @@ class SpeechSegmentGenerator(BatchGenerator):
                     segment = next(random_segment(segments[i], weighted=self.weighted_))
 
                     # choose per_turn chunk(s) at random
-                    for chunk in itertools.islice(
+                    chunks = itertools.islice(
                         random_subsegment(segment, batch_duration), self.per_turn
-                    ):
+                    )
+                    batch.extend((files[i], chunk, label) for chunk in chunks)
 
+                    if len(batch) < batch_size:
+                        continue
+
+                    # extract features of all chunks of the batch at once
+                    batch_files, batch_chunks, batch_labels = zip(*batch)
+                    X = self.feature_extraction.crop_batch(
+                        batch_files, batch_chunks, mode="center", fixed=batch_duration
+                    )
+
+                    for x, batch_label in zip(X, batch_labels):
                         yield {
-                            "X": self.feature_extraction.crop(
-                                files[i], chunk, mode="center", fixed=batch_duration
-                            ),
-                            "y": self.segment_labels_.index(label),
+                            "X": x,
+                            "y": self.segment_labels_.index(batch_label),
                         }
 
-                        # increment number of samples in current batch
-                        batch_counter += 1
-
-                        # as soon as the batch is complete, a new random
-                        # duration is selected so that the next batch will use
-                        # a different chunk duration
-                        if batch_counter == batch_size:
-                            batch_counter = 0
-                            batch_duration = self.min_duration + np.random.rand() * (
-                                self.duration - self.min_duration
-                            )
+                    batch = []
+                    batch_duration = self.min_duration + np.random.rand() * (
+                        self.duration - self.min_duration
+                    )
 
     @property
     def batch_size(self) -> int:
@@ -43,6 +43,12 @@ except Exception as e:
 
 from .precomputed import Precomputed
 
+try:
+    from .waveform import WaveformStore
+except Exception as e:
+    msg = f"Decoded waveform store is not available: {e}."
+    print(msg)
+
 try:
     from .utils import RawAudio
 except Exception as e:
@@ -51,6 +57,7 @@ except Exception as e:
 
 try:
     from .pretrained import Pretrained
+    from .pretrained import MultiPretrained
 except Exception as e:
     msg = (
         f"Feature extraction using pretrained models are not available "
@@ -27,9 +27,14 @@
 # Hervé BREDIN - http://herve.niderb.fr
 
 import warnings
+from typing import Callable
+from typing import Iterator
+from typing import List
 import numpy as np
 
 from .utils import RawAudio
+from .utils import get_audio_duration
+from .utils import _group_by_file
 
 from pyannote.core import Segment
 from pyannote.core import SlidingWindow
@@ -131,13 +136,38 @@ class FeatureExtraction:
         msg = "`FeatureExtractions subclasses must implement " "`get_features` method."
         raise NotImplementedError(msg)
 
-    def __call__(self, current_file) -> SlidingWindowFeature:
+    def get_features_batch(self, waveforms, sample_rate=None) -> List[np.ndarray]:
+        """Extract features from a batch of waveforms
+
+        Subclasses may override this method with a vectorized implementation.
+
+        Parameters
+        ----------
+        waveforms : list of (n_samples, 1) numpy array
+            Waveforms. They do not need to have the same number of samples.
+        sample_rate : int, optional
+            Sample rate. Defaults to `self.sample_rate`.
+
+        Returns
+        -------
+        features : list of (n_frames, dimension) numpy array
+            Features of each waveform.
+        """
+        if sample_rate is None:
+            sample_rate = self.sample_rate
+        return [self.get_features(y, sample_rate) for y in waveforms]
+
+    def __call__(self, current_file, block_duration=None) -> SlidingWindowFeature:
         """Extract features from file
 
         Parameters
         ----------
         current_file : dict
             `pyannote.database` files.
+        block_duration : float, optional
+            When provided, process the file block by block (see `iter_blocks`)
+            so that the whole waveform is never loaded in memory. Defaults to
+            processing the whole file at once.
 
         Returns
         -------
@@ -145,11 +175,22 @@ class FeatureExtraction:
             Extracted features
         """
 
-        # load waveform, re-sample, convert to mono, augment, normalize
-        y, sample_rate = self.raw_audio_(current_file, return_sr=True)
+        if block_duration is not None:
+            features = np.vstack(
+                [
+                    block.data
+                    for block in self.iter_blocks(
+                        current_file, block_duration=block_duration
+                    )
+                ]
+            )
+
+        else:
+            # load waveform, re-sample, convert to mono, augment, normalize
+            y, sample_rate = self.raw_audio_(current_file, return_sr=True)
 
-        # compute features
-        features = self.get_features(y.data, sample_rate)
+            # compute features
+            features = self.get_features(y.data, sample_rate)
 
         # basic quality check
         if np.any(np.isnan(features)):
@@ -160,6 +201,137 @@ class FeatureExtraction:
         # wrap features in a `SlidingWindowFeature` instance
         return SlidingWindowFeature(features, self.sliding_window)
 
+    def iter_blocks(
+        self, current_file, block_duration: float = 60.0, margin: float = None
+    ) -> Iterator[SlidingWindowFeature]:
+        """Extract features from file, block by block
+
+        Memory usage is bounded by the duration of blocks, regardless of the
+        duration of the file. Each block is extracted from a chunk of waveform
+        extended by `margin` on both sides, and frames coming from the margins
+        are discarded, so that stitching blocks gives the same frames as
+        processing the whole file at once (as long as `margin` covers the
+        temporal dependencies of frames and frames do not depend on where the
+        waveform they are extracted from starts).
+
+        Parameters
+        ----------
+        current_file : dict
+            `pyannote.database` file.
+        block_duration : float, optional
+            Duration of blocks, in seconds. It is rounded to a whole number of
+            frames. Defaults to 60s.
+        margin : float, optional
+            Duration of additional waveform used on both sides of each block.
+            Defaults to `self.get_block_margin()`.
+
+        Yields
+        ------
+        block : `pyannote.core.SlidingWindowFeature`
+            Features of consecutive blocks.
+
+        Notes
+        -----
+        Data augmentation (if any) is applied independently to each block.
+        Features relying on statistics of the whole signal (e.g. `top_db`
+        clipping relative to the maximum power, used by librosa MFCC and
+        mel-spectrogram) are computed on each block independently, just like
+        `crop` does, and will therefore differ slightly.
+
+        `Pretrained` overrides this method so that its model is applied on the
+        same chunks as when processing the whole file at once.
+        """
+
+        if margin is None:
+            margin = self.get_block_margin()
+
+        yield from self._iter_blocks(
+            current_file,
+            self.sliding_window,
+            self.get_features,
+            block_duration=block_duration,
+            margin=margin,
+        )
+
+    def _iter_blocks(
+        self,
+        current_file,
+        frames: SlidingWindow,
+        get_features: Callable[[np.ndarray, int], np.ndarray],
+        block_duration: float = 60.0,
+        margin: float = 0.0,
+    ) -> Iterator[SlidingWindowFeature]:
+        """Extract features from file, block by block
+
+        Same as `iter_blocks` but features are extracted with `get_features`,
+        which returns frames on `frames` sliding window.
+        """
+
+        if "duration" in current_file:
+            duration = current_file["duration"]
+        else:
+            duration = get_audio_duration(current_file)
+
+        step = frames.step
+
+        # blocks (and margins) are made of a whole number of frames so that
+        # frames of each block are aligned with those of the whole file
+        n_frames = max(1, int(round(block_duration / step)))
+        n_margin = int(np.ceil(margin / step))
+
+        # only "RawAudio.crop" needs to know about the file duration
+        current_file = dict(current_file)
+        current_file["duration"] = duration
+
+        i = 0
+        while True:
+
+            block_start = i * step
+            block_end = (i + n_frames) * step
+            xstart = max(0, i - n_margin) * step
+            xend = min(duration, block_end + n_margin * step)
+            xsegment = Segment(xstart, xend)
+
+            # obtain (augmented) waveform on this extended block
+            y = self.raw_audio_.crop(
+                current_file, xsegment, mode="center", fixed=xsegment.duration
+            )
+            features = get_features(y, self.sample_rate)
+
+            # get rid of frames coming from margins
+            first = i - max(0, i - n_margin)
+            last_block = block_end + n_margin * step >= duration
+            if last_block:
+                data = features[first:]
+            else:
+                data = features[first : first + n_frames]
+
+            sliding_window = SlidingWindow(
+                start=frames.start + block_start,
+                duration=frames.duration,
+                step=step,
+            )
+            yield SlidingWindowFeature(data, sliding_window)
+
+            if last_block:
+                break
+
+            i += n_frames
+
+    def get_block_margin(self) -> float:
+        """Default margin used by `iter_blocks`
+
+        This is the context duration, plus one second to account for frame
+        dependencies that are not reported as context (e.g. centered FFT
+        windows or derivatives over neighboring frames).
+
+        Returns
+        -------
+        margin : float
+            Margin duration, in seconds.
+        """
+        return self.get_context_duration() + 1.0
+
     def get_context_duration(self) -> float:
         """
 
@@ -194,13 +366,7 @@ class FeatureExtraction:
         `pyannote.core.SlidingWindowFeature.crop`
         """
 
-        context = self.get_context_duration()
-
-        # extend segment on both sides with requested context
-        xsegment = Segment(
-            max(0, segment.start - context),
-            min(current_file["duration"], segment.end + context),
-        )
+        xsegment = self._extend_with_context(current_file, segment)
 
         # obtain (augmented) waveform on this extended segment
         y = self.raw_audio_.crop(
@@ -209,7 +375,116 @@ class FeatureExtraction:
 
         features = self.get_features(y, self.sample_rate)
 
-        # get rid of additional context before returning
+        return self._remove_context(features, xsegment, segment, mode, fixed)
+
+    def crop_many(
+        self, current_file, segments, mode="center", fixed=None
+    ) -> np.ndarray:
+        """Batched version of self.crop
+
+        Audio file is opened only once and neighbouring segments are served by
+        one single read, which is much faster than calling `crop` repeatedly.
+
+        Parameters
+        ----------
+        current_file : dict
+            `pyannote.database` file. Must contain a 'duration' key that
+            provides the duration (in seconds) of the audio file.
+        segments : iterable of `pyannote.core.Segment`
+            Segments from which to extract features.
+        mode : {'loose', 'strict', 'center'}, optional
+            See `crop`. Defaults to 'center'.
+        fixed : float, optional
+            See `crop`.
+
+        Returns
+        -------
+        features : (n_segments, n_frames, dimension) numpy array
+            Stacked features, in the same order as `segments`. When `fixed` is
+            not provided, the number of frames might differ from one segment to
+            another, and a list of (n_frames, dimension) numpy arrays is
+            returned instead.
+
+        See also
+        --------
+        `FeatureExtraction.crop`
+        """
+
+        segments = list(segments)
+        return self.crop_batch(
+            [current_file] * len(segments), segments, mode=mode, fixed=fixed
+        )
+
+    def crop_batch(
+        self, current_files, segments, mode="center", fixed=None
+    ) -> np.ndarray:
+        """Batched version of self.crop, across files
+
+        Segments of the same file are read at once (see `crop_many`), and
+        features of all segments are extracted by one `get_features_batch`
+        call, which is much faster with batched backends.
+
+        Parameters
+        ----------
+        current_files : iterable of dict
+            `pyannote.database` file of each segment. Segments of the same file
+            must be given the very same dictionary.
+        segments : iterable of `pyannote.core.Segment`
+            Segments from which to extract features.
+        mode : {'loose', 'strict', 'center'}, optional
+            See `crop`. Defaults to 'center'.
+        fixed : float, optional
+            See `crop`.
+
+        Returns
+        -------
+        features : (n_segments, n_frames, dimension) numpy array
+            Stacked features, in the same order as `segments`. When `fixed` is
+            not provided, a list of (n_frames, dimension) numpy arrays is
+            returned instead.
+        """
+
+        current_files, segments = list(current_files), list(segments)
+        xsegments = [
+            self._extend_with_context(current_file, segment)
+            for current_file, segment in zip(current_files, segments)
+        ]
+
+        # obtain waveform on all extended segments of each file at once
+        waveforms = [None] * len(segments)
+        for indices in _group_by_file(current_files):
+            ys, sample_rate = self.raw_audio_._read_many(
+                current_files[indices[0]],
+                [xsegments[i] for i in indices],
+                mode="center",
+                fixed=[xsegments[i].duration for i in indices],
+            )
+            # re-sample, convert to mono, augment, normalize
+            for i, y in zip(indices, ys):
+                waveforms[i] = self.raw_audio_.get_features(y, sample_rate)
+
+        features = []
+        for X, xsegment, segment in zip(
+            self.get_features_batch(waveforms, self.sample_rate), xsegments, segments
+        ):
+            features.append(self._remove_context(X, xsegment, segment, mode, fixed))
+
+        if fixed is None:
+            return features
+
+        return np.stack(features)
+
+    def _extend_with_context(self, current_file, segment) -> Segment:
+        """Extend segment on both sides with requested context"""
+        context = self.get_context_duration()
+        return Segment(
+            max(0, segment.start - context),
+            min(current_file["duration"], segment.end + context),
+        )
+
+    def _remove_context(self, features, xsegment, segment, mode, fixed):
+        """Get rid of additional context added by `_extend_with_context`"""
+
         frames = self.sliding_window
         shifted_frames = SlidingWindow(
             start=xsegment.start - frames.step,
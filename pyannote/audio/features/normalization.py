@@ -28,7 +28,6 @@
 
 
 import numpy as np
-import pandas as pd
 from pyannote.core import SlidingWindowFeature
 
 
@@ -71,6 +70,84 @@ class GlobalStandardization(object):
             return normalized
 
 
+def _short_term_standardization(data, half, start=0, end=None, offset=None):
+    """Short-term standardization of frames `start` to `end`
+
+    Mean and standard deviation of frame i are computed over frames
+    max(0, i - half) to min(n_frames, i + half + 1), using cumulative sums so
+    that complexity is linear in the number of frames.
+
+    To avoid catastrophic cancellation on long inputs, `offset` is subtracted
+    from frames first, and cumulative sums restart every 2 x half + 1 frames
+    (which is the window size, so a window overlaps at most two such chunks).
+    Results therefore only depend on the position of frames relative to the
+    start of their chunk: `partial_call` relies on that to be exact.
+
+    Parameters
+    ----------
+    data : (n_frames, n_features) numpy array
+    half : int
+        Half window size, in frames.
+    start, end : int, optional
+        Only standardize frames `start` to `end`. Defaults to all frames.
+    offset : (n_features, ) numpy array, optional
+        Value subtracted from frames before computing cumulative sums.
+        Defaults to the first frame.
+
+    Returns
+    -------
+    normalized : (end - start, n_features) numpy array
+    """
+
+    n_frames = len(data)
+    if end is None:
+        end = n_frames
+
+    x = np.asarray(data, dtype=np.float64)
+    if offset is None:
+        offset = x[0] if n_frames > 0 else 0.0
+    x = x - offset
+
+    # cumulative sums of x and x^2 within each chunk, with a leading zero:
+    # sum of frames [k x size, k x size + r) is sums[k, r]
+    size = 2 * half + 1
+    n_chunks = -(-n_frames // size)
+    padded = np.zeros((n_chunks * size,) + x.shape[1:])
+    padded[:n_frames] = x
+    padded = padded.reshape((n_chunks, size) + x.shape[1:])
+    zeros = np.zeros((n_chunks, 1) + x.shape[1:])
+    s1 = np.concatenate([zeros, np.cumsum(padded, axis=1)], axis=1)
+    s2 = np.concatenate([zeros, np.cumsum(padded ** 2, axis=1)], axis=1)
+
+    i = np.arange(start, end)
+    lo = np.maximum(0, i - half)
+    hi = np.minimum(n_frames, i + half + 1)
+    count = (hi - lo).astype(np.float64).reshape((-1,) + (1,) * (x.ndim - 1))
+
+    # windows either lie within one chunk or overlap two consecutive chunks
+    k, r = np.divmod(lo, size)
+    same = (hi - 1) // size == k
+    k_hi = np.where(same, k, k + 1)
+    r_hi = hi - k_hi * size
+    same = same.reshape(count.shape)
+
+    def window_sum(sums):
+        return np.where(
+            same,
+            sums[k_hi, r_hi] - sums[k, r],
+            (sums[k, size] - sums[k, r]) + sums[k_hi, r_hi],
+        )
+
+    total = window_sum(s1)
+    mu = total / count
+    # unbiased variance (ddof=1), protected against rounding errors
+    var = np.maximum(0.0, window_sum(s2) - total * mu) / np.maximum(count - 1, 1)
+    sigma = np.sqrt(var)
+    sigma[sigma == 0.0] = 1e-6
+
+    return (x[start:end] - mu) / sigma
+
+
 class ShortTermStandardization(object):
     """Short term mean/variance normalization
 
@@ -78,15 +155,37 @@ class ShortTermStandardization(object):
     ----------
     duration : float
         Window duration in seconds.
+
+    Usage
+    -----
+    Features can either be normalized all at once:
+
+    >>> normalize = ShortTermStandardization(duration=3.0)
+    >>> normalized = normalize(features)
+
+    or block by block (e.g. in streaming mode), in which case normalized frames
+    are returned with a delay of half the window duration:
+
+    >>> normalize.reset()
+    >>> for block in blocks:
+    ...     normalized = normalize.partial_call(block)
+    >>> normalized = normalize.partial_call(last_block, final=True)
     """
 
     def __init__(self, duration=3.0):
         super(ShortTermStandardization, self).__init__()
         self.duration = duration
+        self.reset()
 
     def get_context_duration(self):
         return 0.5 * self.duration
 
+    def _get_half_window(self, sliding_window):
+        window = sliding_window.samples(self.duration, mode="center")
+        if not window % 2:
+            window += 1
+        return window // 2
+
     def __call__(self, features, sliding_window=None):
         """Apply short-term standardization
 
@@ -109,31 +208,75 @@ class ShortTermStandardization(object):
         else:
             features_ = SlidingWindowFeature(features, sliding_window)
 
-        window = features_.sliding_window.samples(self.duration, mode="center")
-        if not window % 2:
-            window += 1
-
-        rolling = pd.DataFrame(features_.data).rolling(
-            window=window, center=True, min_periods=window
-        )
-        mu = np.array(rolling.mean())
-        sigma = np.array(rolling.std(ddof=1))
+        half = self._get_half_window(features_.sliding_window)
+        normalized_ = _short_term_standardization(features_.data, half)
 
-        for i in range(window // 2):
+        if isinstance(features, SlidingWindowFeature):
+            return SlidingWindowFeature(normalized_, features.sliding_window)
+        else:
+            return normalized_
 
-            data = features_.data[: i + window // 2 + 1, :]
-            mu[i] = np.mean(data, axis=0)
-            sigma[i] = np.std(data, axis=0, ddof=1)
+    def reset(self):
+        """Reset internal state used by `partial_call`"""
+        # raw frames still needed to normalize upcoming frames
+        self.buffer_ = None
+        # number of frames of `buffer_` already normalized
+        self.done_ = 0
+        # first frame of the stream (see `_short_term_standardization`)
+        self.offset_ = None
 
-            data = features_.data[-i - window // 2 - 1 :, :]
-            mu[-i - 1] = np.mean(data, axis=0)
-            sigma[-i - 1] = np.std(data, axis=0, ddof=1)
+    def partial_call(self, features, sliding_window=None, final=False):
+        """Apply short-term standardization incrementally
 
-        sigma[sigma == 0.0] = 1e-6
+        Parameters
+        ----------
+        features : `SlidingWindowFeature` or (n_samples, n_features ) `numpy.ndarray`
+            Next block of features.
+        sliding_window : `SlidingWindow`, optional
+            Sliding window when `features` is a `numpy.ndarray`.
+            Not used when `features` is a `SlidingWindowFeature` instance.
+        final : bool, optional
+            Set to True for the last block of the stream. Defaults to False.
 
-        normalized_ = (features_.data - mu) / sigma
+        Returns
+        -------
+        normalized : (n_normalized, n_features) `numpy.ndarray`
+            Standardized features. Until `final` is True, the last frames are
+            held back (until enough future frames are available to normalize
+            them) and returned by subsequent calls. Concatenating all returned
+            arrays gives the same result as calling `self` on the whole stream.
+        """
 
         if isinstance(features, SlidingWindowFeature):
-            return SlidingWindowFeature(normalized_, features.sliding_window)
+            sliding_window = features.sliding_window
+            data = features.data
         else:
-            return normalized_
+            data = features
+
+        half = self._get_half_window(sliding_window)
+
+        if self.buffer_ is None:
+            buffer = data
+        else:
+            buffer = np.concatenate([self.buffer_, data], axis=0)
+
+        if self.offset_ is None and len(buffer) > 0:
+            self.offset_ = np.asarray(buffer[0], dtype=np.float64)
+
+        end = len(buffer) if final else max(self.done_, len(buffer) - half)
+        normalized = _short_term_standardization(
+            buffer, half, start=self.done_, end=end, offset=self.offset_
+        )
+
+        if final:
+            self.reset()
+        else:
+            # only keep frames needed as (left) context of upcoming frames,
+            # from the start of their chunk so that results are exactly the
+            # same as when processing the whole stream at once
+            size = 2 * half + 1
+            drop = max(0, end - half) // size * size
+            self.buffer_ = buffer[drop:]
+            self.done_ = end - drop
+
+        return normalized
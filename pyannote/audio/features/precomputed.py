@@ -29,6 +29,8 @@
 
 import yaml
 import io
+import os
+import fcntl
 from pathlib import Path
 from glob import glob
 import numpy as np
@@ -37,6 +39,7 @@ from numpy.lib.format import open_memmap
 from pyannote.core import SlidingWindow, SlidingWindowFeature
 from pyannote.database.util import get_unique_identifier
 from pyannote.audio.utils.path import mkdir_p
+from pyannote.audio.utils.path import mkstemp
 
 
 class PyannoteFeatureExtractionError(Exception):
@@ -60,6 +63,26 @@ class Precomputed:
         exists and contains `metadata.yml`.
     classes : iterable, optional
         Human-readable name for each dimension.
+    storage : {"npy", "packed"}, optional
+        Defaults to "npy", that stores features of each file in its own `.npy`
+        file. "packed" stores features of many files in a few large shard
+        files, which is much more efficient for large collections of short
+        files. This is not used when `root_dir` already exists and contains
+        `metadata.yml`.
+    shard_size : int, optional
+        Maximum size (in bytes) of shard files, when `storage` is "packed".
+        Defaults to 1GiB. This is not used when `root_dir` already exists and
+        contains `metadata.yml`.
+    dtype : {"float32", "float16", "int8", "uint8"}, optional
+        Storage type. Defaults to "float32". Integer types use a per-dimension
+        linear quantization (scale and offset are recorded in `metadata.yml`)
+        computed from `value_range`. Features are dequantized (to float32) at
+        read time, only on the requested (e.g. cropped) part. This is not used
+        when `root_dir` already exists and contains `metadata.yml`.
+    value_range : (min, max) tuple, optional
+        Range of values covered by integer quantization. Values out of range
+        are clipped. `min` and `max` can either be floats or arrays with one
+        value per dimension. Mandatory when `dtype` is "int8" or "uint8".
 
     Notes
     -----
@@ -67,6 +90,12 @@ class Precomputed:
     `sliding_window` and `dimension` parameters in order to create and
     populate file `root_dir/metadata.yml` when instantiating.
 
+    With "packed" storage, `root_dir` contains shard files `shards/*.bin`
+    and one `index.txt` file that gives, for each file, the shard, offset,
+    type and shape of its features. The index is loaded once at
+    instantiation. Concurrent `dump` calls (from several processes) are
+    serialized by locking the index file.
+
     """
 
     def get_path(self, item):
@@ -82,6 +111,10 @@ class Precomputed:
         dimension=None,
         classes=None,
         augmentation=None,
+        storage="npy",
+        shard_size=2 ** 30,
+        dtype="float32",
+        value_range=None,
     ):
 
         if augmentation is not None:
@@ -100,6 +133,13 @@ class Precomputed:
 
             self.dimension_ = params.pop("dimension")
             self.classes_ = params.pop("classes", None)
+            # directories created before "packed" storage was introduced
+            # do not have "storage" key
+            self.storage_ = params.pop("storage", "npy")
+            self.shard_size_ = params.pop("shard_size", shard_size)
+            self.dtype_ = params.pop("dtype", "float32")
+            self.scale_ = params.pop("scale", None)
+            self.offset_ = params.pop("offset", None)
             self.sliding_window_ = SlidingWindow(**params)
 
             if dimension is not None and self.dimension_ != dimension:
@@ -139,6 +179,34 @@ class Precomputed:
                 )
                 raise ValueError(msg)
 
+            if storage not in ("npy", "packed"):
+                msg = f'Unsupported "storage" ({storage}): use "npy" or "packed".'
+                raise ValueError(msg)
+
+            if dtype not in ("float32", "float16", "int8", "uint8"):
+                msg = (
+                    f'Unsupported "dtype" ({dtype}): use "float32", "float16", '
+                    f'"int8", or "uint8".'
+                )
+                raise ValueError(msg)
+
+            scale, offset = None, None
+            if dtype in ("int8", "uint8"):
+                if value_range is None:
+                    msg = (
+                        f'Please provide "value_range" parameter when using '
+                        f'"{dtype}" storage type.'
+                    )
+                    raise ValueError(msg)
+                info = np.iinfo(dtype)
+                low, high = (
+                    np.broadcast_to(np.array(v, dtype=np.float64), (dimension,))
+                    for v in value_range
+                )
+                scale = (high - low) / (info.max - info.min)
+                offset = low - info.min * scale
+                scale, offset = scale.tolist(), offset.tolist()
+
             # create parent directory
             mkdir_p(path.parent)
 
@@ -150,6 +218,14 @@ class Precomputed:
             }
             if classes is not None:
                 params["classes"] = classes
+            if storage != "npy":
+                params["storage"] = storage
+                params["shard_size"] = shard_size
+            if dtype != "float32":
+                params["dtype"] = dtype
+            if scale is not None:
+                params["scale"] = scale
+                params["offset"] = offset
 
             with io.open(path, "w") as f:
                 yaml.dump(params, f, default_flow_style=False)
@@ -157,6 +233,26 @@ class Precomputed:
             self.sliding_window_ = sliding_window
             self.dimension_ = dimension
             self.classes_ = classes
+            self.storage_ = storage
+            self.shard_size_ = shard_size
+            self.dtype_ = dtype
+            self.scale_ = scale
+            self.offset_ = offset
+
+        if self.scale_ is not None:
+            self.scale_ = np.array(self.scale_, dtype=np.float32)
+            self.offset_ = np.array(self.offset_, dtype=np.float32)
+
+        # uri --> (shard, offset, dtype, shape)
+        self.index_ = dict()
+        # number of bytes of index file already loaded into self.index_
+        self.index_size_ = 0
+        # shard --> memory-mapped shard
+        self.shards_ = dict()
+
+        if self.storage_ == "packed":
+            mkdir_p(self.root_dir / "shards")
+            self._load_index()
 
     def augmentation():
         doc = "Data augmentation."
@@ -188,6 +284,140 @@ class Precomputed:
         """Human-readable label of each dimension"""
         return self.classes_
 
+    def _quantize(self, data: np.ndarray) -> np.ndarray:
+        """Convert features to storage type"""
+
+        if self.dtype_ == "float32":
+            return data
+
+        if self.scale_ is None:
+            return data.astype(self.dtype_)
+
+        info = np.iinfo(self.dtype_)
+        quantized = np.round((data - self.offset_) / self.scale_)
+        return np.clip(quantized, info.min, info.max).astype(self.dtype_)
+
+    def _dequantize(self, data: np.ndarray) -> np.ndarray:
+        """Convert features from storage type back to float32"""
+
+        if self.dtype_ == "float32":
+            return data
+
+        if self.scale_ is None:
+            return data.astype(np.float32)
+
+        return data.astype(np.float32) * self.scale_ + self.offset_
+
+    def __getstate__(self):
+        # memory-mapped shards are not meant to be pickled
+        state = dict(self.__dict__)
+        state["shards_"] = dict()
+        return state
+
+    @property
+    def index_path(self) -> Path:
+        return self.root_dir / "index.txt"
+
+    def get_shard_path(self, shard: int) -> Path:
+        return self.root_dir / "shards" / f"{shard:05d}.bin"
+
+    def _load_index(self):
+        """Load (new entries of) index of packed storage"""
+
+        if not self.index_path.exists():
+            return
+
+        with io.open(self.index_path, "r") as f:
+            f.seek(self.index_size_)
+            for line in f:
+                # skip partially written last line
+                if not line.endswith("\n"):
+                    break
+                self.index_size_ += len(line.encode("utf-8"))
+                uri, shard, offset, dtype, shape = line.rstrip("\n").split("\t")
+                shape = tuple(int(n) for n in shape.split(",") if n)
+                self.index_[uri] = (int(shard), int(offset), np.dtype(dtype), shape)
+
+    def _get_packed(self, item) -> np.ndarray:
+        """Get read-only view on packed features"""
+
+        uri = get_unique_identifier(item)
+
+        # features might have been dumped by another process
+        if uri not in self.index_:
+            self._load_index()
+
+        if uri not in self.index_:
+            msg = (
+                f"Directory {self.root_dir} does not contain "
+                f'precomputed features for file "{uri}".'
+            )
+            raise PyannoteFeatureExtractionError(msg)
+
+        shard, offset, dtype, shape = self.index_[uri]
+        n_bytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+
+        # shard might have grown since it was memory-mapped
+        memmap = self.shards_.get(shard, None)
+        if memmap is None or len(memmap) < offset + n_bytes:
+            memmap = np.memmap(self.get_shard_path(shard), dtype=np.uint8, mode="r")
+            self.shards_[shard] = memmap
+
+        return memmap[offset : offset + n_bytes].view(dtype).reshape(shape)
+
+    def _dump_packed(self, item, data: np.ndarray):
+        """Append features to the last shard and add them to the index"""
+
+        uri = get_unique_identifier(item)
+        data = np.ascontiguousarray(data)
+
+        with io.open(self.index_path, "a") as index:
+
+            # lock index file to prevent concurrent writes
+            fcntl.flock(index, fcntl.LOCK_EX)
+
+            try:
+                shard = max(
+                    [int(p.stem) for p in (self.root_dir / "shards").glob("*.bin")],
+                    default=0,
+                )
+                path = self.get_shard_path(shard)
+                size = path.stat().st_size if path.exists() else 0
+
+                # start a new shard when the current one is full
+                if size > 0 and size + data.nbytes > self.shard_size_:
+                    shard += 1
+                    path = self.get_shard_path(shard)
+                    size = 0
+
+                # align features on 64 bytes
+                offset = -(-size // 64) * 64
+
+                with io.open(path, "ab") as f:
+                    f.write(b"\0" * (offset - size))
+                    f.write(data.tobytes())
+
+                shape = ",".join(str(n) for n in data.shape)
+                dtype = data.dtype.str
+                index.write(f"{uri}\t{shard:d}\t{offset:d}\t{dtype}\t{shape}\n")
+                index.flush()
+
+            finally:
+                fcntl.flock(index, fcntl.LOCK_UN)
+
+        self.index_[uri] = (shard, offset, data.dtype, data.shape)
+
+    def __contains__(self, item) -> bool:
+        """Whether features for this file have already been dumped"""
+
+        if self.storage_ == "packed":
+            uri = get_unique_identifier(item)
+            if uri not in self.index_:
+                self._load_index()
+            return uri in self.index_
+
+        return Path(self.get_path(item)).exists()
+
     def __call__(self, current_file):
         """Obtain features for file
 
@@ -202,6 +432,12 @@ class Precomputed:
             Features
         """
 
+        if self.storage_ == "packed":
+            data = self._get_packed(current_file)
+            if not self.use_memmap:
+                data = np.array(data)
+            return SlidingWindowFeature(self._dequantize(data), self.sliding_window_)
+
         path = Path(self.get_path(current_file))
 
         if not path.exists():
@@ -219,7 +455,8 @@ class Precomputed:
         else:
             data = np.load(str(path))
 
-        return SlidingWindowFeature(data, self.sliding_window_)
+        # note that quantized features are loaded in memory anyway
+        return SlidingWindowFeature(self._dequantize(data), self.sliding_window_)
 
     def crop(self, current_file, segment, mode="center", fixed=None):
         """Fast version of self(current_file).crop(segment, **kwargs)
@@ -245,20 +482,40 @@ class Precomputed:
         if mode == "center" and fixed is None:
             fixed = segment.duration
 
-        memmap = open_memmap(self.get_path(current_file), mode="r")
+        if self.storage_ == "packed":
+            memmap = self._get_packed(current_file)
+        else:
+            memmap = open_memmap(self.get_path(current_file), mode="r")
         swf = SlidingWindowFeature(memmap, self.sliding_window_)
-        result = swf.crop(segment, mode=mode, fixed=fixed)
+        # only dequantize the cropped part
+        result = self._dequantize(swf.crop(segment, mode=mode, fixed=fixed))
         del memmap
         return result
 
     def shape(self, item):
         """Faster version of precomputed(item).data.shape"""
+        if self.storage_ == "packed":
+            return self._get_packed(item).shape
         memmap = open_memmap(self.get_path(item), mode="r")
         shape = memmap.shape
         del memmap
         return shape
 
     def dump(self, item, features):
+        data = self._quantize(features.data)
+        if self.storage_ == "packed":
+            self._dump_packed(item, data)
+            return
         path = Path(self.get_path(item))
         mkdir_p(path.parent)
-        np.save(path, features.data)
+
+        # write to a temporary file first and move it in place atomically, so
+        # that an interrupted dump never leaves a partially written file
+        fd, tmp = mkstemp(suffix=".npy", dir=path.parent)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, data)
+            os.replace(tmp, path)
+        except BaseException as e:
+            os.remove(tmp)
+            raise e
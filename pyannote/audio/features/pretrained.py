@@ -23,13 +23,22 @@
 # AUTHOR
 # Hervé Bredin - http://herve.niderb.fr
 
+import inspect
+import itertools
 import warnings
+from typing import Dict
+from typing import List
+from typing import Iterable
+from typing import Iterator
 from typing import Optional
+from typing import Tuple
 from typing import Union
 from typing import Text
 from pathlib import Path
 
+import yaml
 import torch
+import torch.nn as nn
 import numpy as np
 
 from pyannote.core import SlidingWindow
@@ -37,11 +46,19 @@ from pyannote.core import SlidingWindowFeature
 
 from pyannote.audio.train.model import RESOLUTION_FRAME
 from pyannote.audio.train.model import RESOLUTION_CHUNK
+from pyannote.audio.train.model import _first_frames
+from pyannote.audio.train.model import _num_threads
+from pyannote.audio.train.model import _slide_stream
+from pyannote.audio.train.model import ScriptedModel
 
 from pyannote.audio.augmentation import Augmentation
 from pyannote.audio.features import FeatureExtraction
+from pyannote.audio.features.utils import get_audio_duration
 
+from pyannote.audio.applications.config import FEATURE_DEFAULT
 from pyannote.audio.applications.config import load_config
+from pyannote.audio.applications.config import load_feature_extraction
+from pyannote.audio.applications.config import load_preprocessors
 from pyannote.audio.applications.config import load_specs
 from pyannote.audio.applications.config import load_params
 
@@ -65,6 +82,26 @@ class Pretrained(FeatureExtraction):
         audio chunks. Defaults to 0.25.
     device : optional
     return_intermediate : optional
+    num_threads : int, optional
+        Number of threads used by torch for intra-op parallelism during
+        inference. Defaults to torch current setting.
+    backend : {"pytorch", "torchscript"}, optional
+        Defaults to "pytorch", which rebuilds the model from configuration
+        files and loads its weights. Use "torchscript" to load the model
+        exported by `pyannote-audio <task> export` instead (in which case
+        `validate_dir` can also be the path to the exported model).
+    quantize : {"dynamic"}, optional
+        Use "dynamic" to apply post-training dynamic int8 quantization to
+        recurrent (LSTM, GRU) and linear layers, which speeds up CPU inference
+        at the cost of a (usually tiny) loss of accuracy. Only supported with
+        "pytorch" backend on CPU. See `quantization_drift` to check the effect
+        of quantization on model output. Defaults to no quantization.
+
+    Notes
+    -----
+    When processed block by block (`block_duration` or `iter_blocks`), the
+    model is applied on the very same chunks as when processing the whole file
+    at once: see `iter_blocks`.
     """
 
     # TODO: add progress bar (at least for demo purposes)
@@ -80,6 +117,9 @@ class Pretrained(FeatureExtraction):
         device: Optional[Union[Text, torch.device]] = None,
         return_intermediate=None,
         progress_hook=None,
+        num_threads: int = None,
+        backend: Text = "pytorch",
+        quantize: Text = None,
     ):
 
         try:
@@ -91,6 +131,81 @@ class Pretrained(FeatureExtraction):
             )
             raise TypeError(msg)
 
+        if backend not in ("pytorch", "torchscript"):
+            msg = f'Unsupported "backend" ({backend}): use "pytorch" or "torchscript".'
+            raise ValueError(msg)
+        self.backend = backend
+
+        # defaults to using GPU when available
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = torch.device(device)
+
+        if backend == "torchscript":
+            model, task = self._load_torchscript(validate_dir, epoch=epoch)
+        else:
+            model, task = self._load_pytorch(validate_dir, epoch=epoch)
+
+        if quantize is not None:
+
+            if quantize != "dynamic":
+                msg = f'Unsupported "quantize" ({quantize}): use "dynamic".'
+                raise ValueError(msg)
+
+            if backend != "pytorch" or self.device.type != "cpu":
+                msg = 'Dynamic quantization requires "pytorch" backend on CPU.'
+                raise ValueError(msg)
+
+            model = torch.quantization.quantize_dynamic(
+                model.eval(), {nn.LSTM, nn.GRU, nn.Linear}, dtype=torch.qint8
+            )
+
+        self.quantize = quantize
+
+        super().__init__(
+            augmentation=augmentation, sample_rate=self.feature_extraction_.sample_rate
+        )
+
+        self.feature_extraction_.augmentation = self.augmentation
+
+        # send model to device
+        self.model_ = model.eval().to(self.device)
+
+        # initialize chunks duration with that used during training
+        self.duration = task["duration"]
+
+        self.min_duration = task["min_duration"]
+
+        # override chunks duration by user-provided value
+        if duration is not None:
+            # warn that this might be sub-optimal
+            if self.duration is not None and duration != self.duration:
+                # TODO: do not show this message if min_duration < new_duration < duration
+                msg = (
+                    f"Model was trained with {self.duration:g}s chunks and "
+                    f"is applied on {duration:g}s chunks. This might lead "
+                    f"to sub-optimal results."
+                )
+                warnings.warn(msg)
+            # do it anyway
+            self.duration = duration
+
+        if step is None:
+            step = 0.25
+        self.step = step
+        self.chunks_ = SlidingWindow(
+            duration=self.duration, step=self.step * self.duration
+        )
+
+        self.batch_size = batch_size
+
+        self.return_intermediate = return_intermediate
+        self.progress_hook = progress_hook
+        self.num_threads = num_threads
+
+    def _load_pytorch(self, validate_dir: Path, epoch: int = None):
+        """Build model from configuration files and load its weights"""
+
         strict = epoch is None
         self.validate_dir = validate_dir.expanduser().resolve(strict=strict)
 
@@ -103,11 +218,13 @@ class Pretrained(FeatureExtraction):
         # use feature extraction from config.yml configuration file
         self.feature_extraction_ = config["feature_extraction"]
 
-        super().__init__(
-            augmentation=augmentation, sample_rate=self.feature_extraction_.sample_rate
+        # keep track of raw configuration (used to compare models)
+        with open(config_yml, "r") as fp:
+            raw_config = yaml.load(fp, Loader=yaml.SafeLoader)
+        self.feature_extraction_config_ = raw_config.get(
+            "feature_extraction", FEATURE_DEFAULT
         )
-
-        self.feature_extraction_.augmentation = self.augmentation
+        self.preprocessors_config_ = raw_config.get("preprocessors", {})
 
         specs_yml = train_dir / "specs.yml"
         specifications = load_specs(specs_yml)
@@ -130,44 +247,68 @@ class Pretrained(FeatureExtraction):
             torch.load(self.weights_pt_, map_location=lambda storage, loc: storage)
         )
 
-        # defaults to using GPU when available
-        if device is None:
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.device = torch.device(device)
+        task = {
+            "duration": getattr(config["task"], "duration", None),
+            "min_duration": getattr(config["task"], "min_duration", None),
+        }
 
-        # send model to device
-        self.model_ = model.eval().to(self.device)
+        return model, task
 
-        # initialize chunks duration with that used during training
-        self.duration = getattr(config["task"], "duration", None)
+    def _load_torchscript(self, validate_dir: Path, epoch: int = None):
+        """Load model exported by `export_torchscript`"""
 
-        self.min_duration = getattr(config["task"], "min_duration", None)
+        validate_dir = validate_dir.expanduser().resolve(strict=True)
 
-        # override chunks duration by user-provided value
-        if duration is not None:
-            # warn that this might be sub-optimal
-            if self.duration is not None and duration != self.duration:
-                # TODO: do not show this message if min_duration < new_duration < duration
-                msg = (
-                    f"Model was trained with {self.duration:g}s chunks and "
-                    f"is applied on {duration:g}s chunks. This might lead "
-                    f"to sub-optimal results."
-                )
-                warnings.warn(msg)
-            # do it anyway
-            self.duration = duration
+        # path to exported model may be provided directly...
+        if validate_dir.is_file():
+            self.weights_pt_ = validate_dir
+            validate_dir = validate_dir.parents[1]
 
-        if step is None:
-            step = 0.25
-        self.step = step
-        self.chunks_ = SlidingWindow(
-            duration=self.duration, step=self.step * self.duration
+        # ... or deduced from validation directory
+        else:
+            if epoch is None:
+                epoch = load_params(validate_dir / "params.yml")["epoch"]
+            self.weights_pt_ = validate_dir / "export" / f"{epoch:04d}.pt"
+
+        self.validate_dir = validate_dir
+
+        extra_files = {"metadata.yml": ""}
+        module = torch.jit.load(
+            str(self.weights_pt_), map_location=self.device, _extra_files=extra_files
         )
+        metadata = yaml.load(extra_files["metadata.yml"], Loader=yaml.SafeLoader)
 
-        self.batch_size = batch_size
+        # freeze and optimize graph for inference, when supported
+        try:
+            module = torch.jit.optimize_for_inference(torch.jit.freeze(module.eval()))
+        except (AttributeError, RuntimeError) as e:
+            msg = f"Could not optimize scripted model for inference: {e}"
+            warnings.warn(msg)
+
+        self.feature_extraction_config_ = metadata["feature_extraction"]
+        self.feature_extraction_ = load_feature_extraction(
+            self.feature_extraction_config_
+        )
+        self.preprocessors_config_ = metadata["preprocessors"]
+        self.preprocessors_ = load_preprocessors(self.preprocessors_config_)
+
+        self.epoch_ = metadata["epoch"]
+        if "params" in metadata:
+            self.pipeline_params_ = metadata["params"]
+
+        resolution = metadata["resolution"]
+        if isinstance(resolution, dict):
+            resolution = SlidingWindow(**resolution)
+
+        model = ScriptedModel(
+            module,
+            resolution,
+            metadata["alignment"],
+            classes=metadata.get("classes", None),
+            dimension=metadata.get("dimension", None),
+        )
 
-        self.return_intermediate = return_intermediate
-        self.progress_hook = progress_hook
+        return model, metadata["task"]
 
     @property
     def duration(self):
@@ -230,8 +371,596 @@ class Pretrained(FeatureExtraction):
             device=self.device,
             return_intermediate=self.return_intermediate,
             progress_hook=self.progress_hook,
+            num_threads=self.num_threads,
         ).data
 
+    def iter_outputs(
+        self, files: Iterable[dict], block_duration: float = None
+    ) -> Iterator[Tuple[dict, SlidingWindowFeature]]:
+        """Apply model on a sequence of files
+
+        This is equivalent to calling `self(current_file)` on every file, but
+        chunks of consecutive files are packed into full batches, which is
+        much faster when files are short.
+
+        Parameters
+        ----------
+        files : iterable of dict
+            `pyannote.database` files.
+        block_duration : float, optional
+            When provided, files longer than `block_duration` are processed
+            block by block (see `iter_blocks`), so that their whole waveform
+            is never loaded in memory. Defaults to loading whole files.
+
+        Yields
+        ------
+        current_file : dict
+            `pyannote.database` file.
+        output : SlidingWindowFeature
+            Model output on `current_file`.
+        """
+
+        def is_long(current_file) -> bool:
+            if block_duration is None or "waveform" in current_file:
+                return False
+            if "duration" in current_file:
+                duration = current_file["duration"]
+            else:
+                duration = get_audio_duration(current_file)
+            return duration > block_duration
+
+        for long, group in itertools.groupby(files, key=is_long):
+
+            if long:
+                for current_file in group:
+                    output = self(current_file, block_duration=block_duration)
+                    yield current_file, output
+                continue
+
+            inputs = (
+                (current_file, self.feature_extraction_(current_file))
+                for current_file in group
+            )
+
+            for current_file, (output,) in _slide_stream(
+                [self.model_],
+                inputs,
+                self.chunks_,
+                batch_size=self.batch_size,
+                device=self.device,
+                return_intermediate=self.return_intermediate,
+                progress_hook=self.progress_hook,
+                num_threads=self.num_threads,
+            ):
+                yield current_file, SlidingWindowFeature(
+                    output.data, self.sliding_window
+                )
+
+    def embed_segments(
+        self, current_file, segments, return_counts: bool = False
+    ) -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+        """Compute one embedding per segment, in batches
+
+        This is much faster than calling `crop` once per segment: audio file
+        is read in one pass, and segments are processed in full batches.
+
+        Parameters
+        ----------
+        current_file : dict
+            `pyannote.database` file. Must contain a 'duration' key that
+            provides the duration (in seconds) of the audio file.
+        segments : iterable of `pyannote.core.Segment`
+            Segments to embed.
+        return_counts : bool, optional
+            Also return the number of chunks each segment was split into.
+            Defaults to False.
+
+        Returns
+        -------
+        embeddings : (n_segments, dimension) np.ndarray
+            Embeddings, in the same order as `segments`.
+        counts : (n_segments, ) np.ndarray
+            Number of chunks of each segment. Only returned when `return_counts`
+            is True.
+
+        Notes
+        -----
+        Segments longer than `duration` are split into chunks of `duration`
+        (with `step`), and their embedding is the average of their chunk
+        embeddings. Shorter segments are embedded as a whole. For models
+        supporting it (see `Model.supports_lengths`), chunks are sorted by
+        length so that each batch gathers chunks of similar length, shorter
+        ones being padded to the longest one: padding is masked and has no
+        effect on embeddings. Other models (e.g. TorchScript ones) are only
+        given batches of chunks with the same length, so that embeddings do
+        not depend on batch composition.
+        """
+
+        if self.model_.resolution != RESOLUTION_CHUNK:
+            msg = "`embed_segments` only supports models with chunk resolution."
+            raise ValueError(msg)
+
+        segments = list(segments)
+        n_segments = len(segments)
+        embeddings = np.zeros((n_segments, self.dimension), dtype=np.float32)
+        if n_segments == 0:
+            if return_counts:
+                return embeddings, np.zeros((0,), dtype=np.int64)
+            return embeddings
+
+        features = self.feature_extraction_.crop_many(
+            current_file, segments, mode="center", fixed=None
+        )
+
+        frames = self.feature_extraction_.sliding_window
+        chunk_frames = frames.samples(self.duration, mode="center")
+        step_frames = max(1, frames.samples(self.step * self.duration, mode="center"))
+
+        # split segments into (views of) chunks
+        chunks, owners = [], []
+        for s, X in enumerate(features):
+            n_frames = len(X)
+            if n_frames < 1:
+                msg = f"Segment {segments[s]} is too short to be embedded."
+                raise ValueError(msg)
+            if n_frames <= chunk_frames:
+                starts = [0]
+            else:
+                starts = list(range(0, n_frames - chunk_frames + 1, step_frames))
+                # same as align_last=True in Model.slide
+                if starts[-1] + chunk_frames < n_frames:
+                    starts.append(n_frames - chunk_frames)
+            for start in starts:
+                chunks.append(X[start : start + chunk_frames])
+                owners.append(s)
+        owners = np.array(owners)
+
+        # sort chunks by length to minimize padding
+        order = sorted(range(len(chunks)), key=lambda c: len(chunks[c]))
+
+        # padding would change embeddings of models that cannot mask it: only
+        # chunks with the same length are batched together for those models
+        supports_lengths = getattr(self.model_, "supports_lengths", False)
+        if supports_lengths:
+            groups = [order]
+        else:
+            groups = [
+                list(group)
+                for _, group in itertools.groupby(order, key=lambda c: len(chunks[c]))
+            ]
+        batches = [
+            group[i : i + self.batch_size]
+            for group in groups
+            for i in range(0, len(group), self.batch_size)
+        ]
+
+        fX = np.zeros((len(chunks), self.dimension), dtype=np.float32)
+        for batch in batches:
+            lengths = [len(chunks[c]) for c in batch]
+            max_frames = max(lengths)
+            X = np.stack(
+                [
+                    np.pad(chunks[c], ((0, max_frames - len(chunks[c])), (0, 0)))
+                    for c in batch
+                ]
+            )
+            with torch.no_grad():
+                tX = torch.tensor(X, dtype=torch.float32, device=self.device)
+                if supports_lengths and min(lengths) < max_frames:
+                    tL = torch.tensor(lengths, dtype=torch.int64, device=self.device)
+                    tfX = self.model_(tX, lengths=tL)
+                else:
+                    tfX = self.model_(tX)
+                fX[batch] = tfX.detach().to("cpu").numpy()
+
+        # average chunk embeddings of each segment
+        np.add.at(embeddings, owners, fX)
+        counts = np.bincount(owners, minlength=n_segments)
+        embeddings /= counts[:, np.newaxis]
+
+        if return_counts:
+            return embeddings, counts
+        return embeddings
+
+    def iter_blocks(
+        self, current_file, block_duration: float = 60.0, margin: float = None
+    ) -> Iterator[SlidingWindowFeature]:
+        """Apply model on file, block by block
+
+        Memory usage is bounded by the duration of blocks (and chunks),
+        regardless of the duration of the file. Features are extracted block
+        by block (as in `FeatureExtraction.iter_blocks`) and the model is applied
+        on the very same chunks as when processing the whole file at once, as
+        soon as their features are available. Output frames are yielded once
+        every chunk covering them has been processed, so that stitching blocks
+        gives the same output as processing the whole file at once (as long as
+        blockwise features are the same as whole-file features).
+
+        Parameters
+        ----------
+        current_file : dict
+            `pyannote.database` file.
+        block_duration : float, optional
+            Duration of feature blocks, in seconds. Defaults to 60s.
+        margin : float, optional
+            Margin used for extracting features block by block. Defaults to
+            `self.get_block_margin()`.
+
+        Yields
+        ------
+        block : `pyannote.core.SlidingWindowFeature`
+            Output of consecutive blocks. Their duration depends on the one
+            of feature blocks but is not exactly `block_duration`.
+        """
+
+        frames = self.feature_extraction_.sliding_window
+        window = self.sliding_window
+
+        # chunks are aligned with the start of features, as in Model.slide
+        chunks = SlidingWindow(
+            start=frames.start, duration=self.duration, step=self.step * self.duration
+        )
+        n_chunk_frames = frames.samples(self.duration, mode="center")
+
+        resolution = self.get_resolution()
+        alignment = self.model_.alignment
+        skip_average = (self.model_.resolution == RESOLUTION_CHUNK) or (
+            self.return_intermediate is not None
+        )
+
+        # feature buffer: `features[i]` is frame #`features_start + i`
+        features, features_start, n_features = None, 0, 0
+
+        # index of next chunk
+        next_chunk = 0
+
+        # sum of outputs (and number of chunks) of frames that are not final
+        # yet, starting at frame #`output_start` (or outputs of chunks that
+        # have not been yielded yet, when skip_average is True)
+        output, k, output_start = None, None, 0
+
+        def forward(chunk_starts: np.ndarray, n_chunk_frames: int) -> np.ndarray:
+            """Apply model on chunks (with the same padding as Model.slide)"""
+
+            first_frame = _first_frames(frames, chunk_starts, "center")
+            first_frame -= features_start
+            data = features
+            pad_first = max(0, -np.min(first_frame))
+            pad_last = max(0, np.max(first_frame) + n_chunk_frames - len(data))
+            if pad_first or pad_last:
+                pad_width = ((pad_first, pad_last),) + ((0, 0),) * (data.ndim - 1)
+                data = np.pad(data, pad_width, mode="edge")
+            first_frame += pad_first
+
+            fX = []
+            for i in range(0, len(first_frame), self.batch_size):
+                X = np.stack(
+                    [
+                        data[f : f + n_chunk_frames]
+                        for f in first_frame[i : i + self.batch_size]
+                    ]
+                )
+                with torch.no_grad(), _num_threads(self.num_threads):
+                    tX = torch.tensor(X, dtype=torch.float32, device=self.device)
+                    tfX = self.model_(tX, return_intermediate=self.return_intermediate)
+                fX.append(tfX.detach().to("cpu").numpy())
+            return np.concatenate(fX)
+
+        def accumulate(chunk_starts: List[float], n_chunk_frames: int):
+            """Apply model on chunks and accumulate their output"""
+
+            nonlocal output, k
+
+            chunk_starts = np.array(chunk_starts)
+            fX = forward(chunk_starts, n_chunk_frames)
+
+            if skip_average:
+                output = fX if output is None else np.concatenate([output, fX])
+                return
+
+            # make room for new frames
+            first_output = _first_frames(resolution, chunk_starts, alignment)
+            n_output_frames = fX.shape[1]
+            if output is None:
+                output = np.zeros((0,) + fX.shape[2:], dtype=np.float32)
+                k = np.zeros((0, 1), dtype=np.int32)
+            extend(np.max(first_output) + n_output_frames - output_start)
+
+            # accumulate outputs (in the same order as Model.slide)
+            indices = first_output[:, np.newaxis] + np.arange(n_output_frames)
+            valid = indices >= output_start
+            np.add.at(output, indices[valid] - output_start, fX[valid])
+            np.add.at(k, indices[valid] - output_start, 1)
+
+        def extend(n: int):
+            """Make sure output of the next `n` frames can be accumulated"""
+
+            nonlocal output, k
+
+            missing = n - len(output)
+            if missing > 0:
+                zeros = np.zeros((missing,) + output.shape[1:], dtype=np.float32)
+                output = np.concatenate([output, zeros])
+                k = np.concatenate([k, np.zeros((missing, 1), dtype=np.int32)])
+
+        def finalize(n: int) -> SlidingWindowFeature:
+            """Pop (averaged) output of the next `n` frames (or chunks)"""
+
+            nonlocal output, k, output_start
+
+            if skip_average:
+                data, output = output[:n], output[n:]
+            else:
+                # frames not covered by any chunk are given a zero output, as
+                # done by Model.slide (this only happens at the very end)
+                extend(n)
+                data = output[:n] / np.maximum(k[:n], 1)
+                output, k = output[n:], k[n:]
+
+            block = SlidingWindowFeature(
+                data,
+                SlidingWindow(
+                    start=window.start + output_start * window.step,
+                    duration=window.duration,
+                    step=window.step,
+                ),
+            )
+            output_start += n
+            return block
+
+        if margin is None:
+            margin = self.get_block_margin()
+
+        for block in self._iter_blocks(
+            current_file,
+            frames,
+            self.feature_extraction_.get_features,
+            block_duration=block_duration,
+            margin=margin,
+        ):
+
+            if features is None:
+                features = block.data
+            else:
+                features = np.concatenate([features, block.data])
+            n_features += len(block.data)
+            extent = frames.range_to_segment(0, n_features)
+
+            # apply model on every chunk that is known to be part of the file
+            # chunks (because it is part of the features extent so far) and
+            # whose features are available
+            chunk_starts = []
+            while True:
+                chunk = chunks[next_chunk]
+                if chunk not in extent:
+                    break
+                first_frame = _first_frames(frames, np.array([chunk.start]), "center")
+                if first_frame[0] + n_chunk_frames > n_features:
+                    break
+                chunk_starts.append(chunk.start)
+                next_chunk += 1
+            if chunk_starts:
+                accumulate(chunk_starts, n_chunk_frames)
+
+            # upcoming chunks start after next chunk or, for the last chunk
+            # (aligned with the end of the file), one chunk before the end of
+            # features extracted so far
+            upcoming = min(chunks[next_chunk].start, extent.end - self.duration)
+
+            # only keep features needed by upcoming chunks
+            keep = _first_frames(frames, np.array([upcoming]), "center")[0]
+            if keep > features_start:
+                features = features[keep - features_start :]
+                features_start = keep
+
+            if output is None:
+                continue
+
+            # outputs of frames that are not covered by upcoming chunks are final
+            if skip_average:
+                n = len(output)
+            else:
+                n = _first_frames(resolution, np.array([upcoming]), alignment)[0]
+                n -= output_start
+            if n > 0:
+                yield finalize(n)
+
+        # remaining chunks, exactly as in Model.slide
+        support = frames.range_to_segment(0, n_features)
+        if support.duration < self.duration:
+            all_chunks = [support]
+            fixed = support.duration
+        else:
+            all_chunks = list(self.chunks_(support, align_last=True))
+            fixed = self.duration
+        chunk_starts = [chunk.start for chunk in all_chunks[next_chunk:]]
+        if chunk_starts:
+            accumulate(chunk_starts, frames.samples(fixed, mode="center"))
+
+        if skip_average:
+            n = len(output)
+        else:
+            n = resolution.samples(all_chunks[-1].end, mode="center") - output_start
+        yield finalize(n)
+
     def get_context_duration(self) -> float:
         # FIXME: add half window duration to context?
         return self.feature_extraction_.get_context_duration()
+
+    def get_block_margin(self) -> float:
+        # margin used for extracting features (temporal dependencies due to
+        # the model are taken care of by iter_blocks)
+        return self.feature_extraction_.get_block_margin()
+
+
+def _feature_extraction_config(pretrained: Pretrained) -> Tuple[type, Dict]:
+    """Class and parameters (including default values) of feature extraction"""
+    Klass = type(pretrained.feature_extraction_)
+    params = pretrained.feature_extraction_config_.get("params", {})
+    arguments = inspect.signature(Klass).bind_partial(**params)
+    arguments.apply_defaults()
+    return Klass, dict(arguments.arguments)
+
+
+def _same_window(window: SlidingWindow, other: SlidingWindow) -> bool:
+    return (window.start, window.duration, window.step) == (
+        other.start,
+        other.duration,
+        other.step,
+    )
+
+
+class MultiPretrained:
+    """Apply several pretrained models sharing the same feature extraction
+
+    Features are extracted only once, and each batch of chunks is forwarded
+    through every model. This is typically useful to apply speech activity,
+    speaker change and overlap detection models on the same files.
+
+    Parameters
+    ----------
+    validate_dirs : dict
+        Maps model names to validation directories.
+    duration : float, optional
+        Use audio chunks with that duration. Defaults to the fixed duration
+        used during training, which must then be the same for all models.
+    step : float, optional
+        Ratio of audio chunk duration used as step between two consecutive
+        audio chunks. Defaults to 0.25.
+    batch_size : int, optional
+        Defaults to 32.
+    device : optional
+    num_threads : int, optional
+        Number of threads used by torch for intra-op parallelism during
+        inference. Defaults to torch current setting.
+
+    Usage
+    -----
+    >>> multi = MultiPretrained({"sad": sad_dir, "scd": scd_dir, "ovl": ovl_dir})
+    >>> scores = multi(current_file)
+    >>> scores["sad"]  # same as Pretrained(validate_dir=sad_dir)(current_file)
+
+    Results can then be fed to pipelines as existing keys (e.g. "@sad_scores")
+    of protocol files.
+    """
+
+    def __init__(
+        self,
+        validate_dirs: Dict[Text, Path],
+        duration: float = None,
+        step: float = None,
+        batch_size: int = 32,
+        device: Optional[Union[Text, torch.device]] = None,
+        num_threads: int = None,
+    ):
+
+        super().__init__()
+
+        self.pretrained_ = {
+            name: Pretrained(
+                validate_dir=validate_dir,
+                duration=duration,
+                step=step,
+                batch_size=batch_size,
+                device=device,
+            )
+            for name, validate_dir in validate_dirs.items()
+        }
+
+        if not self.pretrained_:
+            msg = "`validate_dirs` must contain at least one validation directory."
+            raise ValueError(msg)
+
+        # check that all models are compatible with each other
+        (name, reference), *others = self.pretrained_.items()
+        for other_name, other in others:
+
+            if _feature_extraction_config(other) != _feature_extraction_config(
+                reference
+            ):
+                msg = (
+                    f'"{name}" and "{other_name}" models do not share the '
+                    f"same feature extraction."
+                )
+                raise ValueError(msg)
+
+            if other.preprocessors_config_ != reference.preprocessors_config_:
+                msg = (
+                    f'"{name}" and "{other_name}" models do not share the '
+                    f"same preprocessors."
+                )
+                raise ValueError(msg)
+
+            if not _same_window(other.chunks_, reference.chunks_):
+                msg = (
+                    f'"{name}" and "{other_name}" models do not use the same '
+                    f"sliding window: use `duration` parameter to force a "
+                    f"common chunk duration."
+                )
+                raise ValueError(msg)
+
+        self.reference_ = reference
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+
+    @property
+    def names(self):
+        """Names of models"""
+        return list(self.pretrained_)
+
+    def __call__(self, current_file) -> Dict[Text, SlidingWindowFeature]:
+        """Apply all models on file
+
+        Parameters
+        ----------
+        current_file : dict
+            `pyannote.database` file.
+
+        Returns
+        -------
+        outputs : dict
+            Maps model names to their output.
+        """
+        ((_, outputs),) = self.iter_outputs([current_file])
+        return outputs
+
+    def iter_outputs(
+        self, files: Iterable[dict]
+    ) -> Iterator[Tuple[dict, Dict[Text, SlidingWindowFeature]]]:
+        """Apply all models on a sequence of files
+
+        Chunks of consecutive files are packed into full batches.
+        See `Pretrained.iter_outputs`.
+
+        Parameters
+        ----------
+        files : iterable of dict
+            `pyannote.database` files.
+
+        Yields
+        ------
+        current_file : dict
+            `pyannote.database` file.
+        outputs : dict
+            Maps model names to their output on `current_file`.
+        """
+
+        inputs = (
+            (current_file, self.reference_.feature_extraction_(current_file))
+            for current_file in files
+        )
+
+        for current_file, outputs in _slide_stream(
+            [pretrained.model_ for pretrained in self.pretrained_.values()],
+            inputs,
+            self.reference_.chunks_,
+            batch_size=self.batch_size,
+            device=self.reference_.device,
+            num_threads=self.num_threads,
+        ):
+            yield current_file, {
+                name: SlidingWindowFeature(output.data, pretrained.sliding_window)
+                for (name, pretrained), output in zip(
+                    self.pretrained_.items(), outputs
+                )
+            }
@@ -26,8 +26,16 @@
 # AUTHORS
 # Hervé BREDIN - http://herve.niderb.fr
 
+import os
+import threading
 import warnings
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from math import gcd
+
 import numpy as np
+import scipy.signal
 
 import librosa
 from librosa.util import valid_audio
@@ -126,6 +134,243 @@ def read_audio(current_file, sample_rate=None, mono=True):
     return y, sample_rate
 
 
+@lru_cache(maxsize=None)
+def _get_polyphase_filter(source_sample_rate, target_sample_rate):
+    """Anti-aliasing filter used for polyphase resampling
+
+    Same as the one used by `scipy.signal.resample_poly`, but computed only
+    once per (source_sample_rate, target_sample_rate) pair.
+
+    Returns
+    -------
+    up, down : int
+        Upsampling and downsampling factors.
+    h : np.ndarray
+        Low-pass FIR filter, centered on `half_len`.
+    half_len : int
+        Half length of the filter (in upsampled domain).
+    """
+    g = gcd(source_sample_rate, target_sample_rate)
+    up, down = target_sample_rate // g, source_sample_rate // g
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    h = scipy.signal.firwin(
+        2 * half_len + 1, 1.0 / max_rate, window=("kaiser", 5.0)
+    ).astype(np.float32)
+    return up, down, up * h, half_len
+
+
+def _get_resampling_range(start, end, source_sample_rate, target_sample_rate):
+    """Range of source samples needed to resample a range of target samples
+
+    Parameters
+    ----------
+    start, end : int
+        Range of target samples (at `target_sample_rate`).
+    source_sample_rate, target_sample_rate : int
+
+    Returns
+    -------
+    source_start, source_end : int
+        Range of source samples (at `source_sample_rate`) covering the support
+        of the polyphase filter. `source_start` may be negative and
+        `source_end` may go beyond the end of the file: missing samples are
+        assumed to be zero.
+    """
+    up, down, _, half_len = _get_polyphase_filter(
+        source_sample_rate, target_sample_rate
+    )
+    margin = half_len // up + 1
+    source_start = (start * down) // up - margin
+    source_end = -((-(end - 1) * down) // up) + margin + 1
+    return source_start, source_end
+
+
+def _resample_window(x, offset, start, end, source_sample_rate, target_sample_rate):
+    """Resample a range of samples using polyphase filtering
+
+    Output is the same (up to floating point precision) as resampling the whole signal with
+    `scipy.signal.resample_poly` and then keeping samples `start` to `end`.
+    Only the source samples within the support of the polyphase filter are
+    actually needed (see `_get_resampling_range`).
+
+    Parameters
+    ----------
+    x : (n_source_samples, n_channels) np.ndarray
+        Source samples, starting at index `offset`.
+    offset : int
+        Index (at `source_sample_rate`) of first sample of `x`.
+    start, end : int
+        Range of target samples (at `target_sample_rate`).
+    source_sample_rate, target_sample_rate : int
+
+    Returns
+    -------
+    y : (end - start, n_channels) np.ndarray
+        Resampled samples.
+    """
+
+    up, down, h, half_len = _get_polyphase_filter(
+        source_sample_rate, target_sample_rate
+    )
+    source_start, source_end = _get_resampling_range(
+        start, end, source_sample_rate, target_sample_rate
+    )
+
+    # zero-pad (or trim) source samples to [source_start, source_end) range
+    x = x[max(0, source_start - offset) : max(0, source_end - offset)]
+    left = max(0, offset - source_start)
+    right = source_end - source_start - left - len(x)
+    if left > 0 or right > 0:
+        x = np.pad(x, ((left, max(0, right)), (0, 0)), mode="constant")
+
+    # delay filter so that target samples fall on the downsampling grid
+    delay = (source_start * up - half_len) % down
+    if delay > 0:
+        h = np.concatenate([np.zeros((delay,), dtype=h.dtype), h])
+
+    # index of first target sample in upfirdn output
+    first = start + (half_len + delay - source_start * up) // down
+
+    y = scipy.signal.upfirdn(h, x, up=up, down=down, axis=0)
+    return y[first : first + end - start].astype(np.float32, copy=False)
+
+
+def _group_by_file(current_files):
+    """Group indices of (the very same) files
+
+    Parameters
+    ----------
+    current_files : list of dict
+        `pyannote.database` files.
+
+    Returns
+    -------
+    groups : list of list of int
+        Indices of each file, in order of first appearance.
+    """
+    groups = OrderedDict()
+    for i, current_file in enumerate(current_files):
+        groups.setdefault(id(current_file), []).append(i)
+    return list(groups.values())
+
+
+class SoundFilePool:
+    """Thread-safe, size-bounded pool of open `soundfile.SoundFile` handles
+
+    Opening an audio file can be as costly as decoding a short chunk of it
+    (especially on network file systems). This pool keeps the most recently
+    used handles open, evicting the least recently used ones once `maxsize`
+    handles are open.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        Maximum number of simultaneously open handles. Defaults to 64.
+
+    Usage
+    -----
+    >>> pool = SoundFilePool(maxsize=64)
+    >>> with pool.open("/path/to/audio.wav") as audio_file:
+    ...     audio_file.seek(16000)
+    ...     data = audio_file.read(16000, dtype="float32", always_2d=True)
+
+    Notes
+    -----
+    Each handle comes with its own lock, held for the whole duration of the
+    `with` block: concurrent threads reading the same file are serialized while
+    threads reading different files are not. Handles are never shared across
+    processes: a forked child process starts with an empty pool.
+    """
+
+    def __init__(self, maxsize: int = 64):
+        super().__init__()
+        self.maxsize = maxsize
+        self._reset()
+
+    def _reset(self):
+        self.pid_ = os.getpid()
+        self.lock_ = threading.Lock()
+        # path --> (handle, handle lock), least recently used first
+        self.handles_ = OrderedDict()
+
+    @contextmanager
+    def open(self, path):
+        """Context manager providing exclusive access to an open handle
+
+        Parameters
+        ----------
+        path : str or Path
+            Path to audio file.
+
+        Yields
+        ------
+        audio_file : `soundfile.SoundFile`
+            Open handle. It must not be closed by the caller.
+        """
+
+        path = str(path)
+
+        # handles (and locks) inherited from a parent process cannot be used
+        if os.getpid() != self.pid_:
+            self._reset()
+
+        with self.lock_:
+            entry = self.handles_.pop(path, None)
+            if entry is not None:
+                # mark as most recently used
+                self.handles_[path] = entry
+
+        if entry is None:
+            # opening is done outside of the pool lock so that one slow open
+            # does not prevent other threads from using the pool
+            entry = (SoundFile(path, "r"), threading.Lock())
+            with self.lock_:
+                concurrent = self.handles_.pop(path, None)
+                if concurrent is not None:
+                    # another thread opened the same file in the meantime
+                    entry[0].close()
+                    entry = concurrent
+                self.handles_[path] = entry
+                evicted = []
+                while len(self.handles_) > self.maxsize:
+                    evicted.append(self.handles_.popitem(last=False)[1])
+
+            self._close(evicted)
+
+        audio_file, lock = entry
+        with lock:
+            if audio_file.closed:
+                # handle was evicted and closed in the meantime
+                with SoundFile(path, "r") as audio_file:
+                    yield audio_file
+            else:
+                yield audio_file
+
+    @staticmethod
+    def _close(evicted):
+        for audio_file, lock in evicted:
+            # handles still in use by another thread (or by the current one,
+            # in case of nested calls) are left for the garbage collector to
+            # close once released.
+            if lock.acquire(blocking=False):
+                try:
+                    audio_file.close()
+                finally:
+                    lock.release()
+
+    def clear(self):
+        """Close all open handles"""
+        with self.lock_:
+            evicted = list(self.handles_.values())
+            self.handles_.clear()
+        self._close(evicted)
+
+
+# process-wide pool of open audio files, shared by all `RawAudio` instances
+SOUND_FILE_POOL = SoundFilePool()
+
+
 class RawAudio:
     """Raw audio with on-the-fly data augmentation
 
@@ -164,13 +409,18 @@ class RawAudio:
 
     def get_features(self, y, sample_rate):
 
+        # convert 16-bit PCM (e.g. from `WaveformStore`) to float
+        if y.dtype == np.int16:
+            y = y.astype(np.float32) / 32768.0
+
         # convert to mono
         if self.mono:
             y = np.mean(y, axis=1, keepdims=True)
 
         # resample if sample rates mismatch
         if (self.sample_rate is not None) and (self.sample_rate != sample_rate):
-            y = librosa.core.resample(y.T, sample_rate, self.sample_rate).T
+            n_samples = -(-len(y) * self.sample_rate // sample_rate)
+            y = _resample_window(y, 0, 0, n_samples, sample_rate, self.sample_rate)
             sample_rate = self.sample_rate
 
         # augment data
@@ -225,9 +475,10 @@ class RawAudio:
                 raise ValueError(msg)
 
         else:
-            y, sample_rate = sf.read(
-                current_file["audio"], dtype="float32", always_2d=True
-            )
+            with SOUND_FILE_POOL.open(current_file["audio"]) as audio_file:
+                sample_rate = audio_file.samplerate
+                audio_file.seek(0)
+                y = audio_file.read(dtype="float32", always_2d=True)
 
         # extract specific channel if requested
         channel = current_file.get("channel", None)
@@ -251,6 +502,10 @@ class RawAudio:
     def get_context_duration(self):
         return 0.0
 
+    def get_block_margin(self):
+        # samples do not depend on their neighbors
+        return self.get_context_duration()
+
     def crop(self, current_file, segment, mode="center", fixed=None):
         """Fast version of self(current_file).crop(segment, **kwargs)
 
@@ -294,10 +549,6 @@ class RawAudio:
             segment, mode=mode, fixed=fixed, return_ranges=True
         )
 
-        # this is expected number of samples.
-        # this will be useful later in case of on-the-fly resampling
-        n_samples = end - start
-
         if "waveform" in current_file:
 
             y = current_file["waveform"]
@@ -314,42 +565,234 @@ class RawAudio:
 
         else:
             # read file with SoundFile, which supports various fomats
-            # including NIST sphere
-            with SoundFile(current_file["audio"], "r") as audio_file:
+            # including NIST sphere. handles are shared by all instances.
+            with SOUND_FILE_POOL.open(current_file["audio"]) as audio_file:
 
                 sample_rate = audio_file.samplerate
 
-                # if the sample rates are mismatched,
-                # recompute the start and end
+                # if the sample rates are mismatched, only read the samples
+                # needed by the polyphase resampling filter
                 if sample_rate != self.sample_rate:
-
-                    sliding_window = SlidingWindow(
-                        start=-0.5 / sample_rate,
-                        duration=1.0 / sample_rate,
-                        step=1.0 / sample_rate,
-                    )
-                    ((start, end),) = sliding_window.crop(
-                        segment, mode=mode, fixed=fixed, return_ranges=True
+                    read_start, read_end = _get_resampling_range(
+                        start, end, sample_rate, self.sample_rate
                     )
+                    # missing samples are zero-padded by `_resample_window`
+                    read_start = max(0, read_start)
+                else:
+                    read_start, read_end = start, end
 
                 try:
-                    audio_file.seek(start)
-                    data = audio_file.read(end - start, dtype="float32", always_2d=True)
-                except RuntimeError as e:
-                    msg = (
-                        f"SoundFile failed to seek-and-read in "
-                        f"{current_file['audio']}: loading the whole file..."
+                    audio_file.seek(read_start)
+                    data = audio_file.read(
+                        read_end - read_start, dtype="float32", always_2d=True
                     )
-                    warnings.warn(msg)
-                    return self(current_file).crop(segment, mode=mode, fixed=fixed)
+                except RuntimeError as e:
+                    data = None
+
+            # fallback is done outside of the above "with" block as the
+            # pooled handle cannot be re-entered until it is released.
+            if data is None:
+                msg = (
+                    f"SoundFile failed to seek-and-read in "
+                    f"{current_file['audio']}: loading the whole file..."
+                )
+                warnings.warn(msg)
+                return self(current_file).crop(segment, mode=mode, fixed=fixed)
 
         # extract specific channel if requested
         channel = current_file.get("channel", None)
         if channel is not None:
             data = data[:, channel - 1 : channel]
 
+        # resample to exactly `end - start` samples
+        if sample_rate != self.sample_rate:
+            data = _resample_window(
+                data, read_start, start, end, sample_rate, self.sample_rate
+            )
+            sample_rate = self.sample_rate
+
         return self.get_features(data, sample_rate)
 
+    def _read_many(self, current_file, segments, mode="center", fixed=None):
+        """Read (non-augmented) waveform of multiple segments at once
+
+        Parameters
+        ----------
+        current_file : dict
+            `pyannote.database` file.
+        segments : list of `pyannote.core.Segment`
+            Segments from which to extract waveform.
+        mode : {'loose', 'strict', 'center'}, optional
+            See `crop`. Defaults to 'center'.
+        fixed : list of float, optional
+            One `fixed` duration (or None) per segment. See `crop`.
+
+        Returns
+        -------
+        waveforms : list of (n_samples, n_channels) numpy array
+            Waveforms, in the same order as `segments`, resampled to
+            `self.sample_rate` when needed.
+        sample_rate : int
+            Sampling rate of returned waveforms.
+        """
+
+        if self.sample_rate is None:
+            msg = (
+                "`RawAudio` needs to be instantiated with an actual "
+                "`sample_rate` if one wants to use `crop_many`."
+            )
+            raise ValueError(msg)
+
+        if fixed is None:
+            fixed = [None] * len(segments)
+
+        sliding_window = self.sliding_window_
+        ranges = [
+            sliding_window.crop(s, mode=mode, fixed=f, return_ranges=True)[0]
+            for s, f in zip(segments, fixed)
+        ]
+
+        if "waveform" in current_file:
+
+            y = current_file["waveform"]
+
+            if len(y.shape) != 2:
+                msg = (
+                    f"Precomputed waveform should be provided as a "
+                    f"(n_samples, n_channels) `np.ndarray`."
+                )
+                raise ValueError(msg)
+
+            sample_rate = self.sample_rate
+            waveforms = [y[start:end] for start, end in ranges]
+
+        else:
+            # read file with SoundFile, which supports various fomats
+            # including NIST sphere. handles are shared by all instances.
+            with SOUND_FILE_POOL.open(current_file["audio"]) as audio_file:
+
+                sample_rate = audio_file.samplerate
+
+                # if the sample rates are mismatched, only read the samples
+                # needed by the polyphase resampling filter
+                if sample_rate != self.sample_rate:
+                    read_ranges = [
+                        _get_resampling_range(
+                            start, end, sample_rate, self.sample_rate
+                        )
+                        for start, end in ranges
+                    ]
+                else:
+                    read_ranges = ranges
+
+                # sort segments by start time and group those that are
+                # close enough to one another to be served by one read.
+                # gaps shorter than one second are read (and dropped)
+                # rather than seeked over.
+                order = sorted(range(len(ranges)), key=lambda i: read_ranges[i])
+                groups = []
+                for i in order:
+                    start, end = read_ranges[i]
+                    if groups and start <= groups[-1][1] + sample_rate:
+                        groups[-1][1] = max(groups[-1][1], end)
+                        groups[-1][2].append(i)
+                    else:
+                        groups.append([start, end, [i]])
+
+                chunks = [None] * len(ranges)
+                try:
+                    for group_start, group_end, indices in groups:
+                        offset = max(0, group_start)
+                        audio_file.seek(offset)
+                        data = audio_file.read(
+                            group_end - offset, dtype="float32", always_2d=True
+                        )
+                        for i in indices:
+                            chunks[i] = (data, offset)
+
+                except RuntimeError as e:
+                    chunks = None
+
+            if chunks is None:
+                msg = (
+                    f"SoundFile failed to seek-and-read in "
+                    f"{current_file['audio']}: loading the whole file..."
+                )
+                warnings.warn(msg)
+                y, _ = sf.read(current_file["audio"], dtype="float32", always_2d=True)
+                chunks = [(y, 0)] * len(ranges)
+
+            waveforms = []
+            for (data, offset), (start, end), (read_start, read_end) in zip(
+                chunks, ranges, read_ranges
+            ):
+                chunk = data[max(0, read_start) - offset : read_end - offset]
+                if read_start < 0:
+                    # negative start may happen because of rounding errors
+                    pad = np.zeros((-read_start, chunk.shape[1]), dtype=chunk.dtype)
+                    chunk = np.vstack([pad, chunk])
+                waveforms.append(chunk)
+
+        # extract specific channel if requested
+        channel = current_file.get("channel", None)
+        if channel is not None:
+            waveforms = [data[:, channel - 1 : channel] for data in waveforms]
+
+        # resample to exactly `end - start` samples
+        if sample_rate != self.sample_rate:
+            waveforms = [
+                _resample_window(
+                    data, read_start, start, end, sample_rate, self.sample_rate
+                )
+                for data, (start, end), (read_start, _) in zip(
+                    waveforms, ranges, read_ranges
+                )
+            ]
+            sample_rate = self.sample_rate
+
+        return waveforms, sample_rate
+
+    def crop_many(self, current_file, segments, mode="center", fixed=None):
+        """Batched version of self.crop
+
+        Audio file is opened only once and neighbouring segments are served by
+        one single read, which is much faster than calling `crop` repeatedly.
+
+        Parameters
+        ----------
+        current_file : dict
+            `pyannote.database` file.
+        segments : iterable of `pyannote.core.Segment`
+            Segments from which to extract waveform.
+        mode : {'loose', 'strict', 'center'}, optional
+            See `crop`. Defaults to 'center'.
+        fixed : float, optional
+            See `crop`.
+
+        Returns
+        -------
+        waveforms : (n_segments, n_samples, n_channels) numpy array
+            Stacked waveforms, in the same order as `segments`. When `fixed`
+            is not provided, the number of samples might differ from one
+            segment to another, and a list of (n_samples, n_channels) numpy
+            arrays is returned instead.
+
+        See also
+        --------
+        `RawAudio.crop`
+        """
+
+        segments = list(segments)
+        waveforms, sample_rate = self._read_many(
+            current_file, segments, mode=mode, fixed=[fixed] * len(segments)
+        )
+        waveforms = [self.get_features(data, sample_rate) for data in waveforms]
+
+        if fixed is None:
+            return waveforms
+
+        return np.stack(waveforms)
+
 
 # # THIS SCRIPT CAN BE USED TO CRASH-TEST THE ON-THE-FLY RESAMPLING
 
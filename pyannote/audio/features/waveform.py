@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2020 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+"""
+# Decoded waveform store
+"""
+
+import io
+import os
+from pathlib import Path
+
+import yaml
+import numpy as np
+import soundfile as sf
+
+from pyannote.audio.utils.path import mkdir_p
+from pyannote.audio.utils.path import mkstemp
+from .utils import _resample_window
+
+
+class WaveformStore:
+    """Store of decoded (and resampled) waveforms
+
+    Decoding compressed audio files (FLAC, MP3, SPHERE, ...) and seeking inside
+    them is slow. `WaveformStore` decodes each file once, resamples it to
+    `sample_rate`, and stores the resulting PCM samples as a memory-mapped
+    numpy array that can be sliced without copy and whose pages are shared by
+    all processes reading it.
+
+    Parameters
+    ----------
+    root_dir : `str`
+        Path to directory where decoded waveforms are stored.
+    sample_rate : `int`, optional
+        Sample rate of stored waveforms. This is not used when `root_dir`
+        already exists and contains `metadata.yml`.
+    dtype : {"float32", "int16"}, optional
+        Storage type of samples. "int16" halves storage size at the cost of
+        16-bit quantization. Defaults to "float32". This is not used when
+        `root_dir` already exists and contains `metadata.yml`.
+
+    Usage
+    -----
+    `WaveformStore` instances are meant to be used as a "waveform"
+    preprocessor, whose output is used by `RawAudio` (and therefore all
+    `FeatureExtraction` instances) instead of reading the audio file:
+
+    >>> store = WaveformStore("/path/to/store", sample_rate=16000)
+    >>> preprocessors = {"audio": FileFinder(), "waveform": store}
+    >>> protocol = get_protocol("Etape.SpeakerDiarization.TV",
+    ...                         preprocessors=preprocessors)
+
+    Files are decoded and stored the first time they are requested. Use `dump`
+    to populate the store beforehand.
+
+    Notes
+    -----
+    Waveforms are stored with all their channels so that the "channel" key of
+    protocol files is still honored by `RawAudio`. The sample rate of
+    `RawAudio` must match the one of the store.
+    """
+
+    def __init__(self, root_dir=None, sample_rate=None, dtype="float32"):
+
+        super().__init__()
+        self.root_dir = Path(root_dir).expanduser().resolve(strict=False)
+
+        path = self.root_dir / "metadata.yml"
+        if path.exists():
+
+            with io.open(path, "r") as f:
+                params = yaml.load(f, Loader=yaml.SafeLoader)
+
+            self.sample_rate_ = params["sample_rate"]
+            self.dtype_ = params["dtype"]
+
+            if sample_rate is not None and self.sample_rate_ != sample_rate:
+                msg = 'inconsistent "sample_rate" (is: {0}, should be: {1})'
+                raise ValueError(msg.format(sample_rate, self.sample_rate_))
+
+        else:
+
+            if sample_rate is None:
+                msg = (
+                    f"Either directory {self.root_dir} does not exist or it "
+                    f"does not contain decoded waveforms. In case it exists "
+                    f"and this was done on purpose, please provide "
+                    f"`sample_rate` parameter when instantiating "
+                    f"`WaveformStore`."
+                )
+                raise ValueError(msg)
+
+            if dtype not in ("float32", "int16"):
+                msg = f'Unsupported "dtype" ({dtype}): use "float32" or "int16".'
+                raise ValueError(msg)
+
+            # create parent directory
+            mkdir_p(path.parent)
+
+            params = {"sample_rate": sample_rate, "dtype": dtype}
+            with io.open(path, "w") as f:
+                yaml.dump(params, f, default_flow_style=False)
+
+            self.sample_rate_ = sample_rate
+            self.dtype_ = dtype
+
+    @property
+    def sample_rate(self) -> int:
+        """Sample rate of stored waveforms"""
+        return self.sample_rate_
+
+    @property
+    def dtype(self) -> str:
+        """Storage type of samples"""
+        return self.dtype_
+
+    def get_path(self, current_file) -> Path:
+        # all channels are stored together: do not use get_unique_identifier
+        # as it would include the "channel" key
+        uri = current_file["uri"]
+        database = current_file.get("database", None)
+        if database is not None:
+            uri = f"{database}/{uri}"
+        return self.root_dir / f"{uri}.npy"
+
+    def __contains__(self, current_file) -> bool:
+        return self.get_path(current_file).exists()
+
+    def decode(self, current_file) -> np.ndarray:
+        """Decode and resample audio file
+
+        Parameters
+        ----------
+        current_file : dict
+            `pyannote.database` file.
+
+        Returns
+        -------
+        waveform : (n_samples, n_channels) np.ndarray
+            Decoded waveform, with type `self.dtype`.
+        """
+
+        y, sample_rate = sf.read(current_file["audio"], dtype="float32", always_2d=True)
+
+        if sample_rate != self.sample_rate:
+            n_samples = -(-len(y) * self.sample_rate // sample_rate)
+            y = _resample_window(y, 0, 0, n_samples, sample_rate, self.sample_rate)
+
+        if self.dtype == "int16":
+            y = np.clip(np.round(y * 32768.0), -32768, 32767).astype(np.int16)
+
+        return y
+
+    def dump(self, current_file) -> Path:
+        """Decode audio file and store it, unless it is already there
+
+        Parameters
+        ----------
+        current_file : dict
+            `pyannote.database` file.
+
+        Returns
+        -------
+        path : Path
+            Path to stored waveform.
+        """
+
+        path = self.get_path(current_file)
+        if path.exists():
+            return path
+
+        mkdir_p(path.parent)
+        y = self.decode(current_file)
+
+        # write to a temporary file first and move it in place atomically, so
+        # that concurrent readers never see a partially written waveform
+        fd, tmp = mkstemp(suffix=".npy", dir=path.parent)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, y)
+            os.replace(tmp, path)
+        except Exception as e:
+            os.remove(tmp)
+            raise e
+
+        return path
+
+    def __call__(self, current_file) -> np.ndarray:
+        """Get (memory-mapped) waveform
+
+        Parameters
+        ----------
+        current_file : dict
+            `pyannote.database` file.
+
+        Returns
+        -------
+        waveform : (n_samples, n_channels) np.memmap
+            Read-only memory-mapped waveform, with type `self.dtype`.
+            `RawAudio` takes care of converting "int16" samples to float.
+        """
+
+        path = self.dump(current_file)
+        return np.load(str(path), mmap_mode="r")
@@ -30,8 +30,13 @@
 Feature extraction using [`librosa`](https://librosa.github.io/librosa/)
 """
 
+from typing import List
+
 import librosa
 import numpy as np
+import scipy.fftpack
+import scipy.signal
+from librosa.util.exceptions import ParameterError
 
 from .base import FeatureExtraction
 from pyannote.core.segment import SlidingWindow
@@ -50,14 +55,34 @@ class LibrosaFeatureExtraction(FeatureExtraction):
         Defaults to 0.025 (25ms).
     step : float, optional
         Defaults to 0.010 (10ms).
+    backend : {"librosa", "torch"}, optional
+        Use "torch" to compute features with a batched `torch` implementation
+        that matches `librosa` output (within floating point tolerance). This
+        is much faster when used with `get_features_batch`. Defaults to
+        "librosa".
     """
 
-    def __init__(self, sample_rate=16000, augmentation=None, duration=0.025, step=0.01):
+    def __init__(
+        self,
+        sample_rate=16000,
+        augmentation=None,
+        duration=0.025,
+        step=0.01,
+        backend="librosa",
+    ):
 
         super().__init__(sample_rate=sample_rate, augmentation=augmentation)
         self.duration = duration
         self.step = step
 
+        if backend not in ("librosa", "torch"):
+            msg = f'Unsupported "backend" ({backend}): use "librosa" or "torch".'
+            raise ValueError(msg)
+        self.backend = backend
+
+        # windows, filterbanks, etc. used by "torch" backend
+        self.cache_ = dict()
+
         self.sliding_window_ = SlidingWindow(
             start=-0.5 * self.duration, duration=self.duration, step=self.step
         )
@@ -65,6 +90,101 @@ class LibrosaFeatureExtraction(FeatureExtraction):
     def get_resolution(self):
         return self.sliding_window_
 
+    def get_features_batch(self, waveforms, sample_rate=None) -> List[np.ndarray]:
+
+        if sample_rate is None:
+            sample_rate = self.sample_rate
+
+        if self.backend == "torch":
+            return self.get_features_torch(waveforms, sample_rate)
+
+        return super().get_features_batch(waveforms, sample_rate=sample_rate)
+
+    def get_features_torch(self, waveforms, sample_rate) -> List[np.ndarray]:
+        """Extract features from a batch of waveforms, with torch"""
+        msg = f'"torch" backend is not supported by {self.__class__.__name__}.'
+        raise NotImplementedError(msg)
+
+    def _cached(self, key, compute):
+        """Compute (windows, filterbanks, ...) only once"""
+        if key not in self.cache_:
+            self.cache_[key] = compute()
+        return self.cache_[key]
+
+    def _stft(self, waveforms, n_fft, hop_length, window, power):
+        """Batched equivalent of np.abs(librosa.stft(y, center=True)) ** power
+
+        Parameters
+        ----------
+        waveforms : list of (n_samples, 1) numpy array
+        n_fft, hop_length : int
+        window : str
+            Window type, as understood by `scipy.signal.get_window`.
+        power : float
+
+        Returns
+        -------
+        S : (batch_size, 1 + n_fft // 2, n_frames) torch.Tensor
+            Zero-padded magnitude (or power) spectrogram.
+        n_frames : list of int
+            Actual number of frames of each waveform.
+        """
+
+        import torch
+
+        w = self._cached(
+            ("window", window, n_fft),
+            lambda: torch.tensor(
+                scipy.signal.get_window(window, n_fft, fftbins=True),
+                dtype=torch.float32,
+            ),
+        )
+
+        # center frames like librosa does (with reflection padding) before
+        # zero-padding waveforms to the same length. this makes sure that
+        # frames do not depend on other waveforms of the batch.
+        pad = n_fft // 2
+        signals = [
+            np.pad(np.asarray(y, dtype=np.float32).reshape(-1), pad, mode="reflect")
+            for y in waveforms
+        ]
+        n_frames = [1 + (len(x) - n_fft) // hop_length for x in signals]
+        max_length = max(len(x) for x in signals)
+        batch = np.zeros((len(signals), max_length), dtype=np.float32)
+        for b, x in enumerate(signals):
+            batch[b, : len(x)] = x
+
+        S = torch.stft(
+            torch.from_numpy(batch),
+            n_fft,
+            hop_length=hop_length,
+            win_length=n_fft,
+            window=w,
+            center=False,
+            return_complex=True,
+        ).abs()
+
+        if power != 1.0:
+            S = S ** power
+
+        return S, n_frames
+
+    @staticmethod
+    def _to_db(S, n_frames, amin, top_db, multiplier=10.0):
+        """Batched equivalent of librosa.power_to_db(S, ref=1.0)
+
+        Use multiplier=20.0 for librosa.amplitude_to_db(S, ref=1.0).
+        """
+
+        import torch
+
+        log_S = multiplier * torch.log10(torch.clamp(S, min=amin))
+        features = []
+        for b, n in enumerate(n_frames):
+            x = log_S[b, :, :n]
+            features.append(torch.max(x, x.max() - top_db))
+        return features
+
 
 class LibrosaSpectrogram(LibrosaFeatureExtraction):
     """librosa spectrogram
@@ -82,7 +202,12 @@ class LibrosaSpectrogram(LibrosaFeatureExtraction):
     """
 
     def __init__(
-        self, sample_rate=16000, augmentation=None, duration=0.025, step=0.010
+        self,
+        sample_rate=16000,
+        augmentation=None,
+        duration=0.025,
+        step=0.010,
+        backend="librosa",
     ):
 
         super().__init__(
@@ -90,6 +215,7 @@ class LibrosaSpectrogram(LibrosaFeatureExtraction):
             augmentation=augmentation,
             duration=duration,
             step=step,
+            backend=backend,
         )
 
         self.n_fft_ = int(self.duration * self.sample_rate)
@@ -98,6 +224,12 @@ class LibrosaSpectrogram(LibrosaFeatureExtraction):
     def get_dimension(self):
         return self.n_fft_ // 2 + 1
 
+    def get_features_torch(self, waveforms, sample_rate):
+        S, n_frames = self._stft(
+            waveforms, self.n_fft_, self.hop_length_, "hamming", power=1.0
+        )
+        return [S[b, :, :n].T.numpy() for b, n in enumerate(n_frames)]
+
     def get_features(self, y, sample_rate):
         """Feature extraction
 
@@ -114,6 +246,9 @@ class LibrosaSpectrogram(LibrosaFeatureExtraction):
             Features
         """
 
+        if self.backend == "torch":
+            return self.get_features_torch([y], sample_rate)[0]
+
         fft = librosa.core.stft(
             y=y.squeeze(),
             n_fft=self.n_fft_,
@@ -148,6 +283,7 @@ class LibrosaMelSpectrogram(LibrosaFeatureExtraction):
         duration=0.025,
         step=0.010,
         n_mels=96,
+        backend="librosa",
     ):
 
         super().__init__(
@@ -155,6 +291,7 @@ class LibrosaMelSpectrogram(LibrosaFeatureExtraction):
             augmentation=augmentation,
             duration=duration,
             step=step,
+            backend=backend,
         )
 
         self.n_mels = n_mels
@@ -164,6 +301,28 @@ class LibrosaMelSpectrogram(LibrosaFeatureExtraction):
     def get_dimension(self):
         return self.n_mels
 
+    def get_features_torch(self, waveforms, sample_rate):
+
+        import torch
+
+        mel_basis = self._cached(
+            ("mel", sample_rate),
+            lambda: torch.tensor(
+                librosa.filters.mel(
+                    sr=sample_rate, n_fft=self.n_fft_, n_mels=self.n_mels
+                ),
+                dtype=torch.float32,
+            ),
+        )
+
+        S, n_frames = self._stft(
+            waveforms, self.n_fft_, self.hop_length_, "hann", power=2.0
+        )
+        X = torch.matmul(mel_basis, S)
+
+        X_db = self._to_db(X, n_frames, amin=1e-5, top_db=80.0, multiplier=20.0)
+        return [x.T.numpy() for x in X_db]
+
     def get_features(self, y, sample_rate):
         """Feature extraction
 
@@ -180,6 +339,9 @@ class LibrosaMelSpectrogram(LibrosaFeatureExtraction):
             Features
         """
 
+        if self.backend == "torch":
+            return self.get_features_torch([y], sample_rate)[0]
+
         X = librosa.feature.melspectrogram(
             y.squeeze(),
             sr=sample_rate,
@@ -262,6 +424,7 @@ class LibrosaMFCC(LibrosaFeatureExtraction):
         fmin=0.0,
         fmax=None,
         n_mels=40,
+        backend="librosa",
     ):
 
         super().__init__(
@@ -269,6 +432,7 @@ class LibrosaMFCC(LibrosaFeatureExtraction):
             augmentation=augmentation,
             duration=duration,
             step=step,
+            backend=backend,
         )
 
         self.e = e
@@ -301,6 +465,9 @@ class LibrosaMFCC(LibrosaFeatureExtraction):
             Features
         """
 
+        if self.backend == "torch":
+            return self.get_features_torch([y], sample_rate)[0]
+
         # adding because C0 is the energy
         n_mfcc = self.coefs + 1
 
@@ -346,6 +513,144 @@ class LibrosaMFCC(LibrosaFeatureExtraction):
 
         return np.vstack(stack).T
 
+    @staticmethod
+    def _delta_operator(width, order):
+        """Linear operator equivalent to librosa.feature.delta(mode="interp")
+
+        Returns
+        -------
+        M : (width, width) np.ndarray
+            M[width // 2] is the (correlation) kernel applied to inner frames,
+            M[:width // 2] (resp. M[width // 2 + 1:]) applies to the first
+            (resp. last) `width` frames to get the first (resp. last)
+            `width // 2` frames.
+        """
+        return scipy.signal.savgol_filter(
+            np.eye(width),
+            width,
+            deriv=order,
+            polyorder=order,
+            axis=0,
+            mode="interp",
+        )
+
+    def _delta(self, mfcc, n_frames, order, width=9):
+        """Batched equivalent of librosa.feature.delta(width=9, order=order)"""
+
+        import torch
+
+        M = self._cached(
+            ("delta", width, order),
+            lambda: torch.tensor(
+                self._delta_operator(width, order), dtype=torch.float32
+            ),
+        )
+        half = width // 2
+
+        # inner frames
+        batch_size, dimension, _ = mfcc.shape
+        delta = torch.nn.functional.conv1d(
+            mfcc.reshape(batch_size * dimension, 1, -1), M[half].view(1, 1, width)
+        ).view(batch_size, dimension, -1)
+
+        deltas = []
+        for b, n in enumerate(n_frames):
+            first = torch.matmul(mfcc[b, :, :width], M[:half].T)
+            last = torch.matmul(mfcc[b, :, n - width : n], M[half + 1 :].T)
+            deltas.append(torch.cat([first, delta[b, :, : n - 2 * half], last], dim=1))
+        return deltas
+
+    def get_features_torch(self, waveforms, sample_rate):
+
+        import torch
+
+        # adding because C0 is the energy
+        n_mfcc = self.coefs + 1
+
+        n_fft = int(self.duration * sample_rate)
+        hop_length = int(self.step * sample_rate)
+
+        # derivatives need at least `width` frames: fail the same way as
+        # librosa.feature.delta rather than with an obscure torch error
+        if self.De or self.D or self.DDe or self.DD:
+            width = 9
+            pad = n_fft // 2
+            n_frames = min(
+                1 + (len(y) + 2 * pad - n_fft) // hop_length for y in waveforms
+            )
+            if n_frames < width:
+                msg = (
+                    f"when mode='interp', width={width} cannot exceed "
+                    f"data.shape[axis]={n_frames}"
+                )
+                raise ParameterError(msg)
+
+        mel_basis = self._cached(
+            ("mel", sample_rate),
+            lambda: torch.tensor(
+                librosa.filters.mel(
+                    sr=sample_rate,
+                    n_fft=n_fft,
+                    n_mels=self.n_mels,
+                    fmin=self.fmin,
+                    fmax=self.fmax,
+                    htk=True,
+                ),
+                dtype=torch.float32,
+            ),
+        )
+
+        # orthonormal DCT-II, as used by librosa.feature.mfcc
+        dct = self._cached(
+            ("dct", n_mfcc),
+            lambda: torch.tensor(
+                scipy.fftpack.dct(np.eye(self.n_mels), type=2, norm="ortho", axis=0)[
+                    :n_mfcc
+                ],
+                dtype=torch.float32,
+            ),
+        )
+
+        S, n_frames = self._stft(waveforms, n_fft, hop_length, "hann", power=2.0)
+        S_db = self._to_db(torch.matmul(mel_basis, S), n_frames, amin=1e-10, top_db=80.0)
+
+        # zero-padded (batch_size, n_mfcc, max_frames) MFCC
+        mfcc = torch.zeros(len(n_frames), n_mfcc, max(n_frames))
+        for b, (s, n) in enumerate(zip(S_db, n_frames)):
+            mfcc[b, :, :n] = torch.matmul(dct, s)
+
+        if self.De or self.D:
+            mfcc_d = self._delta(mfcc, n_frames, order=1)
+
+        if self.DDe or self.DD:
+            mfcc_dd = self._delta(mfcc, n_frames, order=2)
+
+        features = []
+        for b, n in enumerate(n_frames):
+
+            stack = []
+
+            if self.e:
+                stack.append(mfcc[b, 0:1, :n])
+
+            stack.append(mfcc[b, 1:, :n])
+
+            if self.De:
+                stack.append(mfcc_d[b][0:1])
+
+            if self.D:
+                stack.append(mfcc_d[b][1:])
+
+            if self.DDe:
+                stack.append(mfcc_dd[b][0:1])
+
+            if self.DD:
+                stack.append(mfcc_dd[b][1:])
+
+            features.append(torch.cat(stack, dim=0).T.numpy())
+
+        return features
+
     def get_dimension(self):
         n_features = 0
         n_features += self.e
@@ -27,12 +27,19 @@
 # Hervé BREDIN - http://herve.niderb.fr
 
 
+import threading
+from collections import OrderedDict
 from pathlib import Path
+from typing import Hashable
+from typing import Optional
 from typing import Text
 from typing import Union
 from typing import Dict
+from typing import Iterable
+from typing import List
 from functools import partial
 from pyannote.database import ProtocolFile
+from pyannote.database import get_unique_identifier
 from pyannote.core import Segment
 from pyannote.core import SlidingWindowFeature
 import numpy as np
@@ -46,6 +53,91 @@ def _use_existing_key(key, file):
     return file[key]
 
 
+class WrapperCache:
+    """Process-wide, size-bounded LRU cache of `Wrapper` outputs
+
+    Parameters
+    ----------
+    max_bytes : int, optional
+        Maximum total size (in bytes) of cached outputs. Defaults to 0, which
+        disables caching.
+
+    Usage
+    -----
+    Caching is opt-in and shared by all `Wrapper` instances of the process.
+    This is especially useful for pipelines that wrap the same model in
+    several of their blocks (e.g. `SpeakerDiarization`), or that are applied
+    many times on the same files (e.g. during hyper-parameter optimization):
+
+    >>> from pyannote.audio.features.wrapper import WRAPPER_CACHE
+    >>> WRAPPER_CACHE.max_bytes = 2 * 1024 ** 3  # 2GB
+    >>> # ... apply pipeline ...
+    >>> print(f"{WRAPPER_CACHE.hits} hits, {WRAPPER_CACHE.misses} misses")
+
+    Notes
+    -----
+    Outputs are cached per file (see `get_unique_identifier`) and per wrapped
+    scorer (as described by `Wrapper.cache_key`). Cached outputs are made
+    read-only as they might be shared by several callers.
+    """
+
+    def __init__(self, max_bytes: int = 0):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.lock_ = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """Empty cache and reset counters"""
+        with self.lock_:
+            self.entries_ = OrderedDict()
+            self.n_bytes_ = 0
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def n_bytes(self) -> int:
+        """Total size (in bytes) of cached outputs"""
+        return self.n_bytes_
+
+    def __len__(self) -> int:
+        return len(self.entries_)
+
+    def get(self, key: Hashable) -> Optional[SlidingWindowFeature]:
+        """Get cached output (or None when not cached)"""
+        with self.lock_:
+            value = self.entries_.get(key, None)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries_.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: SlidingWindowFeature):
+        """Cache output, evicting least recently used ones when needed"""
+
+        n_bytes = value.data.nbytes
+        if n_bytes > self.max_bytes:
+            return
+
+        value.data.flags.writeable = False
+
+        with self.lock_:
+            previous = self.entries_.pop(key, None)
+            if previous is not None:
+                self.n_bytes_ -= previous.data.nbytes
+            self.entries_[key] = value
+            self.n_bytes_ += n_bytes
+            while self.n_bytes_ > self.max_bytes:
+                _, evicted = self.entries_.popitem(last=False)
+                self.n_bytes_ -= evicted.data.nbytes
+
+
+# process-wide cache shared by all `Wrapper` instances (disabled by default)
+WRAPPER_CACHE = WrapperCache(max_bytes=0)
+
+
 class Wrapper:
     """FeatureExtraction-compliant wrapper
 
@@ -218,6 +310,73 @@ class Wrapper:
 
         self.scorer_ = scorer
 
+    @property
+    def cache_key(self) -> Optional[Hashable]:
+        """Identity of wrapped scorer (and its parameters), used for caching
+
+        Two scorers with the same key are expected to return the same output
+        for a given file. None means that outputs should not be cached.
+        """
+
+        from pyannote.audio.features import Precomputed
+        from pyannote.audio.features import Pretrained
+
+        scorer = self.scorer_
+
+        # reading an existing key is already as fast as it gets
+        if isinstance(scorer, partial):
+            return None
+
+        # outputs are random when data augmentation is used
+        if getattr(scorer, "augmentation", None) is not None:
+            return None
+
+        if isinstance(scorer, Precomputed):
+            return ("Precomputed", str(scorer.root_dir))
+
+        if isinstance(scorer, Pretrained):
+            return (
+                "Pretrained",
+                str(scorer.validate_dir),
+                scorer.epoch_,
+                scorer.duration,
+                scorer.step,
+                scorer.return_intermediate,
+                scorer.backend,
+                scorer.quantize,
+            )
+
+        # (re-used) object ids cannot tell whether two scorers are the same
+        return None
+
+    def __call__(self, current_file) -> SlidingWindowFeature:
+        """Extract frames from the whole file
+
+        Parameters
+        ----------
+        current_file : ProtocolFile
+            Protocol file
+
+        Returns
+        -------
+        frames : np.ndarray
+            Frames.
+        """
+
+        key = None
+        if WRAPPER_CACHE.max_bytes > 0:
+            key = self.cache_key
+
+        if key is None:
+            return self.scorer_(current_file)
+
+        key = (get_unique_identifier(current_file), key)
+        frames = WRAPPER_CACHE.get(key)
+        if frames is None:
+            frames = self.scorer_(current_file)
+            WRAPPER_CACHE.set(key, frames)
+        return frames
+
     def crop(
         self,
         current_file: ProtocolFile,
@@ -255,6 +414,18 @@ class Wrapper:
         from pyannote.audio.features import RawAudio
         from pyannote.audio.features import FeatureExtraction
 
+        # use whole file output when it is already cached. this is only done
+        # when cropping whole file output is the same as cropping the scorer:
+        # `Pretrained.crop` applies the model on chunks of its own.
+        if WRAPPER_CACHE.max_bytes > 0 and isinstance(self.scorer_, Precomputed):
+            key = self.cache_key
+            if key is not None:
+                frames = WRAPPER_CACHE.get((get_unique_identifier(current_file), key))
+                if frames is not None:
+                    return frames.crop(
+                        segment, mode=mode, fixed=fixed, return_data=True
+                    )
+
         if isinstance(
             self.scorer_, (FeatureExtraction, RawAudio, Pretrained, Precomputed)
         ):
@@ -264,20 +435,106 @@ class Wrapper:
             segment, mode=mode, fixed=fixed, return_data=True
         )
 
-    def __call__(self, current_file) -> SlidingWindowFeature:
-        """Extract frames from the whole file
+    def crop_many(
+        self,
+        current_file: ProtocolFile,
+        segments: Iterable[Segment],
+        mode: Text = "center",
+        fixed: float = None,
+    ) -> Union[np.ndarray, List[np.ndarray]]:
+        """Extract frames from multiple regions at once
 
         Parameters
         ----------
         current_file : ProtocolFile
             Protocol file
+        segments : iterable of Segment
+            Regions of the file to process.
+        mode : {'loose', 'strict', 'center'}, optional
+            See `crop`. Defaults to 'center'.
+        fixed : float, optional
+            See `crop`.
 
         Returns
         -------
-        frames : np.ndarray
-            Frames.
+        frames : np.ndarray or list of np.ndarray
+            (n_segments, n_frames, dimension) stacked frames when `fixed` is
+            provided, list of (n_frames, dimension) frames otherwise.
         """
-        return self.scorer_(current_file)
+
+        from pyannote.audio.features import RawAudio
+        from pyannote.audio.features import FeatureExtraction
+
+        if isinstance(self.scorer_, (FeatureExtraction, RawAudio)):
+            return self.scorer_.crop_many(
+                current_file, segments, mode=mode, fixed=fixed
+            )
+
+        frames = [
+            self.crop(current_file, segment, mode=mode, fixed=fixed)
+            for segment in segments
+        ]
+
+        if fixed is None:
+            return frames
+
+        return np.stack(frames)
+
+    def crop_batch(
+        self,
+        current_files: Iterable[ProtocolFile],
+        segments: Iterable[Segment],
+        mode: Text = "center",
+        fixed: float = None,
+    ) -> Union[np.ndarray, List[np.ndarray]]:
+        """Extract frames from multiple regions of (possibly) multiple files
+
+        Parameters
+        ----------
+        current_files : iterable of ProtocolFile
+            Protocol file of each region. Regions of the same file must be
+            given the very same protocol file.
+        segments : iterable of Segment
+            Regions to process.
+        mode : {'loose', 'strict', 'center'}, optional
+            See `crop`. Defaults to 'center'.
+        fixed : float, optional
+            See `crop`.
+
+        Returns
+        -------
+        frames : np.ndarray or list of np.ndarray
+            (n_segments, n_frames, dimension) stacked frames when `fixed` is
+            provided, list of (n_frames, dimension) frames otherwise.
+        """
+
+        from pyannote.audio.features import FeatureExtraction
+        from pyannote.audio.features.utils import _group_by_file
+
+        current_files, segments = list(current_files), list(segments)
+
+        if isinstance(self.scorer_, FeatureExtraction):
+            return self.scorer_.crop_batch(
+                current_files, segments, mode=mode, fixed=fixed
+            )
+
+        # regions of the same file are processed at once
+        frames = [None] * len(segments)
+        for indices in _group_by_file(current_files):
+            cropped = self.crop_many(
+                current_files[indices[0]],
+                [segments[i] for i in indices],
+                mode=mode,
+                fixed=fixed,
+            )
+            for i, X in zip(indices, cropped):
+                frames[i] = X
+
+        if fixed is None:
+            return frames
+
+        return np.stack(frames)
+
 
     # used to "inherit" most scorer_ attributes
     def __getattr__(self, name):
@@ -387,35 +387,48 @@ class LabelingTaskGenerator(BatchGenerator):
 
         while True:
 
-            # choose file at random with probability
-            # proportional to its (annotated) duration
-            uri = uris[np.random.choice(len(uris), p=probabilities)]
+            # choose one batch worth of subsegments at random, so that their
+            # features can be extracted at once
+            data, subsegments = [], []
+            for _ in range(self.batch_size):
+
+                # choose file at random with probability
+                # proportional to its (annotated) duration
+                uri = uris[np.random.choice(len(uris), p=probabilities)]
+                datum = self.data_[uri]
 
-            datum = self.data_[uri]
-            current_file = datum["current_file"]
+                # choose one segment at random with probability
+                # proportional to its duration
+                segment = next(random_segment(datum["segments"], weighted=True))
 
-            # choose one segment at random with probability
-            # proportional to its duration
-            segment = next(random_segment(datum["segments"], weighted=True))
+                # choose fixed-duration subsegment at random
+                subsegment = next(random_subsegment(segment, self.duration))
 
-            # choose fixed-duration subsegment at random
-            subsegment = next(random_subsegment(segment, self.duration))
+                data.append(datum)
+                subsegments.append(subsegment)
 
-            X = self.feature_extraction.crop(
-                current_file, subsegment, mode="center", fixed=self.duration
+            features = self.feature_extraction.crop_batch(
+                [datum["current_file"] for datum in data],
+                subsegments,
+                mode="center",
+                fixed=self.duration,
             )
 
-            y = self.crop_y(datum["y"], subsegment)
-            sample = {"X": X, "y": y}
+            for datum, subsegment, X in zip(data, subsegments, features):
 
-            if self.mask is not None:
-                mask = self.crop_y(current_file[self.mask], subsegment)
-                sample["mask"] = mask
+                current_file = datum["current_file"]
+
+                y = self.crop_y(datum["y"], subsegment)
+                sample = {"X": X, "y": y}
+
+                if self.mask is not None:
+                    mask = self.crop_y(current_file[self.mask], subsegment)
+                    sample["mask"] = mask
 
-            for key, classes in self.file_labels_.items():
-                sample[key] = classes.index(current_file[key])
+                for key, classes in self.file_labels_.items():
+                    sample[key] = classes.index(current_file[key])
 
-            yield sample
+                yield sample
 
     def _sliding_samples(self):
 
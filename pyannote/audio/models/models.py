@@ -32,10 +32,13 @@ from typing import Text
 
 import torch
 import torch.nn as nn
+from torch.nn.utils.rnn import pack_padded_sequence
+from torch.nn.utils.rnn import pad_packed_sequence
 
 from .sincnet import SincNet
 from .tdnn import XVectorNet
 from .pooling import TemporalPooling
+from .pooling import lengths_to_mask
 
 
 from .convolutional import Convolutional
@@ -75,7 +78,7 @@ class RNN(nn.Module):
     concatenate : `boolean`, optional
         Concatenate output of each layer instead of using only the last one
         (which is the default behavior).
-    pool : {'sum', 'max', 'last', 'x-vector'}, optional
+    pool : {'sum', 'max', 'last', 'stats'}, optional
         Temporal pooling strategy. Defaults to no pooling.
     """
 
@@ -156,7 +159,21 @@ class RNN(nn.Module):
                 bidirectional=self.bidirectional,
             )
 
-    def forward(self, features, return_intermediate=False):
+    def _run(self, rnn, features, hidden=None, lengths=None):
+        """Apply recurrent layer, skipping padded frames when `lengths` is set"""
+
+        if lengths is None:
+            return rnn(features, hidden)
+
+        n_frames = features.shape[1]
+        packed = pack_padded_sequence(
+            features, lengths.cpu(), batch_first=True, enforce_sorted=False
+        )
+        output, hidden = rnn(packed, hidden)
+        output, _ = pad_packed_sequence(output, batch_first=True, total_length=n_frames)
+        return output, hidden
+
+    def forward(self, features, return_intermediate=False, lengths=None):
         """Apply recurrent layer (and optional temporal pooling)
 
         Parameters
@@ -165,6 +182,11 @@ class RNN(nn.Module):
             Features shaped as (batch_size, n_frames, n_features)
         return_intermediate : `boolean`, optional
             Return intermediate RNN hidden state.
+        lengths : `torch.Tensor`, optional
+            Number of frames of each sequence, shaped as (batch_size, ), when
+            `features` is a batch of padded sequences of different lengths.
+            Padded frames are then skipped by recurrent layers and ignored by
+            temporal pooling. Defaults to using all frames.
 
         Returns
         -------
@@ -205,16 +227,16 @@ class RNN(nn.Module):
                 # apply each layer separately...
                 for i, rnn in enumerate(self.rnn_):
                     if i > 0:
-                        output, hidden = rnn(output, hidden)
+                        output, hidden = self._run(rnn, output, hidden, lengths)
                     else:
-                        output, hidden = rnn(features)
+                        output, hidden = self._run(rnn, features, None, lengths)
                     outputs.append(output)
 
                 # ... and concatenate their output
                 output = torch.cat(outputs, dim=2)
 
             else:
-                output, hidden = self.rnn_(features)
+                output, hidden = self._run(self.rnn_, features, None, lengths)
 
                 if return_intermediate:
                     if self.unit == "LSTM":
@@ -231,7 +253,11 @@ class RNN(nn.Module):
                     )
 
         if self.pool_ is not None:
-            output = self.pool_(output)
+            if lengths is None:
+                output = self.pool_(output)
+            else:
+                mask = lengths_to_mask(lengths, output.shape[1])
+                output = self.pool_(output, mask=mask)
 
         if return_intermediate:
             return output, intermediate
@@ -253,7 +279,7 @@ class RNN(nn.Module):
             if self.concatenate:
                 dimension *= self.num_layers
 
-            if self.pool == "x-vector":
+            if self.pool in ("stats", "x-vector"):
                 dimension *= 2
 
             return dimension
@@ -513,7 +539,9 @@ class PyanNet(Model):
         self.linear_ = nn.Linear(n_features, len(self.classes), bias=True)
         self.activation_ = self.task.default_activation
 
-    def forward(self, waveforms, return_intermediate=None):
+    supports_lengths = True
+
+    def forward(self, waveforms, return_intermediate=None, lengths=None):
         """Forward pass
 
         Parameters
@@ -524,6 +552,12 @@ class PyanNet(Model):
         return_intermediate : `int`, optional
             Index of RNN layer. Returns RNN intermediate hidden state.
             Defaults to only return the final output.
+        lengths : (batch_size, ) `torch.Tensor`, optional
+            Number of samples (or frames, in case SincNet is skipped) of each
+            sequence, when `waveforms` is a batch of (zero-)padded sequences of
+            different lengths. Padding then has no effect on the output of
+            temporal pooling (nor on the valid frames of frame-wise outputs).
+            Defaults to using all samples.
 
         Returns
         -------
@@ -537,18 +571,25 @@ class PyanNet(Model):
         if self.sincnet.get("skip", False):
             output = waveforms
         else:
-            output = self.sincnet_(waveforms)
+            output = self.sincnet_(waveforms, lengths=lengths)
+            if lengths is not None:
+                lengths = self.sincnet_.get_lengths(lengths)
+
+        if lengths is not None:
+            lengths = lengths.clamp(min=1)
 
         if return_intermediate is None:
-            output = self.rnn_(output)
+            output = self.rnn_(output, lengths=lengths)
         else:
             if return_intermediate == 0:
                 intermediate = output
-                output = self.rnn_(output)
+                output = self.rnn_(output, lengths=lengths)
             else:
                 return_intermediate -= 1
                 # get RNN final AND intermediate outputs
-                output, intermediate = self.rnn_(output, return_intermediate=True)
+                output, intermediate = self.rnn_(
+                    output, return_intermediate=True, lengths=lengths
+                )
                 # only keep hidden state of requested layer
                 intermediate = intermediate[return_intermediate]
 
@@ -674,13 +715,21 @@ class SincTDNN(Model):
             self.linear_ = nn.Linear(n_features, len(self.classes), bias=True)
             self.activation_ = self.task.default_activation
 
-    def forward(self, waveforms: torch.Tensor, **kwargs) -> torch.Tensor:
+    supports_lengths = True
+
+    def forward(
+        self, waveforms: torch.Tensor, lengths: torch.Tensor = None, **kwargs
+    ) -> torch.Tensor:
         """Forward pass
 
         Parameters
         ----------
         waveforms : (batch_size, n_samples, 1) `torch.Tensor`
             Batch of waveforms
+        lengths : (batch_size, ) `torch.Tensor`, optional
+            Number of samples of each waveform, when `waveforms` is a batch of
+            (zero-)padded waveforms of different lengths. Padding then has no
+            effect on the output. Defaults to using all samples.
 
         Returns
         -------
@@ -689,12 +738,16 @@ class SincTDNN(Model):
             (only when `return_intermediate` is provided).
         """
 
-        output = self.sincnet_(waveforms)
+        output = self.sincnet_(waveforms, lengths=lengths)
+        if lengths is not None:
+            lengths = self.sincnet_.get_lengths(lengths)
 
         return_intermediate = (
             "segment6" if self.task.is_representation_learning else None
         )
-        output = self.tdnn_(output, return_intermediate=return_intermediate)
+        output = self.tdnn_(
+            output, return_intermediate=return_intermediate, lengths=lengths
+        )
 
         if self.task.is_representation_learning:
             return self.embedding_(output)
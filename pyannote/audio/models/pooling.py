@@ -27,6 +27,7 @@
 # Juan Manuel Coria
 # Hervé Bredin - http://herve.niderb.fr
 
+from typing import Optional
 from typing_extensions import Literal
 from warnings import warn
 
@@ -34,6 +35,25 @@ import torch
 import torch.nn as nn
 
 
+def lengths_to_mask(lengths: torch.Tensor, n_frames: int) -> torch.Tensor:
+    """Convert sequence lengths to mask
+
+    Parameters
+    ----------
+    lengths : `torch.Tensor`, shape (batch_size, )
+        Number of valid (i.e. non-padded) frames of each sequence.
+    n_frames : `int`
+        Number of frames of padded sequences.
+
+    Returns
+    -------
+    mask : `torch.Tensor`, shape (batch_size, n_frames)
+        Boolean mask, True for valid frames.
+    """
+    frames = torch.arange(n_frames, device=lengths.device)
+    return frames[None, :] < lengths[:, None]
+
+
 class TemporalPooling(nn.Module):
     """Pooling strategy over temporal sequences."""
 
@@ -69,76 +89,120 @@ class TemporalPooling(nn.Module):
             raise ValueError(f"`{method}` is not a valid temporal pooling method")
         return klass()
 
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
+    def forward(
+        self, x: torch.Tensor, mask: Optional[torch.Tensor] = None
+    ) -> torch.Tensor:
         raise NotImplementedError("TemporalPooling subclass must implement `forward`")
 
 
 class SumPool(TemporalPooling):
     """Calculate pooling as the sum over a sequence"""
 
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
+    def forward(
+        self, x: torch.Tensor, mask: Optional[torch.Tensor] = None
+    ) -> torch.Tensor:
         """
         Parameters
         ----------
         x : `torch.Tensor`, shape (batch_size, seq_len, hidden_size)
             A batch of sequences.
+        mask : `torch.Tensor`, shape (batch_size, seq_len), optional
+            Boolean mask of valid frames, for batches of padded sequences of
+            different lengths. Padded frames do not contribute to the output.
+            Defaults to using all frames.
 
         Returns
         -------
         output : `torch.Tensor`, shape (batch_size, hidden_size)
         """
-        return x.sum(dim=1)
+        if mask is None:
+            return x.sum(dim=1)
+        return (x * mask.to(x.dtype).unsqueeze(2)).sum(dim=1)
 
 
 class MaxPool(TemporalPooling):
     """Calculate pooling as the maximum over a sequence"""
 
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
+    def forward(
+        self, x: torch.Tensor, mask: Optional[torch.Tensor] = None
+    ) -> torch.Tensor:
         """
         Parameters
         ----------
         x : `torch.Tensor`, shape (batch_size, seq_len, hidden_size)
             A batch of sequences.
+        mask : `torch.Tensor`, shape (batch_size, seq_len), optional
+            Boolean mask of valid frames, for batches of padded sequences of
+            different lengths. Padded frames do not contribute to the output.
+            Defaults to using all frames.
 
         Returns
         -------
         output : `torch.Tensor`, shape (batch_size, hidden_size)
         """
-        return x.max(dim=1)[0]
+        if mask is None:
+            return x.max(dim=1)[0]
+        return x.masked_fill(~mask.bool().unsqueeze(2), -float("inf")).max(dim=1)[0]
 
 
 class LastPool(TemporalPooling):
     """Calculate pooling as the last element of a sequence"""
 
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
+    def forward(
+        self, x: torch.Tensor, mask: Optional[torch.Tensor] = None
+    ) -> torch.Tensor:
         """
         Parameters
         ----------
         x : `torch.Tensor`, shape (batch_size, seq_len, hidden_size)
             A batch of sequences.
+        mask : `torch.Tensor`, shape (batch_size, seq_len), optional
+            Boolean mask of valid frames, for batches of padded sequences of
+            different lengths. Padded frames do not contribute to the output.
+            Defaults to using all frames.
 
         Returns
         -------
         output : `torch.Tensor`, shape (batch_size, hidden_size)
         """
-        return x[:, -1]
+        if mask is None:
+            return x[:, -1]
+        # index of last valid frame of each sequence
+        frames = torch.arange(x.shape[1], device=x.device)
+        last = (mask.bool() * frames).argmax(dim=1)
+        return x[torch.arange(x.shape[0], device=x.device), last]
 
 
 class StatsPool(TemporalPooling):
     """Calculate pooling as the concatenated mean and standard deviation of a sequence"""
 
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
+    def forward(
+        self, x: torch.Tensor, mask: Optional[torch.Tensor] = None
+    ) -> torch.Tensor:
         """
         Parameters
         ----------
         x : `torch.Tensor`, shape (batch_size, seq_len, hidden_size)
             A batch of sequences.
+        mask : `torch.Tensor`, shape (batch_size, seq_len), optional
+            Boolean mask of valid frames, for batches of padded sequences of
+            different lengths. Padded frames do not contribute to the output.
+            Defaults to using all frames.
 
         Returns
         -------
         output : `torch.Tensor`, shape (batch_size, 2 * hidden_size)
         """
-        mean, std = torch.mean(x, dim=1), torch.std(x, dim=1)
+        if mask is None:
+            mean, std = torch.mean(x, dim=1), torch.std(x, dim=1)
+            return torch.cat((mean, std), dim=1)
+
+        weights = mask.to(x.dtype).unsqueeze(2)
+        n_frames = weights.sum(dim=1)
+        mean = (x * weights).sum(dim=1) / n_frames.clamp(min=1)
+        # unbiased estimate, as torch.std
+        var = ((x - mean.unsqueeze(1)) ** 2 * weights).sum(dim=1)
+        std = torch.sqrt(var / (n_frames - 1).clamp(min=1))
         return torch.cat((mean, std), dim=1)
 
 
@@ -173,13 +237,19 @@ class Pooling(nn.Module):
         self.method = method
         self.bidirectional = bidirectional
 
-    def forward(self, sequences: torch.Tensor) -> torch.Tensor:
+    def forward(
+        self, sequences: torch.Tensor, mask: Optional[torch.Tensor] = None
+    ) -> torch.Tensor:
         """Temporal pooling
 
         Parameters
         ----------
         sequences : torch.Tensor
             Input sequences with shape (batch_size, n_frames, n_features)
+        mask : torch.Tensor, optional
+            Boolean mask of valid frames with shape (batch_size, n_frames),
+            for batches of padded sequences of different lengths. Padded frames
+            do not contribute to the output. Defaults to using all frames.
 
         Returns
         -------
@@ -190,6 +260,9 @@ class Pooling(nn.Module):
         if self.method is None:
             return sequences
 
+        if mask is not None:
+            return self._masked_forward(sequences, mask.bool())
+
         if self.method == "last":
             if self.bidirectional:
                 batch_size, n_frames, _ = sequences.shape
@@ -204,6 +277,31 @@ class Pooling(nn.Module):
         if self.method == "average":
             return torch.mean(sequences, dim=1, keepdim=False, out=None)
 
+    def _masked_forward(self, sequences: torch.Tensor, mask: torch.Tensor):
+
+        if self.method == "last":
+            batch_size, n_frames, _ = sequences.shape
+            frames = torch.arange(n_frames, device=sequences.device)
+            last = (mask * frames).argmax(dim=1)
+            batch = torch.arange(batch_size, device=sequences.device)
+            if self.bidirectional:
+                first = (mask * (n_frames - frames)).argmax(dim=1)
+                reshaped = sequences.view(batch_size, n_frames, 2, -1)
+                return torch.cat(
+                    [reshaped[batch, last, 0], reshaped[batch, first, 1]], dim=1
+                )
+            else:
+                return sequences[batch, last]
+
+        if self.method == "max":
+            masked = sequences.masked_fill(~mask.unsqueeze(2), -float("inf"))
+            return torch.max(masked, dim=1, keepdim=False, out=None)[0]
+
+        if self.method == "average":
+            weights = mask.to(sequences.dtype).unsqueeze(2)
+            n_frames = weights.sum(dim=1).clamp(min=1)
+            return (sequences * weights).sum(dim=1) / n_frames
+
     @property
     def dimension(self):
         "Dimension of output features"
@@ -35,6 +35,7 @@
 # SLT 2018. https://arxiv.org/abs/1808.00158
 
 from typing import List
+from typing import Optional
 import numpy as np
 import torch
 import torch.nn.functional as F
@@ -42,6 +43,30 @@ import torch.nn as nn
 import math
 from pyannote.core import SlidingWindow
 from pyannote.audio.train.task import Task
+from .pooling import lengths_to_mask
+
+try:
+    import torch.fft
+
+    _TORCH_FFT = callable(getattr(torch.fft, "rfft", None))
+except ImportError as e:
+    _TORCH_FFT = False
+
+
+def _fft_length(n: int) -> int:
+    """Smallest 2^a.3^b.5^c integer greater or equal to n (fast FFT length)"""
+    best = 1 << (n - 1).bit_length()
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            p235 = p35
+            while p235 < n:
+                p235 *= 2
+            best = min(best, p235)
+            p35 *= 3
+        p5 *= 5
+    return best
 
 
 class SincConv1d(nn.Module):
@@ -63,17 +88,28 @@ class SincConv1d(nn.Module):
         Defaults to 50.
     min_band_hz: `int`, optional
         Defaults to 50.
+    fft_threshold : `int`, optional
+        In eval mode, use FFT-based convolution when batch size times number
+        of samples is greater or equal to this value (and stride and dilation
+        are both 1). Defaults to 2^17. Set to None to always use direct
+        convolution.
 
     Usage
     -----
     Same as `torch.nn.Conv1d`
 
+    In eval mode (and when gradients are disabled), filters are computed once
+    and cached until their parameters are updated. So is their spectrum, for
+    the last `FFT_CACHE_SIZE` input lengths.
+
     Reference
     ---------
     Mirco Ravanelli, Yoshua Bengio. "Speaker Recognition from raw waveform with
     SincNet". SLT 2018. https://arxiv.org/abs/1808.00158
     """
 
+    FFT_CACHE_SIZE = 4
+
     @staticmethod
     def to_mel(hz):
         return 2595 * np.log10(1 + hz / 700)
@@ -95,6 +131,7 @@ class SincConv1d(nn.Module):
         dilation=1,
         bias=False,
         groups=1,
+        fft_threshold=2 ** 17,
     ):
 
         super().__init__()
@@ -156,23 +193,21 @@ class SincConv1d(nn.Module):
         n = (self.kernel_size - 1) / 2.0
         self.n_ = 2 * math.pi * torch.arange(-n, 0).view(1, -1) / self.sample_rate
 
-    def forward(self, waveforms):
-        """Get sinc filters activations
+        self.fft_threshold = fft_threshold
 
-        Parameters
-        ----------
-        waveforms : `torch.Tensor` (batch_size, 1, n_samples)
-            Batch of waveforms.
+        # inference-time cache of filters (and their spectrum), along with
+        # the parameters they were computed from
+        self.cache_key_ = None
+        self.filters_fft_ = dict()
+
+    def get_filters(self) -> torch.Tensor:
+        """Compute sinc filters from their parameters
 
         Returns
         -------
-        features : `torch.Tensor` (batch_size, out_channels, n_samples_out)
-            Batch of sinc filters activations.
+        filters : `torch.Tensor` (out_channels, 1, kernel_size)
         """
 
-        self.n_ = self.n_.to(waveforms.device)
-        self.window_ = self.window_.to(waveforms.device)
-
         low = self.min_low_hz + torch.abs(self.low_hz_)
 
         high = torch.clamp(
@@ -200,7 +235,79 @@ class SincConv1d(nn.Module):
 
         band_pass = band_pass / (2 * band[:, None])
 
-        self.filters = (band_pass).view(self.out_channels, 1, self.kernel_size)
+        return (band_pass).view(self.out_channels, 1, self.kernel_size)
+
+    def _fft_conv1d(self, waveforms: torch.Tensor, cache: bool) -> torch.Tensor:
+        """FFT-based equivalent of F.conv1d (with stride = dilation = 1)"""
+
+        if self.padding:
+            waveforms = F.pad(waveforms, (self.padding, self.padding))
+
+        n_samples = waveforms.shape[-1]
+        n_fft = _fft_length(n_samples + self.kernel_size - 1)
+
+        # conv1d is a cross-correlation: convolve with flipped filters
+        W = self.filters_fft_.pop(n_fft, None) if cache else None
+        if W is None:
+            W = torch.fft.rfft(torch.flip(self.filters[:, 0], dims=[1]), n_fft)
+        if cache:
+            # (re-)insert as most recently used and only keep the last few
+            # spectra: one per input length would grow without limit
+            self.filters_fft_[n_fft] = W
+            while len(self.filters_fft_) > self.FFT_CACHE_SIZE:
+                del self.filters_fft_[next(iter(self.filters_fft_))]
+
+        X = torch.fft.rfft(waveforms, n_fft)
+        Y = torch.fft.irfft(X * W, n_fft)
+        return Y[:, :, self.kernel_size - 1 : n_samples]
+
+    def forward(self, waveforms):
+        """Get sinc filters activations
+
+        Parameters
+        ----------
+        waveforms : `torch.Tensor` (batch_size, 1, n_samples)
+            Batch of waveforms.
+
+        Returns
+        -------
+        features : `torch.Tensor` (batch_size, out_channels, n_samples_out)
+            Batch of sinc filters activations.
+        """
+
+        if self.n_.device != waveforms.device:
+            self.n_ = self.n_.to(waveforms.device)
+            self.window_ = self.window_.to(waveforms.device)
+
+        # filters only change when their parameters are updated, so there is
+        # no need to compute them at every inference step
+        cache = not (self.training or torch.is_grad_enabled())
+        if cache:
+            # comparing (a few hundred) parameters is much cheaper than
+            # computing filters, and robust to any kind of parameter update
+            if (
+                self.cache_key_ is None
+                or self.cache_key_[0].device != waveforms.device
+                or not torch.equal(self.cache_key_[0], self.low_hz_)
+                or not torch.equal(self.cache_key_[1], self.band_hz_)
+            ):
+                self.filters = self.get_filters()
+                self.filters_fft_ = dict()
+                self.cache_key_ = (self.low_hz_.clone(), self.band_hz_.clone())
+        else:
+            self.filters = self.get_filters()
+            self.cache_key_ = None
+
+        batch_size, _, n_samples = waveforms.shape
+        if (
+            _TORCH_FFT
+            and not self.training
+            and self.fft_threshold is not None
+            and self.stride == 1
+            and self.dilation == 1
+            and batch_size * n_samples >= self.fft_threshold
+        ):
+            return self._fft_conv1d(waveforms, cache)
 
         return F.conv1d(
             waveforms,
@@ -213,6 +320,29 @@ class SincConv1d(nn.Module):
         )
 
 
+def _masked_instance_norm(
+    norm: nn.InstanceNorm1d, x: torch.Tensor, mask: torch.Tensor
+) -> torch.Tensor:
+    """Same as norm(x), with statistics computed on valid frames only
+
+    Parameters
+    ----------
+    norm : nn.InstanceNorm1d
+    x : (batch_size, n_channels, n_frames) torch.Tensor
+    mask : (batch_size, n_frames) torch.Tensor
+        Boolean mask of valid frames.
+    """
+
+    weights = mask.to(x.dtype).unsqueeze(1)
+    n_frames = weights.sum(dim=2, keepdim=True).clamp(min=1)
+    mean = (x * weights).sum(dim=2, keepdim=True) / n_frames
+    var = ((x - mean) ** 2 * weights).sum(dim=2, keepdim=True) / n_frames
+    x = (x - mean) / torch.sqrt(var + norm.eps)
+    if norm.affine:
+        x = x * norm.weight[:, None] + norm.bias[:, None]
+    return x
+
+
 class SincNet(nn.Module):
     """SincNet (learnable) feature extraction
 
@@ -399,13 +529,40 @@ class SincNet(nn.Module):
         if self.dropout:
             self.dropout_ = nn.Dropout(p=self.dropout)
 
-    def forward(self, waveforms):
+    def get_lengths(self, lengths: torch.Tensor) -> torch.Tensor:
+        """Get number of output frames
+
+        Parameters
+        ----------
+        lengths : (batch_size, ) torch.Tensor
+            Number of samples of each waveform.
+
+        Returns
+        -------
+        lengths : (batch_size, ) torch.Tensor
+            Number of output frames of each waveform.
+        """
+
+        for kernel_size, stride, max_pool in zip(
+            self.kernel_size, self.stride, self.max_pool
+        ):
+            lengths = (lengths - kernel_size) // stride + 1
+            lengths = (lengths - max_pool) // max_pool + 1
+        return lengths
+
+    def forward(self, waveforms, lengths: Optional[torch.Tensor] = None):
         """Extract SincNet features
 
         Parameters
         ----------
         waveforms : (batch_size, n_samples, 1)
             Batch of waveforms
+        lengths : (batch_size, ) torch.Tensor, optional
+            Number of samples of each waveform, when `waveforms` is a batch of
+            (zero-)padded waveforms of different lengths. Padded samples are
+            then ignored by waveform and instance normalization, so that the
+            first `get_lengths(lengths)` frames of each output sequence do not
+            depend on padding. Defaults to using all samples.
 
         Returns
         -------
@@ -416,10 +573,18 @@ class SincNet(nn.Module):
 
         # standardize waveforms
         if self.waveform_normalize:
-            output = self.waveform_normalize_(output)
+            if lengths is None:
+                output = self.waveform_normalize_(output)
+            else:
+                mask = lengths_to_mask(lengths, output.shape[2])
+                output = _masked_instance_norm(self.waveform_normalize_, output, mask)
 
-        layers = zip(self.conv1d_, self.max_pool1d_)
-        for i, (conv1d, max_pool1d) in enumerate(layers):
+        layers = zip(
+            self.conv1d_, self.max_pool1d_, self.kernel_size, self.stride, self.max_pool
+        )
+        for i, (conv1d, max_pool1d, kernel_size, stride, max_pool) in enumerate(
+            layers
+        ):
 
             output = conv1d(output)
             if i == 0:
@@ -428,7 +593,15 @@ class SincNet(nn.Module):
             output = max_pool1d(output)
 
             if self.instance_normalize:
-                output = self.instance_norm1d_[i](output)
+                if lengths is None:
+                    output = self.instance_norm1d_[i](output)
+                else:
+                    lengths = (lengths - kernel_size) // stride + 1
+                    lengths = (lengths - max_pool) // max_pool + 1
+                    mask = lengths_to_mask(lengths, output.shape[2])
+                    output = _masked_instance_norm(
+                        self.instance_norm1d_[i], output, mask
+                    )
 
             output = self.activation_(output)
 
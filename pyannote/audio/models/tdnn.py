@@ -54,6 +54,7 @@ from torch.nn.utils import weight_norm
 import torch.nn.functional as F
 
 from .pooling import StatsPool
+from .pooling import lengths_to_mask
 
 
 class TDNN(nn.Module):
@@ -114,6 +115,11 @@ class TDNN(nn.Module):
         x = self.temporal_conv(torch.transpose(x, 1, 2))
         return F.relu(torch.transpose(x, 1, 2))
 
+    def get_lengths(self, lengths: torch.Tensor) -> torch.Tensor:
+        """Number of output frames given number of input frames"""
+        conv = self.temporal_conv
+        return lengths - conv.dilation[0] * (conv.kernel_size[0] - 1)
+
     @staticmethod
     def check_valid_context(context: list, full_context: bool) -> None:
         """
@@ -188,7 +194,12 @@ class XVectorNet(nn.Module):
         self.segment7 = nn.Linear(embedding_dim, embedding_dim)
         self.embedding_dim = embedding_dim
 
-    def forward(self, x: torch.Tensor, return_intermediate: Optional[str] = None):
+    def forward(
+        self,
+        x: torch.Tensor,
+        return_intermediate: Optional[str] = None,
+        lengths: Optional[torch.Tensor] = None,
+    ):
         """Calculate X-Vector network activations.
            Return the requested intermediate layer without computing unnecessary activations.
 
@@ -199,6 +210,10 @@ class XVectorNet(nn.Module):
         return_intermediate : 'stats_pool' | 'segment6' | 'segment7' | None
             If specified, return the activation of this specific layer.
             segment6 and segment7 activations are returned before the application of non linearity.
+        lengths : (batch_size, ) torch.Tensor, optional
+            Number of frames of each sequence, when `x` is a batch of padded
+            sequences of different lengths. Padded frames are then ignored by
+            statistics pooling. Defaults to using all frames.
 
         Returns
         -------
@@ -207,7 +222,17 @@ class XVectorNet(nn.Module):
             (batch_size, embedding_dim)      if return_intermediate == 'segment6' | 'segment7' | None
         """
 
-        x = self.tdnn(x)
+        if lengths is None:
+            x = self.tdnn(x)
+
+        else:
+            *frames, stats_pool = self.tdnn
+            for frame in frames:
+                x = frame(x)
+                lengths = frame.get_lengths(lengths)
+            # sequences shorter than the receptive field still get one frame
+            mask = lengths_to_mask(lengths.clamp(min=1), x.shape[1])
+            x = stats_pool(x, mask=mask)
 
         if return_intermediate == "stats_pool":
             return x
@@ -31,6 +31,7 @@
 """
 
 from .speech_activity_detection import SpeechActivityDetection
+from .speech_activity_detection import OnlineSpeechActivityDetection
 from .overlap_detection import OverlapDetection
 from .speech_turn_segmentation import SpeechTurnSegmentation
 from .speech_turn_segmentation import OracleSpeechTurnSegmentation
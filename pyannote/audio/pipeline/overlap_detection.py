@@ -108,8 +108,8 @@ class OverlapDetection(Pipeline):
             pad_offset=self.pad_offset,
         )
 
-    def __call__(self, current_file: dict) -> Annotation:
-        """Apply overlap detection
+    def get_probability(self, current_file: dict) -> SlidingWindowFeature:
+        """Get overlapped speech probability
 
         Parameters
         ----------
@@ -119,8 +119,8 @@ class OverlapDetection(Pipeline):
 
         Returns
         -------
-        overlap : `pyannote.core.Annotation`
-            Overlap regions.
+        probability : `pyannote.core.SlidingWindowFeature`
+            Overlapped speech probability.
         """
 
         ovl_scores = self._scores(current_file)
@@ -143,6 +143,25 @@ class OverlapDetection(Pipeline):
         else:
             overlap_prob = SlidingWindowFeature(data, ovl_scores.sliding_window)
 
+        return overlap_prob
+
+    def __call__(self, current_file: dict) -> Annotation:
+        """Apply overlap detection
+
+        Parameters
+        ----------
+        current_file : `dict`
+            File as provided by a pyannote.database protocol. May contain a
+            'ovl_scores' key providing precomputed scores.
+
+        Returns
+        -------
+        overlap : `pyannote.core.Annotation`
+            Overlap regions.
+        """
+
+        overlap_prob = self.get_probability(current_file)
+
         overlap = self._binarize.apply(overlap_prob)
 
         overlap.uri = current_file.get("uri", None)
@@ -172,6 +191,21 @@ class OverlapDetection(Pipeline):
             overlap.add(s1 & s2)
         return overlap.support().to_annotation()
 
+    def get_reference(self, current_file: dict) -> Timeline:
+        """Get overlapped speech reference, as evaluated by `get_metric`
+
+        Parameters
+        ----------
+        current_file : `dict`
+            File as provided by a pyannote.database protocol.
+
+        Returns
+        -------
+        overlap : `pyannote.core.Timeline`
+            Overlapped speech reference.
+        """
+        return self.to_overlap(current_file["annotation"]).get_timeline()
+
     def get_metric(self, **kwargs) -> DetectionPrecisionRecallFMeasure:
         """Get overlapped speech detection metric
 
@@ -34,7 +34,6 @@ from pyannote.pipeline import Pipeline
 from pyannote.pipeline.parameter import Uniform
 
 from pyannote.core import Annotation
-from pyannote.core import SlidingWindowFeature
 
 from pyannote.audio.utils.signal import Peak
 from pyannote.audio.features import Precomputed
@@ -96,10 +95,22 @@ class SpeakerChangeDetection(Pipeline):
         self.alpha = Uniform(0.0, 1.0)
         self.min_duration = Uniform(0.0, 10.0)
 
+        # local maxima of scores, shared by all sets of hyper-parameters
+        # (they only depend on "min_duration", not on "alpha"). they are only
+        # reused for the very same scores array: this is the case when scores
+        # are precomputed (e.g. "@scd_scores") or cached by `Wrapper`. note
+        # that this only helps within the current process: when pipeline is
+        # applied by several worker processes (e.g. `n_jobs` > 1 during
+        # optimization), each worker gets a copy of this cache and maxima it
+        # computes are not sent back.
+        self._maxima = dict()
+
     def initialize(self):
         """Initialize pipeline with current set of parameters"""
 
-        self._peak = Peak(alpha=self.alpha, min_duration=self.min_duration)
+        self._peak = Peak(
+            alpha=self.alpha, min_duration=self.min_duration, cache=self._maxima
+        )
 
     def __call__(self, current_file: dict) -> Annotation:
         """Apply change detection
@@ -126,15 +137,15 @@ class SpeakerChangeDetection(Pipeline):
             else:
                 self.log_scale_ = False
 
-        data = np.exp(scd_scores.data) if self.log_scale_ else scd_scores.data
+        self._peak.log_scale = self.log_scale_
 
-        # take the final dimension
+        # peak detection on the final dimension
         # (in order to support both classification, multi-class classification,
-        # and regression scores)
-        change_prob = SlidingWindowFeature(data[:, -1], scd_scores.sliding_window)
-
-        # peak detection
-        change = self._peak.apply(change_prob)
+        # and regression scores). scores are passed as is so that `Peak` can
+        # tell whether cached local maxima were computed from them.
+        change = self._peak.apply(
+            scd_scores, dimension=-1, key=get_unique_identifier(current_file)
+        )
         change.uri = current_file.get("uri", None)
 
         return change.to_annotation(generator="string", modality="audio")
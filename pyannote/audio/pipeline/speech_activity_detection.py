@@ -28,18 +28,28 @@
 
 """Speech activity detection pipelines"""
 
+from typing import List
+from typing import Tuple
 from typing import Union
 import numpy as np
+import torch
 import warnings
 
 from pyannote.pipeline import Pipeline
 from pyannote.pipeline.parameter import Uniform
 
 from pyannote.core import Annotation
+from pyannote.core import Segment
+from pyannote.core import SlidingWindow
+from pyannote.core import Timeline
 from pyannote.core import SlidingWindowFeature
 
 from pyannote.audio.utils.signal import Binarize
 from pyannote.audio.features import Precomputed
+from pyannote.audio.features import Pretrained
+from pyannote.audio.features import RawAudio
+from pyannote.audio.train.model import RESOLUTION_CHUNK
+from pyannote.audio.train.model import _first_frames
 
 from pyannote.metrics.detection import DetectionErrorRate
 from pyannote.metrics.detection import DetectionPrecisionRecallFMeasure
@@ -121,8 +131,8 @@ class SpeechActivityDetection(Pipeline):
             pad_offset=self.pad_offset,
         )
 
-    def __call__(self, current_file: dict) -> Annotation:
-        """Apply speech activity detection
+    def get_probability(self, current_file: dict) -> SlidingWindowFeature:
+        """Get speech probability
 
         Parameters
         ----------
@@ -132,8 +142,8 @@ class SpeechActivityDetection(Pipeline):
 
         Returns
         -------
-        speech : `pyannote.core.Annotation`
-            Speech regions.
+        probability : `pyannote.core.SlidingWindowFeature`
+            Speech probability.
         """
 
         sad_scores = self._scores(current_file)
@@ -156,11 +166,45 @@ class SpeechActivityDetection(Pipeline):
         else:
             speech_prob = SlidingWindowFeature(data, sad_scores.sliding_window)
 
+        return speech_prob
+
+    def __call__(self, current_file: dict) -> Annotation:
+        """Apply speech activity detection
+
+        Parameters
+        ----------
+        current_file : `dict`
+            File as provided by a pyannote.database protocol. May contain a
+            'sad_scores' key providing precomputed scores.
+
+        Returns
+        -------
+        speech : `pyannote.core.Annotation`
+            Speech regions.
+        """
+
+        speech_prob = self.get_probability(current_file)
+
         speech = self._binarize.apply(speech_prob)
 
         speech.uri = current_file.get("uri", None)
         return speech.to_annotation(generator="string", modality="speech")
 
+    def get_reference(self, current_file: dict) -> Timeline:
+        """Get speech reference, as evaluated by `get_metric`
+
+        Parameters
+        ----------
+        current_file : `dict`
+            File as provided by a pyannote.database protocol.
+
+        Returns
+        -------
+        speech : `pyannote.core.Timeline`
+            Speech reference.
+        """
+        return current_file["annotation"].get_timeline().support()
+
     def get_metric(
         self, parallel=False
     ) -> Union[DetectionErrorRate, DetectionPrecisionRecallFMeasure]:
@@ -172,3 +216,488 @@ class SpeechActivityDetection(Pipeline):
             )
         else:
             return DetectionErrorRate(collar=0.0, skip_overlap=False, parallel=parallel)
+
+
+class OnlineSpeechActivityDetection(SpeechActivityDetection):
+    """Online (streaming) speech activity detection pipeline
+
+    Parameters
+    ----------
+    scores : Wrappable
+        Pretrained speech activity detection model. See
+        pyannote.audio.features.wrapper.Wrapper documentation for details.
+        Must wrap a `Pretrained` instance (e.g. "sad" torch.hub model or path
+        to a validation directory).
+    fscore : bool, optional
+        Optimize (precision/recall) fscore. Defaults to optimizing detection
+        error rate.
+    latency : float, optional
+        Maximum delay (in seconds) between the end of received audio and the
+        most recent frame whose score is final. A frame is usually covered by
+        several overlapping chunks whose scores are averaged: lower latency
+        means that fewer of them are used. Scores are never final before the
+        first chunk covering them has been processed, which requires audio up
+        to the end of this chunk (and up to the margin used for extracting its
+        features). Defaults to waiting for all chunks covering a frame, which
+        leads to the same scores as offline processing.
+    block_duration : float, optional
+        Duration of audio blocks used when processing a whole file with
+        `__call__` (which simulates a stream). Defaults to 0.1 second.
+
+    Hyper-parameters
+    ----------------
+    onset, offset : `float`
+        Onset/offset detection thresholds
+    min_duration_on, min_duration_off : `float`
+        Minimum duration in either state (speech or not)
+    pad_onset, pad_offset : `float`
+        Padding duration.
+
+    Usage
+    -----
+    >>> pipeline = OnlineSpeechActivityDetection(scores="sad", latency=0.5)
+    >>> pipeline.instantiate(params)
+    >>> for block in stream:   # (n_samples, n_channels) np.ndarray
+    ...     speech = pipeline.process(block)
+    ...     # speech regions between previous and current `pipeline.decided`
+    >>> speech = pipeline.flush()
+    >>> pipeline.reset()       # before processing a new stream
+
+    Notes
+    -----
+    Blocks must be sampled at `pipeline.sample_rate`. Features are extracted
+    incrementally, from buffered audio extended by the same margin as the one
+    used by `FeatureExtraction.iter_blocks`. As soon as features of a complete
+    chunk are available, the model is applied on this chunk. Like in
+    `Model.slide`, the last chunk is aligned with the end of the stream: the
+    scores of the last chunk duration are therefore only final once the
+    stream is flushed (unless `latency` is provided).
+
+    Decisions are final up to `pipeline.decided`. Besides `latency`, they are
+    delayed by the time needed to make sure that a region is long enough to
+    pass `min_duration_on` and `min_duration_off` constraints (and by padding).
+
+    With default `latency`, returned speech regions are the same as the ones
+    returned by `SpeechActivityDetection`, as long as features extracted block
+    by block are the same as features extracted from the whole file (see
+    `FeatureExtraction.iter_blocks` for features for which this is not the
+    case, e.g. librosa MFCC relying on statistics of the whole signal).
+    """
+
+    def __init__(
+        self,
+        scores: Wrappable = None,
+        fscore: bool = False,
+        latency: float = None,
+        block_duration: float = 0.1,
+    ):
+        super().__init__(scores=scores, fscore=fscore)
+
+        pretrained = self._scores.scorer_
+        if not isinstance(pretrained, Pretrained):
+            msg = (
+                f"{self.__class__.__name__} needs a pretrained model "
+                f"(got {type(pretrained).__name__} instead)."
+            )
+            raise ValueError(msg)
+
+        if pretrained.model_.resolution == RESOLUTION_CHUNK:
+            msg = f"{self.__class__.__name__} needs a sequence labeling model."
+            raise ValueError(msg)
+
+        self.latency = latency
+        self.block_duration = block_duration
+
+        self.reset()
+
+    @property
+    def sample_rate(self) -> int:
+        """Expected sample rate of audio blocks"""
+        return self._scores.scorer_.feature_extraction_.sample_rate
+
+    def initialize(self):
+        """Initialize pipeline with current set of parameters"""
+        super().initialize()
+        self.reset()
+
+    def reset(self):
+        """Prepare for a new stream"""
+
+        pretrained = self._scores.scorer_
+        feature_extraction = pretrained.feature_extraction_
+        sample_rate = self.sample_rate
+
+        self.samples_ = SlidingWindow(
+            start=-0.5 / sample_rate, duration=1.0 / sample_rate, step=1.0 / sample_rate
+        )
+
+        # chunks are aligned with the start of features, as in Model.slide
+        frames = feature_extraction.sliding_window
+        self.chunks_ = SlidingWindow(
+            start=frames.start,
+            duration=pretrained.duration,
+            step=pretrained.step * pretrained.duration,
+        )
+        self.n_chunk_frames_ = frames.samples(pretrained.duration, mode="center")
+        self.resolution_ = pretrained.get_resolution()
+
+        # features are extracted with the same margin as iter_blocks
+        margin = feature_extraction.get_block_margin()
+        self.n_margin_ = int(np.ceil(margin / frames.step))
+
+        # audio buffer: `buffer_[i]` is sample #`buffer_start_ + i`
+        self.buffer_ = np.zeros((0, 1), dtype=np.float32)
+        self.buffer_start_ = 0
+        self.n_samples_ = 0
+
+        # feature buffer: `features_[i]` is frame #`features_start_ + i`.
+        # features of the first `n_features_` frames are final.
+        self.features_ = None
+        self.features_start_ = 0
+        self.n_features_ = 0
+
+        # index of next chunk
+        self.next_chunk_ = 0
+
+        # sum of scores (and number of chunks) of frames that are not final,
+        # starting at frame #`frame_`
+        self.frame_ = 0
+        self.sum_ = None
+        self.k_ = np.zeros((0, 1), dtype=np.int32)
+        self.covered_ = 0
+
+        if hasattr(self, "_binarize"):
+            self._binarize.reset()
+
+    @property
+    def decided(self) -> float:
+        """Time up to which decisions are final"""
+        return self._binarize.decided if hasattr(self, "_binarize") else -np.inf
+
+    def _first_sample(self, start: float) -> int:
+        """Index of first sample of chunk starting at `start` (as RawAudio.crop)"""
+        return int(_first_frames(self.samples_, np.array([start]), "center")[0])
+
+    def _get_waveform_segment(self, n_frames: int = None) -> Segment:
+        """Waveform needed to extract features up to frame #`n_frames`
+
+        Features of frames #`n_features_` to #`n_frames` (excluded) are
+        extracted from a waveform extended by `n_margin_` frames on both sides,
+        as done by FeatureExtraction.iter_blocks. Defaults to extracting all
+        remaining frames (i.e. up to the end of the stream).
+        """
+
+        step = self._scores.scorer_.feature_extraction_.sliding_window.step
+        start = max(0, self.n_features_ - self.n_margin_) * step
+        if n_frames is None:
+            end = self.n_samples_ / self.sample_rate
+        else:
+            end = (n_frames + self.n_margin_) * step
+        return Segment(start, end)
+
+    def _get_waveform_range(self, xsegment: Segment) -> Tuple[int, int]:
+        """Indices of first and last (excluded) samples of `xsegment`"""
+        start = self._first_sample(xsegment.start)
+        end = start + self.samples_.samples(xsegment.duration, mode="center")
+        return start, min(end, self.n_samples_)
+
+    def _n_available(self) -> int:
+        """Number of frames whose features can be made final"""
+
+        step = self._scores.scorer_.feature_extraction_.sliding_window.step
+        n_frames = int(np.floor(self.n_samples_ / self.sample_rate / step))
+        n_frames -= self.n_margin_
+        while n_frames > self.n_features_:
+            xsegment = self._get_waveform_segment(n_frames)
+            start = self._first_sample(xsegment.start)
+            n_samples = self.samples_.samples(xsegment.duration, mode="center")
+            if start + n_samples <= self.n_samples_:
+                break
+            n_frames -= 1
+        return max(n_frames, self.n_features_)
+
+    def _extract(self, n_frames: int = None):
+        """Extract features up to frame #`n_frames` (excluded)
+
+        Defaults to extracting features of all remaining frames.
+        """
+
+        feature_extraction = self._scores.scorer_.feature_extraction_
+
+        start, end = self._get_waveform_range(self._get_waveform_segment(n_frames))
+        y = self.buffer_[start - self.buffer_start_ : end - self.buffer_start_]
+        features = feature_extraction.get_features(y, self.sample_rate)
+
+        # get rid of frames coming from margins
+        first = self.n_features_ - max(0, self.n_features_ - self.n_margin_)
+        if n_frames is None:
+            features = features[first:]
+        else:
+            features = features[first : first + n_frames - self.n_features_]
+
+        if self.features_ is None:
+            self.features_ = features
+        else:
+            self.features_ = np.concatenate([self.features_, features])
+        self.n_features_ += len(features)
+
+        # only keep waveform needed to extract next features
+        keep = self._first_sample(self._get_waveform_segment().start)
+        if keep > self.buffer_start_:
+            self.buffer_ = self.buffer_[keep - self.buffer_start_ :]
+            self.buffer_start_ = keep
+
+    def _first_frame(self, start: float) -> int:
+        """Index of first frame of chunk starting at `start` (as Model.slide)"""
+        frames = self._scores.scorer_.feature_extraction_.sliding_window
+        return int(_first_frames(frames, np.array([start]), "center")[0])
+
+    def _extent(self, n_frames: int) -> Segment:
+        """Extent of the first `n_frames` frames (as SlidingWindowFeature.extent)"""
+        frames = self._scores.scorer_.feature_extraction_.sliding_window
+        return frames.range_to_segment(0, n_frames)
+
+    def _apply_model(self, chunk_starts: List[float], fixed: float = None):
+        """Apply model on chunks and accumulate their scores
+
+        Parameters
+        ----------
+        chunk_starts : list of float
+            Start time of each chunk.
+        fixed : float, optional
+            Duration of chunks. Defaults to `self.chunks_.duration`.
+        """
+
+        pretrained = self._scores.scorer_
+        frames = pretrained.feature_extraction_.sliding_window
+
+        if fixed is None:
+            n_chunk_frames = self.n_chunk_frames_
+        else:
+            n_chunk_frames = frames.samples(fixed, mode="center")
+
+        # pad with first and last frames, as done by Model.slide
+        first_frame = _first_frames(frames, np.array(chunk_starts), "center")
+        first_frame -= self.features_start_
+        data = self.features_
+        pad_first = max(0, -np.min(first_frame))
+        pad_last = max(0, np.max(first_frame) + n_chunk_frames - len(data))
+        if pad_first or pad_last:
+            pad_width = ((pad_first, pad_last),) + ((0, 0),) * (data.ndim - 1)
+            data = np.pad(data, pad_width, mode="edge")
+        X = np.stack([data[i : i + n_chunk_frames] for i in first_frame + pad_first])
+
+        with torch.no_grad():
+            tX = torch.tensor(X, dtype=torch.float32, device=pretrained.device)
+            fX = pretrained.model_(tX).detach().to("cpu").numpy()
+
+        # heuristic to determine whether scores are log-scaled
+        if not hasattr(self, "log_scale_"):
+            self.log_scale_ = np.nanmean(fX) < 0
+
+        resolution = self.resolution_
+        alignment = pretrained.model_.alignment
+        first_output = _first_frames(resolution, np.array(chunk_starts), alignment)
+        n_output_frames = fX.shape[1]
+
+        # make room for new frames
+        if self.sum_ is None:
+            self.sum_ = np.zeros((0,) + fX.shape[2:], dtype=np.float32)
+        self._extend(np.max(first_output) + n_output_frames - self.frame_)
+
+        # accumulate scores of frames that are not final yet
+        indices = first_output[:, np.newaxis] + np.arange(n_output_frames)
+        valid = indices >= self.frame_
+        np.add.at(self.sum_, indices[valid] - self.frame_, fX[valid])
+        np.add.at(self.k_, indices[valid] - self.frame_, 1)
+
+        self.covered_ = max(self.covered_, np.max(first_output) + n_output_frames)
+
+    def _extend(self, n: int):
+        """Make sure scores of the next `n` frames can be accumulated"""
+
+        missing = n - len(self.sum_)
+        if missing > 0:
+            zeros = np.zeros((missing,) + self.sum_.shape[1:], dtype=np.float32)
+            self.sum_ = np.concatenate([self.sum_, zeros])
+            self.k_ = np.concatenate([self.k_, np.zeros((missing, 1), dtype=np.int32)])
+
+    def _finalize(self, n_frames: int) -> Timeline:
+        """Make scores of frames up to frame #`n_frames` final and binarize them"""
+
+        n = n_frames - self.frame_
+        if n <= 0:
+            return Timeline()
+
+        # frames not covered by any chunk are given a zero score, as done by
+        # Model.slide (this only happens at the very end of the stream)
+        self._extend(n)
+
+        data = self.sum_[:n] / np.maximum(self.k_[:n], 1)
+        self.sum_ = self.sum_[n:]
+        self.k_ = self.k_[n:]
+
+        resolution = self.resolution_
+        window = SlidingWindow(
+            start=resolution[self.frame_].start,
+            duration=resolution.duration,
+            step=resolution.step,
+        )
+        self.frame_ = n_frames
+
+        if self.log_scale_:
+            data = np.exp(data)
+
+        # speech vs. non-speech
+        if data.shape[1] > 1:
+            speech_prob = 1.0 - data[:, 0]
+        else:
+            speech_prob = data[:, 0]
+
+        return self._binarize.partial_apply(SlidingWindowFeature(speech_prob, window))
+
+    def process(self, block: np.ndarray) -> Timeline:
+        """Process new block of audio
+
+        Parameters
+        ----------
+        block : (n_samples, n_channels) or (n_samples, ) np.ndarray
+            Audio samples, at `self.sample_rate`.
+
+        Returns
+        -------
+        speech : Timeline
+            Newly decided (parts of) speech regions, located between previous
+            and current value of `self.decided`. Consecutive parts of the same
+            speech region are contiguous.
+        """
+
+        if not hasattr(self, "_binarize"):
+            msg = "Pipeline must be instantiated before processing audio."
+            raise RuntimeError(msg)
+
+        y = np.asarray(block, dtype=np.float32)
+        if y.ndim == 1:
+            y = y[:, np.newaxis]
+        y = np.mean(y, axis=1, keepdims=True)
+
+        self.buffer_ = np.concatenate([self.buffer_, y])
+        self.n_samples_ += len(y)
+
+        # apply model on every chunk whose features are final (features are
+        # only extracted when needed by the next chunk)
+        chunk_starts = []
+        while True:
+            chunk = self.chunks_[self.next_chunk_]
+            n_frames = self._first_frame(chunk.start) + self.n_chunk_frames_
+            while self._extent(n_frames).end < chunk.end:
+                n_frames += 1
+            if n_frames > self.n_features_:
+                n_available = self._n_available()
+                if n_available < n_frames:
+                    break
+                self._extract(n_available)
+            chunk_starts.append(chunk.start)
+            self.next_chunk_ += 1
+        if chunk_starts:
+            self._apply_model(chunk_starts)
+
+        # only keep features needed by next chunks (the last chunk of the
+        # stream starts after the last complete one)
+        previous = self.chunks_[max(0, self.next_chunk_ - 1)].start
+        keep = max(0, self._first_frame(previous))
+        if keep > self.features_start_:
+            self.features_ = self.features_[keep - self.features_start_ :]
+            self.features_start_ = keep
+
+        if self.sum_ is None:
+            return Timeline()
+
+        # scores of frames that are not covered by upcoming chunks are final.
+        # this includes the last chunk of the stream, which ends with the
+        # stream and therefore starts at least one chunk duration before the
+        # end of features extracted so far.
+        resolution = self.resolution_
+        alignment = self._scores.scorer_.model_.alignment
+        start = min(
+            self.chunks_[self.next_chunk_].start,
+            self._extent(self.n_features_).end - self.chunks_.duration,
+        )
+        n_frames = _first_frames(resolution, np.array([start]), alignment)[0]
+
+        # so are scores of frames older than `latency`, as long as they are
+        # covered by at least one chunk
+        if self.latency is not None:
+            now = self.n_samples_ / self.sample_rate
+            middle = now - self.latency - resolution.start - 0.5 * resolution.duration
+            n_latency = int(np.floor(middle / resolution.step)) + 1
+            n_frames = max(n_frames, min(n_latency, self.covered_))
+
+        return self._finalize(n_frames)
+
+    def flush(self) -> Timeline:
+        """Process end of stream
+
+        Returns
+        -------
+        speech : Timeline
+            Remaining (parts of) speech regions.
+        """
+
+        if self.n_samples_ == 0:
+            return Timeline()
+
+        self._extract()
+        if self.n_features_ == 0:
+            return self._binarize.flush()
+
+        # remaining chunks, as in Model.slide (with align_last=True)
+        extent = self._extent(self.n_features_)
+        if extent.duration < self.chunks_.duration:
+            self._apply_model([extent.start], fixed=extent.duration)
+            end = extent.end
+
+        else:
+            chunk_starts = []
+            while self.chunks_[self.next_chunk_] in extent:
+                chunk_starts.append(self.chunks_[self.next_chunk_].start)
+                self.next_chunk_ += 1
+            end = self.chunks_[self.next_chunk_ - 1].end
+            if end < extent.end:
+                chunk_starts.append(extent.end - self.chunks_.duration)
+                end = extent.end
+            if chunk_starts:
+                self._apply_model(chunk_starts)
+
+        n_frames = self.resolution_.samples(end, mode="center")
+        speech = self._finalize(n_frames)
+        return speech.union(self._binarize.flush())
+
+    def __call__(self, current_file: dict) -> Annotation:
+        """Apply online speech activity detection on a whole file
+
+        The file is processed block by block, as if it were streamed.
+
+        Parameters
+        ----------
+        current_file : `dict`
+            File as provided by a pyannote.database protocol.
+
+        Returns
+        -------
+        speech : `pyannote.core.Annotation`
+            Speech regions.
+        """
+
+        self.reset()
+
+        waveform = RawAudio(sample_rate=self.sample_rate)(current_file).data
+        block_size = max(1, int(round(self.block_duration * self.sample_rate)))
+
+        speech = []
+        for start in range(0, len(waveform), block_size):
+            speech.extend(self.process(waveform[start : start + block_size]))
+        speech.extend(self.flush())
+
+        speech = Timeline(speech, uri=current_file.get("uri", None)).support()
+        return speech.to_annotation(generator="string", modality="speech")
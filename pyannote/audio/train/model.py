@@ -61,6 +61,9 @@ try:
 except ImportError as e:
     from typing_extensions import Literal
 from typing import Callable
+from typing import Any
+from typing import Iterable
+from typing import Iterator
 from pyannote.core import SlidingWindow
 from pyannote.core import SlidingWindowFeature
 
@@ -74,11 +77,67 @@ ALIGNMENT_LOOSE = "loose"
 Alignment = Literal[ALIGNMENT_CENTER, ALIGNMENT_STRICT, ALIGNMENT_LOOSE]
 
 from pyannote.audio.train.task import Task
+from pyannote.audio.utils.background import BackgroundGenerator
 import numpy as np
-import pescador
 import torch
 from torch.nn import Module
 from functools import partial
+from contextlib import contextmanager
+
+
+@contextmanager
+def _num_threads(num_threads: int = None):
+    """Temporarily set number of threads used by torch for intra-op parallelism
+
+    Parameters
+    ----------
+    num_threads : int, optional
+        Number of threads. Defaults to keeping torch current setting.
+    """
+
+    if num_threads is None:
+        yield
+        return
+
+    previous_num_threads = torch.get_num_threads()
+    torch.set_num_threads(num_threads)
+    try:
+        yield
+    finally:
+        torch.set_num_threads(previous_num_threads)
+
+
+def _first_frames(
+    window: SlidingWindow, starts: np.ndarray, mode: Alignment
+) -> np.ndarray:
+    """Vectorized version of window.crop(segment, mode=mode, fixed=...)[0]
+
+    Parameters
+    ----------
+    window : SlidingWindow
+        Sliding window.
+    starts : np.ndarray
+        Start time of segments.
+    mode : {'loose', 'strict', 'center'}
+        See `SlidingWindow.crop`.
+
+    Returns
+    -------
+    first : np.ndarray
+        Index of the first frame of each segment.
+    """
+
+    if mode == "loose":
+        first = np.ceil((starts - window.duration - window.start) / window.step)
+    elif mode == "strict":
+        first = np.ceil((starts - window.start) / window.step)
+    elif mode == "center":
+        first = np.rint((starts - window.start - 0.5 * window.duration) / window.step)
+    else:
+        msg = "'mode' must be one of {'loose', 'strict', 'center'}."
+        raise ValueError(msg)
+
+    return first.astype(np.int64)
 
 
 class Model(Module):
@@ -99,6 +158,10 @@ class Model(Module):
         Architecture hyper-parameters.
     """
 
+    # whether `forward` accepts a `lengths` keyword argument providing the
+    # actual length of each (padded) sequence of the batch
+    supports_lengths = False
+
     def __init__(self, specifications: dict, **architecture_params):
         super().__init__()
         self.specifications = specifications
@@ -384,6 +447,7 @@ class Model(Module):
         postprocess: Callable[[np.ndarray], np.ndarray] = None,
         return_intermediate=None,
         progress_hook=None,
+        num_threads: int = None,
     ) -> SlidingWindowFeature:
         """Slide and apply model on features
 
@@ -411,31 +475,83 @@ class Model(Module):
             Experimental. Not documented yet.
         progress_hook : callable
             Experimental. Not documented yet.
+        num_threads : int, optional
+            Number of threads used by torch for intra-op parallelism during
+            inference. Defaults to torch current setting.
+
+        Notes
+        -----
+        Batches of chunks are prepared in a background thread, while the
+        previous batch is being processed by the model.
         """
 
-        if device is None:
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-        device = torch.device(device)
-
-        if skip_average is None:
-            skip_average = (self.resolution == RESOLUTION_CHUNK) or (
-                return_intermediate is not None
-            )
-
-        try:
-            dimension = self.dimension
-        except AttributeError:
-            dimension = len(self.classes)
-
-        resolution = self.resolution
+        return _slide_many(
+            [self],
+            features,
+            sliding_window,
+            batch_size=batch_size,
+            device=device,
+            skip_average=skip_average,
+            postprocess=postprocess,
+            return_intermediate=return_intermediate,
+            progress_hook=progress_hook,
+            num_threads=num_threads,
+        )[0]
+
+
+def _slide_many(
+    models: List[Model],
+    features: SlidingWindowFeature,
+    sliding_window: SlidingWindow,
+    batch_size: int = 32,
+    device: torch.device = None,
+    skip_average: bool = None,
+    postprocess: Callable[[np.ndarray], np.ndarray] = None,
+    return_intermediate=None,
+    progress_hook=None,
+    num_threads: int = None,
+) -> List[SlidingWindowFeature]:
+    """Slide and apply several models on the same features
+
+    Each batch of chunks is gathered once and forwarded through every model.
+    See `Model.slide` for a description of parameters.
+
+    Returns
+    -------
+    outputs : list of SlidingWindowFeature
+        One output per model, in the same order as `models`.
+    """
 
-        # model returns one vector per input frame
-        if resolution == RESOLUTION_FRAME:
-            resolution = features.sliding_window
+    ((_, outputs),) = _slide_stream(
+        models,
+        [(None, features)],
+        sliding_window,
+        batch_size=batch_size,
+        device=device,
+        skip_average=skip_average,
+        postprocess=postprocess,
+        return_intermediate=return_intermediate,
+        progress_hook=progress_hook,
+        num_threads=num_threads,
+    )
+    return outputs
+
+
+class _SlideJob:
+    """Chunks of one input, and aggregation of their outputs, for each model"""
+
+    def __init__(
+        self,
+        key,
+        features: SlidingWindowFeature,
+        models: List[Model],
+        sliding_window: SlidingWindow,
+        skip_average: bool = None,
+        return_intermediate=None,
+    ):
 
-        # model returns one vector per input window
-        if resolution == RESOLUTION_CHUNK:
-            resolution = sliding_window
+        self.key = key
+        self.sliding_window = sliding_window
 
         support = features.extent
         if support.duration < sliding_window.duration:
@@ -444,66 +560,318 @@ class Model(Module):
         else:
             chunks = list(sliding_window(support, align_last=True))
             fixed = sliding_window.duration
-
-        if progress_hook is not None:
-            n_chunks = len(chunks)
-            n_done = 0
-            progress_hook(n_done, n_chunks)
-
-        batches = pescador.maps.buffer_stream(
-            iter(
-                {"X": features.crop(window, mode="center", fixed=fixed)}
-                for window in chunks
-            ),
-            batch_size,
-            partial=True,
+        self.n_chunks = len(chunks)
+        chunk_starts = np.array([chunk.start for chunk in chunks])
+
+        # index of first input frame of each chunk (same as "center" crop)
+        frames = features.sliding_window
+        first_frame = _first_frames(frames, chunk_starts, "center")
+        self.n_chunk_frames = frames.samples(fixed, mode="center")
+
+        # pad (once) with first and last frames, as done by "fixed" crop, so
+        # that every chunk is a valid (zero-copy) view of padded features
+        data = features.data
+        pad_first = max(0, -np.min(first_frame))
+        pad_last = max(0, np.max(first_frame) + self.n_chunk_frames - len(data))
+        if pad_first or pad_last:
+            pad_width = ((pad_first, pad_last),) + ((0, 0),) * (data.ndim - 1)
+            data = np.pad(data, pad_width, mode="edge")
+        self.windows = np.lib.stride_tricks.as_strided(
+            data,
+            shape=(len(data) - self.n_chunk_frames + 1, self.n_chunk_frames)
+            + data.shape[1:],
+            strides=(data.strides[0],) + data.strides,
+            writeable=False,
         )
+        self.first_frame = first_frame + pad_first
+
+        # per-model aggregation state
+        self.states = []
+        for model in models:
+
+            state = {"skip_average": skip_average}
+            if state["skip_average"] is None:
+                state["skip_average"] = (model.resolution == RESOLUTION_CHUNK) or (
+                    return_intermediate is not None
+                )
+
+            resolution = model.resolution
+
+            # model returns one vector per input frame
+            if resolution == RESOLUTION_FRAME:
+                resolution = features.sliding_window
+
+            # model returns one vector per input window
+            if resolution == RESOLUTION_CHUNK:
+                resolution = sliding_window
+
+            state["resolution"] = resolution
 
-        fX = []
-        for batch in batches:
+            if not state["skip_average"]:
 
-            tX = torch.tensor(batch["X"], dtype=torch.float32, device=device)
+                # get total number of frames (based on last window end time)
+                state["n_frames"] = resolution.samples(chunks[-1].end, mode="center")
 
-            # FIXME: fix support for return_intermediate
-            tfX = self(tX, return_intermediate=return_intermediate)
+                # index of first output frame of each chunk
+                state["first_output"] = _first_frames(
+                    resolution, chunk_starts, model.alignment
+                )
+                n_output_frames = resolution.samples(fixed, mode=model.alignment)
+                state["offsets"] = np.arange(n_output_frames)
 
-            tfX_npy = tfX.detach().to("cpu").numpy()
-            if postprocess is not None:
-                tfX_npy = postprocess(tfX_npy)
+                # k[i] is the number of chunks that overlap with frame #i
+                state["k"] = np.zeros((state["n_frames"], 1), dtype=np.int32)
 
-            fX.append(tfX_npy)
+            # output[i] is the sum of all predictions for frame #i (or the
+            # output of chunk #i when skip_average is True). it is allocated
+            # once the shape of model output is known.
+            state["output"] = None
 
-            if progress_hook is not None:
-                n_done += len(batch["X"])
-                progress_hook(n_done, n_chunks)
+            self.states.append(state)
 
-        fX = np.vstack(fX)
+        self.n_done = 0
 
-        if skip_average:
-            return SlidingWindowFeature(fX, sliding_window)
+    def get_chunks(self, chunks: slice) -> np.ndarray:
+        """Get (a copy of) input chunks"""
+        return self.windows[self.first_frame[chunks]]
 
-        # get total number of frames (based on last window end time)
-        n_frames = resolution.samples(chunks[-1].end, mode="center")
+    def accumulate(self, m: int, chunks: slice, fX: np.ndarray):
+        """Accumulate output of `m`th model on `chunks`"""
 
-        # data[i] is the sum of all predictions for frame #i
-        data = np.zeros((n_frames, dimension), dtype=np.float32)
+        state = self.states[m]
 
-        # k[i] is the number of chunks that overlap with frame #i
-        k = np.zeros((n_frames, 1), dtype=np.int8)
+        if state["skip_average"]:
+            if state["output"] is None:
+                state["output"] = np.empty(
+                    (self.n_chunks,) + fX.shape[1:], dtype=fX.dtype
+                )
+            state["output"][chunks] = fX
+            return
+
+        n_frames = state["n_frames"]
+        if state["output"] is None:
+            state["output"] = np.zeros((n_frames,) + fX.shape[2:], dtype=np.float32)
+
+        # indices of frames overlapped by chunks
+        indices = state["first_output"][chunks, np.newaxis] + state["offsets"]
+        valid = (indices >= 0) & (indices < n_frames)
+
+        # accumulate the outputs
+        np.add.at(state["output"], indices[valid], fX[valid])
+
+        # keep track of the number of overlapping sequence
+        # TODO - use smarter weights (e.g. Hamming window)
+        np.add.at(state["k"], indices[valid], 1)
+
+    def finalize(self) -> List[SlidingWindowFeature]:
+        """Get output of each model"""
 
-        for chunk, fX_ in zip(chunks, fX):
+        outputs = []
+        for state in self.states:
 
-            # indices of frames overlapped by chunk
-            indices = resolution.crop(chunk, mode=self.alignment, fixed=fixed)
+            if state["skip_average"]:
+                outputs.append(
+                    SlidingWindowFeature(state["output"], self.sliding_window)
+                )
+                continue
 
-            # accumulate the outputs
-            data[indices] += fX_
+            # compute average embedding of each frame
+            state["output"] /= np.maximum(state["k"], 1)
+            outputs.append(SlidingWindowFeature(state["output"], state["resolution"]))
 
-            # keep track of the number of overlapping sequence
-            # TODO - use smarter weights (e.g. Hamming window)
-            k[indices] += 1
+        return outputs
 
-        # compute average embedding of each frame
-        data = data / np.maximum(k, 1)
 
-        return SlidingWindowFeature(data, resolution)
+def _slide_stream(
+    models: List[Model],
+    inputs: Iterable[Tuple[Any, SlidingWindowFeature]],
+    sliding_window: SlidingWindow,
+    batch_size: int = 32,
+    device: torch.device = None,
+    skip_average: bool = None,
+    postprocess: Callable[[np.ndarray], np.ndarray] = None,
+    return_intermediate=None,
+    progress_hook=None,
+    num_threads: int = None,
+) -> Iterator[Tuple[Any, List[SlidingWindowFeature]]]:
+    """Slide and apply several models on a stream of features
+
+    Chunks of consecutive inputs are packed into full batches, which makes
+    a big difference when inputs are short (i.e. shorter than a batch).
+    Batches are prepared in a background thread (where `inputs` is also
+    consumed) while the previous one is being processed by the models.
+    See `Model.slide` for a description of other parameters.
+
+    Parameters
+    ----------
+    inputs : iterable of (key, features) tuples
+        Features, along with a key identifying them.
+
+    Yields
+    ------
+    key : any
+        Key of input features.
+    outputs : list of SlidingWindowFeature
+        One output per model, in the same order as `models`. Inputs are
+        yielded in order, as soon as all their chunks have been processed.
+
+    Notes
+    -----
+    Only chunks with the same number of frames can be packed together. This
+    is always the case except for inputs shorter than the sliding window.
+    """
+
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    device = torch.device(device)
+
+    def produce():
+
+        # pieces of current batch, as (job, chunks) tuples
+        pieces, n_pending, n_chunk_frames = [], 0, None
+
+        def pack(pieces):
+            X = np.concatenate([job.get_chunks(chunks) for job, chunks in pieces])
+            return pieces, torch.tensor(X, dtype=torch.float32, device=device)
+
+        for key, features in inputs:
+
+            job = _SlideJob(
+                key,
+                features,
+                models,
+                sliding_window,
+                skip_average=skip_average,
+                return_intermediate=return_intermediate,
+            )
+
+            # chunks with a different number of frames cannot be packed
+            if pieces and job.n_chunk_frames != n_chunk_frames:
+                yield pack(pieces)
+                pieces, n_pending = [], 0
+            n_chunk_frames = job.n_chunk_frames
+
+            i = 0
+            while i < job.n_chunks:
+                n = min(job.n_chunks - i, batch_size - n_pending)
+                pieces.append((job, slice(i, i + n)))
+                n_pending += n
+                i += n
+                if n_pending == batch_size:
+                    yield pack(pieces)
+                    pieces, n_pending = [], 0
+
+        if pieces:
+            yield pack(pieces)
+
+    # prepare next batch while current one is being processed
+    batches = BackgroundGenerator(produce, prefetch=2)
+
+    try:
+        for pieces, tX in batches:
+
+            for m, model in enumerate(models):
+
+                # FIXME: fix support for return_intermediate
+                # (number of threads is only changed during forward pass, as
+                # this generator might be suspended between two batches)
+                with torch.no_grad(), _num_threads(num_threads):
+                    tfX = model(tX, return_intermediate=return_intermediate)
+
+                tfX_npy = tfX.detach().to("cpu").numpy()
+                if postprocess is not None:
+                    tfX_npy = postprocess(tfX_npy)
+
+                # scatter outputs back to their job
+                offset = 0
+                for job, chunks in pieces:
+                    n = chunks.stop - chunks.start
+                    job.accumulate(m, chunks, tfX_npy[offset : offset + n])
+                    offset += n
+
+            for job, chunks in pieces:
+
+                if progress_hook is not None and job.n_done == 0:
+                    progress_hook(job.n_done, job.n_chunks)
+
+                job.n_done += chunks.stop - chunks.start
+
+                if progress_hook is not None:
+                    progress_hook(job.n_done, job.n_chunks)
+
+                if job.n_done == job.n_chunks:
+                    yield job.key, job.finalize()
+
+    finally:
+        batches.deactivate()
+
+
+class ScriptedModel:
+    """TorchScript module exposing the inference API of `Model`
+
+    Parameters
+    ----------
+    module : torch.jit.ScriptModule
+        Scripted (or traced) model.
+    resolution : Resolution
+        Output resolution. See `Model.resolution`.
+    alignment : Alignment
+        Output alignment. See `Model.alignment`.
+    classes : list, optional
+        Classes, for classification tasks.
+    dimension : int, optional
+        Output dimension, for representation learning tasks.
+    """
+
+    def __init__(
+        self,
+        module: torch.jit.ScriptModule,
+        resolution: Resolution,
+        alignment: Alignment,
+        classes: List[Text] = None,
+        dimension: int = None,
+    ):
+        super().__init__()
+        self.module_ = module
+        self.resolution_ = resolution
+        self.alignment_ = alignment
+        self.classes_ = classes
+        self.dimension_ = dimension
+
+    @property
+    def resolution(self) -> Resolution:
+        return self.resolution_
+
+    @property
+    def alignment(self) -> Alignment:
+        return self.alignment_
+
+    @property
+    def classes(self) -> List[Text]:
+        if self.classes_ is None:
+            msg = "Scripted model does not define attribute 'classes'."
+            raise AttributeError(msg)
+        return self.classes_
+
+    @property
+    def dimension(self) -> int:
+        if self.dimension_ is None:
+            msg = "Scripted model does not define attribute 'dimension'."
+            raise AttributeError(msg)
+        return self.dimension_
+
+    def eval(self) -> "ScriptedModel":
+        self.module_.eval()
+        return self
+
+    def to(self, device: torch.device) -> "ScriptedModel":
+        self.module_ = self.module_.to(device)
+        return self
+
+    def __call__(self, X: torch.Tensor, return_intermediate=None) -> torch.Tensor:
+        if return_intermediate is not None:
+            msg = '"return_intermediate" is not supported by scripted models.'
+            raise ValueError(msg)
+        return self.module_(X)
+
+    slide = Model.slide
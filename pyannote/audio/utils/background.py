@@ -136,7 +136,10 @@ class BackgroundGenerator(threading.Thread):
         """Stop background generator"""
         self.activated_ = False
         # unlock queue stuck at line queue.put() in self.run()
-        _ = self.queue_.get()
+        try:
+            _ = self.queue_.get_nowait()
+        except queue.Empty:
+            pass
 
     @property
     def production_time(self) -> float:
@@ -185,6 +188,9 @@ class BackgroundGenerator(threading.Thread):
                 sample = next(self.producer_)
             except StopIteration:
                 sample = None
+            except Exception as e:
+                # forward exception to the consumer
+                sample = e
 
             # keep track of how long it took to produce
             self.production_time_.append(time.time() - _t)
@@ -195,6 +201,10 @@ class BackgroundGenerator(threading.Thread):
             # will eventually unblock it.
             self.queue_.put(sample)
 
+            # a finite producer will not yield any more samples
+            if sample is None or isinstance(sample, Exception):
+                break
+
     def __next__(self):
         """Produce new sample"""
 
@@ -212,7 +222,10 @@ class BackgroundGenerator(threading.Thread):
         sample = self.queue_.get()
 
         # this happens when producer stopped yielding samples
-        if sample is None:
+        if sample is None or isinstance(sample, Exception):
+            self.activated_ = False
+            if isinstance(sample, Exception):
+                raise sample
             msg = "Producer stopped yielding samples."
             raise StopIteration(msg)
 
@@ -28,8 +28,11 @@
 
 import os
 import errno
+import secrets
+import tempfile
 from pathlib import Path
 from typing import Text
+from typing import Tuple
 from typing import Union
 
 
@@ -55,3 +58,41 @@ def mkdir_p(path: Union[Text, Path]):
             pass
         else:
             raise exc
+
+
+def mkstemp(suffix: Text = "", dir: Union[Text, Path] = None) -> Tuple[int, Text]:
+    """Create a new temporary file, with default permissions
+
+    Same as `tempfile.mkstemp` except that the file is given the default
+    permissions of files created with `open` (i.e. 0o666 minus current
+    umask) instead of only being readable and writable by its owner.
+
+    Parameters
+    ----------
+    suffix : str, optional
+        File name suffix.
+    dir : str or Path, optional
+        Directory where the file is created. Defaults to the default
+        temporary directory.
+
+    Returns
+    -------
+    fd : int
+        File descriptor, opened for writing.
+    path : str
+        Absolute path to the file.
+    """
+
+    if dir is None:
+        dir = tempfile.gettempdir()
+
+    # umask is applied by the operating system (changing the umask of the
+    # process to read it would also affect files created by other threads)
+    flags = os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, "O_BINARY", 0)
+    while True:
+        path = os.path.abspath(os.path.join(dir, f"tmp{secrets.token_hex(8)}{suffix}"))
+        try:
+            fd = os.open(path, flags, 0o666)
+        except FileExistsError:
+            continue
+        return fd, path
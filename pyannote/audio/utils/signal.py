@@ -32,13 +32,39 @@
 
 
 import numpy as np
+import scipy.ndimage
 import scipy.signal
 from pyannote.core import Segment, Timeline
+from pyannote.core.segment import SEGMENT_PRECISION
 from pyannote.core.utils.generators import pairwise
 from sklearn.mixture import GaussianMixture
 from pyannote.core.utils.numpy import one_hot_decoding
 
 
+def _argrelmax(y, order=1):
+    """Same as scipy.signal.argrelmax(y, order=order)[0] for 1D arrays
+
+    Relies on a running maximum (whose complexity does not depend on `order`)
+    rather than on `order` array comparisons.
+    """
+
+    n = len(y)
+    if n < 3 or np.any(np.isnan(y)):
+        return scipy.signal.argrelmax(y, order=order)[0]
+
+    # highest[i] is the maximum of padded[i: i + order]
+    padded = np.pad(y, order, mode="constant", constant_values=-np.inf)
+    highest = scipy.ndimage.maximum_filter1d(
+        padded, order, origin=-(order // 2), mode="constant", cval=-np.inf
+    )
+
+    # compare with `order` samples on the left and `order` samples on the right
+    # (first and last samples are never local maxima, as with mode="clip")
+    is_maximum = (y > highest[:n]) & (y > highest[order + 1 : order + 1 + n])
+    is_maximum[[0, -1]] = False
+    return np.where(is_maximum)[0]
+
+
 class Peak(object):
     """Peak detection
 
@@ -55,23 +81,79 @@ class Peak(object):
     log_scale : bool, optional
         Set to True to indicate that binarized scores are log scaled.
         Defaults to False.
+    cache : dict, optional
+        When provided, local maxima (and their height) are stored in this
+        dictionary and reused by subsequent calls to `apply` with the same
+        `key`, the same (quantized) `min_duration`, and the very same (i.e.
+        not a copy) `predictions.data` array, a reference to which is kept in
+        the cache. Sharing one cache between instances with different `alpha`
+        (e.g. during pipeline optimization) makes `apply` only filter
+        precomputed maxima.
 
     """
 
-    def __init__(self, alpha=0.5, min_duration=1.0, scale="absolute", log_scale=False):
+    def __init__(
+        self, alpha=0.5, min_duration=1.0, scale="absolute", log_scale=False, cache=None
+    ):
         super(Peak, self).__init__()
         self.alpha = alpha
         self.scale = scale
         self.min_duration = min_duration
         self.log_scale = log_scale
+        self.cache = cache
 
-    def apply(self, predictions, dimension=0):
+    def _get_maxima(self, y, order, key=None, scores=None):
+        """Get (possibly cached) local maxima
+
+        Parameters
+        ----------
+        y : np.ndarray
+            (Exponentiated) scores.
+        order : int
+            See `_argrelmax`.
+        key : hashable, optional
+            Unique identifier of `scores`.
+        scores : np.ndarray, optional
+            Array `y` was obtained from. Cached maxima are only used when they
+            were computed from this very array.
+
+        Returns
+        -------
+        indices : np.ndarray
+            Indices of local maxima.
+        heights : np.ndarray
+            Corresponding values.
+        """
+
+        if self.cache is None or key is None:
+            indices = _argrelmax(y, order=order)
+            return indices, y[indices]
+
+        # scores might have changed since maxima were cached (e.g. scores of
+        # a new model for the same file)
+        key = (key, order, self.log_scale)
+        cached = self.cache.get(key, None)
+        if cached is None or cached[0] is not scores:
+            indices = _argrelmax(y, order=order)
+            cached = (scores, indices, y[indices])
+            self.cache[key] = cached
+        return cached[1], cached[2]
+
+    def apply(self, predictions, dimension=0, key=None):
         """Peak detection
 
         Parameter
         ---------
         predictions : SlidingWindowFeature
             Predictions returned by segmentation approaches.
+        dimension : int, optional
+            Which dimension to process
+        key : hashable, optional
+            Unique identifier of `predictions` (e.g. the one returned by
+            `pyannote.database.get_unique_identifier`), used to look local
+            maxima up in `cache`. Has no effect when `cache` is not provided.
+            Cached maxima are only used when `predictions.data` is the array
+            they were computed from.
 
         Returns
         -------
@@ -93,7 +175,9 @@ class Peak(object):
 
         precision = sw.step
         order = max(1, int(np.rint(self.min_duration / precision)))
-        indices = scipy.signal.argrelmax(y, order=order)[0]
+        indices, heights = self._get_maxima(
+            y, order, key=key, scores=predictions.data
+        )
 
         if self.scale == "absolute":
             mini = 0
@@ -109,19 +193,18 @@ class Peak(object):
 
         threshold = mini + self.alpha * (maxi - mini)
 
-        peak_time = np.array([sw[i].middle for i in indices if y[i] > threshold])
+        # same as [sw[i].middle for i in indices if y[i] > threshold]
+        peak_start = sw.start + indices[heights > threshold] * sw.step
+        peak_time = 0.5 * (peak_start + (peak_start + sw.duration))
 
         n_windows = len(y)
         start_time = sw[0].start
         end_time = sw[n_windows].end
 
         boundaries = np.hstack([[start_time], peak_time, [end_time]])
-        segmentation = Timeline()
-        for i, (start, end) in enumerate(pairwise(boundaries)):
-            segment = Segment(start, end)
-            segmentation.add(segment)
-
-        return segmentation
+        return Timeline(
+            segments=[Segment(start, end) for start, end in pairwise(boundaries)]
+        )
 
 
 class Binarize(object):
@@ -140,6 +223,24 @@ class Binarize(object):
     log_scale : bool, optional
         Set to True to indicate that binarized scores are log scaled.
         Will apply exponential first. Defaults to False.
+    pad_onset, pad_offset : float, optional
+        Padding added before (resp. after) each active region. Defaults to 0.
+    min_duration_on : float, optional
+        Remove active regions shorter than that many seconds. Defaults to 0.
+    min_duration_off : float, optional
+        Fill inactive regions shorter than that many seconds. Defaults to 0.
+
+    Usage
+    -----
+    Offline:
+    >>> binarize = Binarize(onset=0.7, offset=0.3)
+    >>> active = binarize.apply(predictions)
+
+    Online, with predictions provided block by block:
+    >>> for block in blocks:   # SlidingWindowFeature
+    ...     active = binarize.partial_apply(block)
+    ...     # active regions between previous and current `binarize.decided`
+    >>> active = binarize.flush()
 
     Reference
     ---------
@@ -172,14 +273,13 @@ class Binarize(object):
         self.min_duration_on = min_duration_on
         self.min_duration_off = min_duration_off
 
-    def apply(self, predictions, dimension=0):
-        """
-        Parameters
-        ----------
-        predictions : SlidingWindowFeature
-            Must be mono-dimensional
-        dimension : int, optional
-            Which dimension to process
+        self.reset()
+
+    def _get_data(self, predictions, dimension=0, window=None, first=0):
+        """Get (absolute, not log-scaled) scores and frame timestamps
+
+        Timestamps are computed as those of frames #`first`, #`first + 1`, ...
+        of `window` (defaults to `predictions.sliding_window`).
         """
 
         if len(predictions.data.shape) == 1:
@@ -192,13 +292,122 @@ class Binarize(object):
         if self.log_scale:
             data = np.exp(data)
 
-        n_samples = predictions.getNumber()
-        window = predictions.sliding_window
-        timestamps = [window[i].middle for i in range(n_samples)]
+        # same as [window[i].middle for i in range(first, first + n_samples)]
+        if window is None:
+            window = predictions.sliding_window
+        start = window.start + np.arange(first, first + len(data)) * window.step
+        timestamps = 0.5 * (start + (start + window.duration))
 
-        # initial state
-        start = timestamps[0]
-        label = data[0] > self.onset
+        return data, timestamps
+
+    @staticmethod
+    def _hysteresis(data, onset, offset, active=None):
+        """Onset/offset thresholding
+
+        Parameters
+        ----------
+        data : (n_samples, ) np.ndarray
+            Scores.
+        onset, offset : float
+            Absolute thresholds.
+        active : bool, optional
+            State before first sample. Defaults to using first sample to
+            initialize the state (i.e. active if data[0] > onset).
+
+        Returns
+        -------
+        active : (n_samples, ) np.ndarray
+            Boolean state of each sample.
+        """
+
+        # inactive samples above onset become active and active samples below
+        # offset become inactive. when onset < offset, samples in between
+        # switch state whatever it is.
+        above = data > onset
+        below = data < offset
+        switch = above & below
+        event = above ^ below
+
+        if active is None:
+            event[0] = True
+            switch[0] = False
+            active = False
+
+        # state is given by the last event, toggled by subsequent switches
+        index = np.where(event, np.arange(len(data)), -1)
+        last = np.maximum.accumulate(index)
+        n_switches = np.cumsum(switch)
+        from_last = np.where(last < 0, n_switches, n_switches - n_switches[last])
+        state = np.where(last < 0, active, above[last])
+        return state ^ (from_last % 2 == 1)
+
+    def _postprocess(self, start, end):
+        """Merge, remove short active regions, and fill short inactive ones
+
+        Parameters
+        ----------
+        start, end : (n_regions, ) np.ndarray
+            Boundaries of (padded) active regions, in chronological order.
+
+        Returns
+        -------
+        start, end : (n_regions, ) np.ndarray
+            Boundaries of resulting active regions.
+        """
+
+        # empty regions are ignored (as done by Timeline)
+        keep = end - start > SEGMENT_PRECISION
+        start, end = start[keep], end[keep]
+
+        # because of padding, some 'active' regions might be overlapping
+        # therefore, we merge those overlapping regions (as Timeline.support)
+        end = np.maximum.accumulate(end)
+        merge = start[1:] - end[:-1] <= SEGMENT_PRECISION
+        start, end = self._merge(start, end, merge)
+
+        # remove short 'active' regions
+        keep = end - start > self.min_duration_on
+        start, end = start[keep], end[keep]
+
+        # fill short 'inactive' regions
+        return self._merge(start, end, start[1:] - end[:-1] < self.min_duration_off)
+
+    @staticmethod
+    def _merge(start, end, merge):
+        """Merge consecutive regions
+
+        Parameters
+        ----------
+        start, end : (n_regions, ) np.ndarray
+            Boundaries of regions, in chronological order (including `end`).
+        merge : (n_regions - 1, ) np.ndarray
+            Whether region #i + 1 should be merged with region #i.
+        """
+        if len(start) == 0:
+            return start, end
+        first = np.hstack([[True], ~merge])
+        last = np.hstack([~merge, [True]])
+        return start[first], end[last]
+
+    def apply(self, predictions, dimension=0):
+        """
+        Parameters
+        ----------
+        predictions : SlidingWindowFeature
+            Must be mono-dimensional
+        dimension : int, optional
+            Which dimension to process
+
+        Returns
+        -------
+        active : Timeline
+            Active regions.
+        """
+
+        data, timestamps = self._get_data(predictions, dimension=dimension)
+
+        if len(data) == 0:
+            return Timeline()
 
         if self.scale == "absolute":
             mini = 0
@@ -215,46 +424,264 @@ class Binarize(object):
         onset = mini + self.onset * (maxi - mini)
         offset = mini + self.offset * (maxi - mini)
 
-        # timeline meant to store 'active' segments
-        active = Timeline()
+        active = self._hysteresis(data, onset, offset)
+
+        # active regions start when switching from inactive to active and end
+        # when switching back (or at the end if active at the end)
+        previous = np.hstack([[False], active[:-1]])
+        start = timestamps[active & ~previous]
+        end = timestamps[previous & ~active]
+        if active[-1]:
+            end = np.hstack([end, timestamps[-1:]])
+
+        start, end = self._postprocess(
+            start - self.pad_onset, end + self.pad_offset
+        )
+
+        return Timeline(segments=[Segment(s, e) for s, e in zip(start, end)])
+
+    def reset(self):
+        """Prepare `partial_apply` for a new stream"""
+
+        # time up to which decisions are final
+        self.decided_ = -np.inf
+
+        # sliding window of the first block, and number of frames so far
+        self.window_ = None
+        self.n_frames_ = 0
+
+        # timestamp of last sample, state, and start of current active region
+        self.t_ = None
+        self.active_ = False
+        self.start_ = None
+
+        # union of (padded) active regions that may still grow
+        self.block_ = None
+        # output region that may still be merged with the next one
+        self.output_ = None
+        # output regions that are final
+        self.done_ = []
+
+    @property
+    def decided(self):
+        """Time up to which `partial_apply` decisions are final"""
+        return self.decided_
+
+    def _push(self, start, end):
+        """Add (padded) active region, whose end is final"""
+
+        if end - start <= SEGMENT_PRECISION:
+            return
+
+        # same as Timeline.support
+        if self.block_ is not None and start - self.block_[1] <= SEGMENT_PRECISION:
+            self.block_[1] = max(self.block_[1], end)
+            return
+
+        if self.block_ is not None:
+            self._keep(*self.block_)
+        self.block_ = [start, end]
+
+    def _keep(self, start, end):
+        """Add (merged) active region, whose boundaries are final"""
+
+        # remove short active regions
+        if end - start <= self.min_duration_on:
+            return
+
+        if self.output_ is None:
+            self.output_ = [start, end]
+
+        # fill short inactive regions
+        elif start - self.output_[1] < self.min_duration_off:
+            self.output_[1] = max(self.output_[1], end)
+
+        else:
+            self.done_.append(self.output_)
+            self.output_ = [start, end]
+
+    def _report(self, decided, pending=None):
+        """Report active regions between `self.decided` and `decided`
+
+        Parameters
+        ----------
+        decided : float
+            New time up to which decisions are final.
+        pending : [start, end] list, optional
+            Active region that is not complete yet, but whose part before
+            `decided` is final.
+        """
+
+        regions = self.done_
+        if pending is not None:
+            regions = regions + [pending]
+        self.done_ = []
+
+        segments = []
+        for start, end in regions:
+            segment = Segment(max(start, self.decided_), min(end, decided))
+            if segment:
+                segments.append(segment)
+
+        self.decided_ = max(self.decided_, decided)
+        return Timeline(segments=segments)
+
+    def partial_apply(self, predictions, dimension=0):
+        """Process next block of a stream of predictions
+
+        Blocks must be provided in chronological order, without gap nor
+        overlap between them. Once the stream is flushed, the union of
+        returned active regions is the same as what `apply` returns on the
+        whole stream.
+
+        Parameters
+        ----------
+        predictions : SlidingWindowFeature
+            Next block of predictions.
+        dimension : int, optional
+            Which dimension to process
 
-        for t, y in zip(timestamps[1:], data[1:]):
+        Returns
+        -------
+        active : Timeline
+            Newly decided parts of active regions, all located between previous
+            and current value of `self.decided`. Consecutive parts of the same
+            active region are contiguous.
+        """
 
-            # currently active
-            if label:
-                # switching from active to inactive
-                if y < offset:
-                    segment = Segment(start - self.pad_onset, t + self.pad_offset)
-                    active.add(segment)
-                    start = t
-                    label = False
+        if self.scale != "absolute":
+            msg = f'partial_apply only supports "absolute" scale (is: {self.scale}).'
+            raise ValueError(msg)
 
-            # currently inactive
+        # timestamps are computed from the start of the stream (rather than
+        # from the start of each block) so that they are exactly the same as
+        # the ones used by `apply` on the whole stream. otherwise, rounding
+        # errors might change the outcome of comparisons with durations that
+        # are multiples of the frame step.
+        window = predictions.sliding_window
+        if self.window_ is None:
+            self.window_ = window
+        expected = self.window_.start + self.n_frames_ * self.window_.step
+        if abs(window.start - expected) > 0.5 * self.window_.step:
+            msg = (
+                f"Blocks must be contiguous: expected a block starting at "
+                f"{expected:g}s (got {window.start:g}s)."
+            )
+            raise ValueError(msg)
+
+        data, timestamps = self._get_data(
+            predictions, dimension=dimension, window=self.window_, first=self.n_frames_
+        )
+        self.n_frames_ += len(data)
+
+        if len(data) > 0:
+
+            first = self.t_ is None
+            active = self._hysteresis(
+                data, self.onset, self.offset, active=None if first else self.active_
+            )
+
+            previous = np.hstack([[False if first else self.active_], active[:-1]])
+            starts = list(timestamps[active & ~previous])
+            ends = timestamps[previous & ~active]
+            if self.active_ and not first:
+                starts = [self.start_] + starts
+
+            # regions that are complete
+            for start, end in zip(starts, ends):
+                self._push(start - self.pad_onset, end + self.pad_offset)
+
+            self.t_ = timestamps[-1]
+            self.active_ = bool(active[-1])
+            if self.active_:
+                self.start_ = starts[-1]
+
+        if self.t_ is None:
+            return Timeline()
+
+        # upcoming active regions cannot start before `lower` (they start
+        # exactly at `lower` in case a region is currently active)
+        if self.active_:
+            lower = self.start_ - self.pad_onset
+        else:
+            lower = self.t_ - self.pad_onset
+
+        # current block is complete when no upcoming region can be merged
+        block = self.block_
+        if block is not None:
+            if (self.active_ and lower - block[1] > SEGMENT_PRECISION) or (
+                not self.active_ and lower >= block[1]
+            ):
+                self._keep(*block)
+                self.block_ = block = None
+
+        # current (possibly incomplete) block, including active region
+        current = block
+        if self.active_:
+            end = self.t_ + self.pad_offset
+            if block is None:
+                current = [lower, end]
             else:
-                # switching from inactive to active
-                if y > onset:
-                    start = t
-                    label = True
-
-        # if active at the end, add final segment
-        if label:
-            segment = Segment(start - self.pad_onset, t + self.pad_offset)
-            active.add(segment)
-
-        # because of padding, some 'active' segments might be overlapping
-        # therefore, we merge those overlapping segments
-        active = active.support()
-
-        # remove short 'active' segments
-        active = Timeline([s for s in active if s.duration > self.min_duration_on])
-
-        # fill short 'inactive' segments
-        inactive = active.gaps()
-        for s in inactive:
-            if s.duration < self.min_duration_off:
-                active.add(s)
-        active = active.support()
+                current = [block[0], max(block[1], end)]
+
+        # an incomplete block is known to be kept as soon as it is long enough
+        # (because it can only grow) and not empty (as empty regions are ignored)
+        kept = current is not None and (
+            current[1] - current[0] > max(self.min_duration_on, SEGMENT_PRECISION)
+        )
+
+        # output region is complete when it is known that the gap with the
+        # next output region is long enough not to be filled
+        if self.output_ is not None:
+            start = lower if current is None else current[0]
+            if start - self.output_[1] >= self.min_duration_off:
+                self.done_.append(self.output_)
+                self.output_ = None
+
+        if kept:
+            if self.output_ is None:
+                pending = current
+            else:
+                # short gap between output region and current block is filled
+                pending = [self.output_[0], current[1]]
+            return self._report(current[1], pending=pending)
+
+        if self.output_ is not None:
+            return self._report(self.output_[1], pending=self.output_)
+
+        if current is not None:
+            return self._report(current[0])
+
+        return self._report(lower)
+
+    def flush(self):
+        """Process end of stream
+
+        Returns
+        -------
+        active : Timeline
+            Remaining (parts of) active regions. The state of `partial_apply`
+            is reset afterwards.
+        """
+
+        if self.t_ is None:
+            return Timeline()
+
+        # if active at the end, add final region
+        if self.active_:
+            self._push(self.start_ - self.pad_onset, self.t_ + self.pad_offset)
+            self.active_ = False
+
+        if self.block_ is not None:
+            self._keep(*self.block_)
+            self.block_ = None
+
+        if self.output_ is not None:
+            self.done_.append(self.output_)
+            self.output_ = None
 
+        active = self._report(np.inf)
+        self.reset()
         return active
 
 
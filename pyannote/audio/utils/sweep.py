@@ -0,0 +1,436 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2020 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+"""
+# Single-pass threshold sweeps
+"""
+
+from typing import Tuple
+
+import numpy as np
+from pyannote.core import SlidingWindowFeature
+from pyannote.core import Timeline
+
+
+def _cumulated_duration(timeline: Timeline, t: np.ndarray) -> np.ndarray:
+    """Duration of `timeline` located before each timestamp `t`
+
+    Parameters
+    ----------
+    timeline : Timeline
+        Timeline made of disjoint segments (i.e. its own support).
+    t : (n, ) np.ndarray
+        Timestamps.
+
+    Returns
+    -------
+    duration : (n, ) np.ndarray
+        duration[i] is the duration of timeline & [-inf, t[i]]
+    """
+
+    if not timeline:
+        return np.zeros(len(t))
+
+    start = np.array([segment.start for segment in timeline])
+    end = np.array([segment.end for segment in timeline])
+    before = np.hstack([[0.0], np.cumsum(end - start)])
+
+    # index of the last segment starting before t (-1 if there is none)
+    k = np.searchsorted(start, t, side="right") - 1
+    k_ = np.maximum(k, 0)
+    inside = np.minimum(t - start[k_], end[k_] - start[k_])
+    return np.where(k < 0, 0.0, before[k_] + inside)
+
+
+class DetectionThresholdSweep:
+    """Detection precision, recall and F-score for every possible threshold
+
+    Evaluating a detection pipeline (e.g. speech activity detection) for a
+    given threshold means binarizing scores of every file and comparing the
+    resulting regions with the reference. This class gives the result of this
+    evaluation for all possible thresholds at once: frames of all files are
+    sorted once by decreasing score, so that lowering the threshold amounts
+    to activating one more group of frames.
+
+    Results are exactly those of `DetectionPrecisionRecallFMeasure` (with no
+    collar) applied on the output of `Binarize` with onset = offset =
+    threshold, no padding and no minimum duration -- as long as scores do not
+    contain NaNs. Otherwise, they can be used as a fast approximation.
+
+    Usage
+    -----
+    >>> sweep = DetectionThresholdSweep()
+    >>> for current_file in protocol.development():
+    ...     sweep.add(scores, reference, uem=get_annotated(current_file))
+    >>> threshold, fscore = sweep.best()
+    """
+
+    def __init__(self):
+        super().__init__()
+
+        # score of each frame, and duration of relevant (resp. irrelevant)
+        # evaluated regions that are retrieved when this frame is active
+        self.scores_ = []
+        self.relevant_ = []
+        self.irrelevant_ = []
+
+        # total duration of relevant evaluated regions
+        self.total_relevant_ = 0.0
+
+    def add(self, scores: SlidingWindowFeature, reference: Timeline, uem: Timeline):
+        """Add one file
+
+        Parameters
+        ----------
+        scores : SlidingWindowFeature
+            (Absolute, not log-scaled) mono-dimensional detection scores.
+        reference : Timeline
+            Reference regions.
+        uem : Timeline
+            Evaluated regions.
+        """
+
+        data = scores.data
+        if len(data.shape) > 1:
+            data = data[:, 0]
+
+        # same as Binarize timestamps
+        window = scores.sliding_window
+        start = window.start + np.arange(len(data)) * window.step
+        t = 0.5 * (start + (start + window.duration))
+
+        uem = uem.support()
+        reference = reference.crop(uem, mode="intersection").support()
+        self.total_relevant_ += reference.duration()
+
+        if len(t) < 2:
+            return
+
+        # Binarize switches state at frames timestamps: hypothesis between two
+        # consecutive timestamps t[i] and t[i + 1] is active iff frame i is.
+        relevant = np.diff(_cumulated_duration(reference, t))
+        evaluated = np.diff(_cumulated_duration(uem, t))
+
+        self.scores_.append(data[:-1])
+        self.relevant_.append(relevant)
+        self.irrelevant_.append(evaluated - relevant)
+
+    def compute_metrics(
+        self, beta: float = 1.0
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Compute precision, recall, and F-score for all thresholds
+
+        Parameters
+        ----------
+        beta : float, optional
+            When beta > 1, greater importance is given to recall.
+            When beta < 1, greater importance is given to precision.
+            Defaults to 1.
+
+        Returns
+        -------
+        thresholds : (n_thresholds, ) np.ndarray
+            Thresholds, in decreasing order (first one activates no frame,
+            last one activates every frame).
+        precision, recall, fscore : (n_thresholds, ) np.ndarray
+            Corresponding detection precision, recall and F-score.
+        """
+
+        scores = np.hstack([[]] + self.scores_)
+        relevant = np.hstack([[]] + self.relevant_)
+        irrelevant = np.hstack([[]] + self.irrelevant_)
+
+        # sort frames by decreasing score and only keep the last frame of
+        # each group of frames sharing the same score
+        order = np.argsort(-scores, kind="stable")
+        scores = scores[order]
+        last = np.hstack([scores[1:] != scores[:-1], [True]])
+
+        # relevant (and total) retrieved duration when activating all frames
+        # with a score greater or equal to scores[i]
+        true_positive = np.hstack([[0.0], np.cumsum(relevant[order])[last]])
+        retrieved = true_positive + np.hstack(
+            [[0.0], np.cumsum(irrelevant[order])[last]]
+        )
+
+        # thresholds in-between consecutive distinct scores
+        distinct = scores[last]
+        if len(distinct) > 0:
+            thresholds = np.hstack(
+                [
+                    distinct[:1],
+                    0.5 * (distinct[1:] + distinct[:-1]),
+                    [np.nextafter(distinct[-1], -np.inf)],
+                ]
+            )
+        else:
+            thresholds = np.array([0.5])
+
+        # same special cases as DetectionPrecisionRecallFMeasure
+        with np.errstate(divide="ignore", invalid="ignore"):
+            precision = np.where(retrieved > 0, true_positive / retrieved, 1.0)
+            if self.total_relevant_ > 0:
+                recall = true_positive / self.total_relevant_
+            else:
+                recall = np.where(true_positive > 0, 0.0, 1.0)
+            fscore = np.where(
+                precision + recall > 0,
+                (1 + beta * beta)
+                * precision
+                * recall
+                / (beta * beta * precision + recall),
+                0.0,
+            )
+
+        return thresholds, precision, recall, fscore
+
+    def best(self, beta: float = 1.0) -> Tuple[float, float]:
+        """Get threshold with the best F-score
+
+        Parameters
+        ----------
+        beta : float, optional
+            See `compute_metrics`. Defaults to 1.
+
+        Returns
+        -------
+        threshold : float
+            Best threshold
+        fscore : float
+            Corresponding F-score.
+        """
+
+        thresholds, _, _, fscore = self.compute_metrics(beta=beta)
+        i = np.argmax(fscore)
+        return float(thresholds[i]), float(fscore[i])
+
+
+class ClusteringThresholdSweep:
+    """Diarization purity, coverage and F-score for every dendrogram cut
+
+    Evaluating a hierarchical clustering for a given stopping threshold means
+    cutting the dendrogram of every file (`fcluster`), building the resulting
+    hypothesis and comparing it with the reference. This class gives the
+    result of this evaluation for all thresholds at once: the co-occurrence
+    of each leaf with each reference class is computed once per file, and
+    merges are then replayed in the order in which they happen when the
+    threshold increases, updating purity and coverage components on the way.
+
+    Results are exactly those of `DiarizationPurityCoverageFMeasure` applied
+    on hypotheses obtained with fcluster(Z, threshold, criterion="distance").
+
+    Parameters
+    ----------
+    weighted : bool, optional
+        When True (default), each cluster/class is weighted by its overall
+        duration. Same as `DiarizationPurityCoverageFMeasure`.
+
+    Usage
+    -----
+    >>> sweep = ClusteringThresholdSweep(weighted=False)
+    >>> for current_file in protocol.development():
+    ...     sweep.add(Z, cooccurrence)
+    >>> threshold, fscore = sweep.best()
+    """
+
+    def __init__(self, weighted: bool = True):
+        super().__init__()
+        self.weighted = weighted
+
+        # (height, purity numerator, purity denominator, coverage numerator)
+        # increments, one per merge
+        self.events_ = []
+
+        # components when every leaf is its own cluster
+        self.purity_ = np.zeros(2)
+        self.coverage_ = np.zeros(2)
+
+    def _purity(self, column: np.ndarray) -> np.ndarray:
+        """(numerator, denominator) purity components of one cluster"""
+        largest, duration = np.max(column, initial=0.0), np.sum(column)
+        if self.weighted:
+            return np.array([largest, duration])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.array([largest / duration, 1.0])
+
+    def add(self, Z: np.ndarray, cooccurrence: np.ndarray, present: np.ndarray = None):
+        """Add one file
+
+        Parameters
+        ----------
+        Z : (n_leaves - 1, 4) np.ndarray
+            Linkage matrix (as returned by `pyannote.core.utils.hierarchy`).
+        cooccurrence : (n_classes, n_leaves) np.ndarray
+            cooccurrence[c, k] is the duration of co-occurrence between k-th
+            leaf and reference class c (i.e. reference * hypothesis when each
+            leaf is its own cluster).
+        present : (n_leaves, ) np.ndarray, optional
+            Whether each leaf is part of evaluated hypothesis. Clusters made of
+            absent leaves only are not counted. Defaults to all leaves.
+        """
+
+        n_classes, n_leaves = cooccurrence.shape
+        if present is None:
+            present = np.ones(n_leaves, dtype=bool)
+
+        # coverage components (denominator does not depend on the threshold)
+        duration_class = np.sum(cooccurrence, axis=1)
+        largest = np.max(cooccurrence, axis=1, initial=0.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if self.weighted:
+                coverage = np.array([np.sum(largest), np.sum(duration_class)])
+            else:
+                coverage = np.array([np.sum(largest / duration_class), n_classes])
+        self.coverage_ += coverage
+
+        # purity components
+        columns = list(cooccurrence.T)
+        present = list(present)
+        purity = [
+            self._purity(column) if p else np.zeros(2)
+            for column, p in zip(columns, present)
+        ]
+        self.purity_ += np.sum(purity, axis=0) if purity else np.zeros(2)
+
+        # a merge happens as soon as the threshold reaches the largest height
+        # of its subtree (this is how fcluster handles non-monotonic linkage)
+        height = np.array(Z[:, 2], dtype=np.float64)
+        for k, (i, j) in enumerate(np.array(Z[:, :2], dtype=np.int64)):
+            for child in (i, j):
+                if child >= n_leaves:
+                    height[k] = max(height[k], height[child - n_leaves])
+
+        for k in np.argsort(height, kind="stable"):
+            i, j = int(Z[k, 0]), int(Z[k, 1])
+
+            column = columns[i] + columns[j]
+            columns.append(column)
+            present.append(present[i] or present[j])
+            purity.append(self._purity(column) if present[-1] else np.zeros(2))
+
+            # largest cluster of each class can only grow
+            previous = largest
+            largest = np.maximum(largest, column)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                if self.weighted:
+                    d_coverage = np.sum(largest - previous)
+                else:
+                    d_coverage = np.sum((largest - previous) / duration_class)
+
+            d_purity = purity[-1] - purity[i] - purity[j]
+            self.events_.append((height[k], d_purity[0], d_purity[1], d_coverage))
+
+    def compute_metrics(
+        self, beta: float = 1.0
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Compute purity, coverage, and F-score for all thresholds
+
+        Parameters
+        ----------
+        beta : float, optional
+            When beta > 1, greater importance is given to coverage.
+            When beta < 1, greater importance is given to purity.
+            Defaults to 1.
+
+        Returns
+        -------
+        thresholds : (n_thresholds, ) np.ndarray
+            Thresholds, in increasing order. First one is -inf (i.e. no merge).
+            Results are the same for any threshold in-between two
+            consecutive ones.
+        purity, coverage, fscore : (n_thresholds, ) np.ndarray
+            Corresponding purity, coverage and F-score.
+        """
+
+        events = np.array(self.events_, dtype=np.float64).reshape(-1, 4)
+        events = events[np.argsort(events[:, 0], kind="stable")]
+
+        # only keep the last of merges sharing the same height
+        height = events[:, 0]
+        last = np.hstack([height[1:] != height[:-1], [True]])
+        cumulated = np.cumsum(events[:, 1:], axis=0)[last]
+        thresholds = np.hstack([[-np.inf], height[last]])
+        cumulated = np.vstack([np.zeros((1, 3)), cumulated])
+
+        purity_num = self.purity_[0] + cumulated[:, 0]
+        purity_den = self.purity_[1] + cumulated[:, 1]
+        coverage_num = self.coverage_[0] + cumulated[:, 2]
+        coverage_den = self.coverage_[1]
+
+        # same special cases as DiarizationPurityCoverageFMeasure
+        with np.errstate(divide="ignore", invalid="ignore"):
+            purity = np.where(purity_den == 0.0, 1.0, purity_num / purity_den)
+            if coverage_den == 0.0:
+                coverage = np.ones_like(purity)
+            else:
+                coverage = coverage_num / coverage_den
+            fscore = np.where(
+                purity + coverage == 0.0,
+                0.0,
+                (1 + beta * beta)
+                * purity
+                * coverage
+                / (beta * beta * purity + coverage),
+            )
+
+        return thresholds, purity, coverage, fscore
+
+    def best(
+        self, beta: float = 1.0, bounds: Tuple[float, float] = None
+    ) -> Tuple[float, float]:
+        """Get threshold with the best F-score
+
+        Parameters
+        ----------
+        beta : float, optional
+            See `compute_metrics`. Defaults to 1.
+        bounds : (float, float) tuple, optional
+            Only consider thresholds within those bounds.
+
+        Returns
+        -------
+        threshold : float
+            Best threshold (i.e. the smallest one leading to the best F-score).
+        fscore : float
+            Corresponding F-score.
+        """
+
+        thresholds, _, _, fscore = self.compute_metrics(beta=beta)
+
+        if bounds is not None:
+            lower, upper = bounds
+            # results at `lower` are those of the largest threshold below it
+            first = max(0, np.searchsorted(thresholds, lower, side="right") - 1)
+            thresholds = np.hstack([[lower], thresholds[first + 1 :]])
+            fscore = fscore[first:]
+            keep = thresholds <= upper
+            thresholds, fscore = thresholds[keep], fscore[keep]
+
+        # NaN F-scores (clusters with no evaluated duration) are ignored
+        i = np.argmax(np.where(np.isnan(fscore), -np.inf, fscore))
+        return float(thresholds[i]), float(fscore[i])
@@ -0,0 +1,157 @@
+import numpy as np
+import pytest
+
+from pyannote.core import Segment
+from pyannote.core import SlidingWindow
+from pyannote.core import SlidingWindowFeature
+from pyannote.core import Timeline
+
+from pyannote.audio.utils.signal import Binarize
+
+
+def binarize_loop(
+    predictions,
+    onset=0.5,
+    offset=0.5,
+    scale="absolute",
+    pad_onset=0.0,
+    pad_offset=0.0,
+    min_duration_on=0.0,
+    min_duration_off=0.0,
+):
+    """Frame-by-frame reference implementation of Binarize.apply"""
+
+    data = predictions.data[:, 0]
+    window = predictions.sliding_window
+    timestamps = [window[i].middle for i in range(len(data))]
+
+    if scale == "absolute":
+        mini, maxi = 0, 1
+    elif scale == "relative":
+        mini, maxi = np.nanmin(data), np.nanmax(data)
+    elif scale == "percentile":
+        mini, maxi = np.nanpercentile(data, 1), np.nanpercentile(data, 99)
+    onset = mini + onset * (maxi - mini)
+    offset = mini + offset * (maxi - mini)
+
+    start = timestamps[0]
+    label = data[0] > onset
+
+    active = Timeline()
+    for t, y in zip(timestamps[1:], data[1:]):
+        if label:
+            if y < offset:
+                active.add(Segment(start - pad_onset, t + pad_offset))
+                start = t
+                label = False
+        else:
+            if y > onset:
+                start = t
+                label = True
+
+    if label:
+        active.add(Segment(start - pad_onset, t + pad_offset))
+
+    active = active.support()
+    active = Timeline([s for s in active if s.duration > min_duration_on])
+    for s in active.gaps():
+        if s.duration < min_duration_off:
+            active.add(s)
+    return active.support()
+
+
+def random_case(rng, tie_free=False):
+    """Random scores and Binarize parameters
+
+    With `tie_free`, durations and paddings are chosen so that no region or gap
+    duration can ever be equal to `min_duration_on` or `min_duration_off`.
+    """
+
+    n_frames = int(rng.integers(2, 300))
+    data = rng.random(n_frames)
+    # plateaus make sure that ties are covered as well
+    if rng.random() < 0.3:
+        data = np.repeat(rng.random(n_frames // 5 + 1), 5)[:n_frames]
+
+    window = SlidingWindow(
+        start=rng.random() * 0.1,
+        duration=0.02 * int(rng.integers(1, 5)),
+        step=0.01 * int(rng.integers(1, 3)),
+    )
+    predictions = SlidingWindowFeature(data[:, np.newaxis], window)
+
+    if tie_free:
+        pads_onset, pads_offset = [0.0, 0.051, 0.203, -0.013], [0.0, 0.051, 0.203]
+        min_durations = [0.0, 0.055, 0.305]
+    else:
+        pads_onset, pads_offset = [0.0, 0.05, 0.2, -0.01], [0.0, 0.05, 0.2]
+        min_durations = [0.0, 0.05, 0.3]
+
+    params = {
+        "onset": rng.random(),
+        "offset": rng.random(),
+        "pad_onset": rng.choice(pads_onset),
+        "pad_offset": rng.choice(pads_offset),
+        "min_duration_on": rng.choice(min_durations),
+        "min_duration_off": rng.choice(min_durations),
+    }
+    return predictions, params
+
+
+@pytest.mark.parametrize("scale", ["absolute", "relative", "percentile"])
+def test_binarize_apply(scale):
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        predictions, params = random_case(rng)
+        expected = binarize_loop(predictions, scale=scale, **params)
+        actual = Binarize(scale=scale, **params).apply(predictions)
+        assert list(actual) == list(expected)
+
+
+@pytest.mark.parametrize("tie_free", [False, True])
+def test_binarize_partial_apply(tie_free):
+    rng = np.random.default_rng(1)
+    for _ in range(500):
+        predictions, params = random_case(rng, tie_free=tie_free)
+        data, window = predictions.data, predictions.sliding_window
+        n_frames = len(data)
+
+        # split scores into random blocks
+        n_cuts = min(n_frames - 1, int(rng.integers(0, 8)))
+        cuts = np.sort(rng.choice(np.arange(1, n_frames), size=n_cuts, replace=False))
+        edges = [0] + list(cuts) + [n_frames]
+
+        binarize = Binarize(**params)
+        speech = []
+        decided = -np.inf
+        for start, end in zip(edges[:-1], edges[1:]):
+            block = SlidingWindowFeature(
+                data[start:end],
+                SlidingWindow(
+                    start=window[start].start,
+                    duration=window.duration,
+                    step=window.step,
+                ),
+            )
+            regions = binarize.partial_apply(block)
+
+            # returned regions lie between previous and current decision time
+            for region in regions:
+                assert region.start >= decided - 1e-9
+                assert region.end <= binarize.decided + 1e-9
+            decided = binarize.decided
+            speech.extend(regions)
+        speech.extend(binarize.flush())
+
+        expected = Binarize(**params).apply(predictions)
+        actual = Timeline(speech).support()
+        assert list(actual) == list(expected)
+
+
+def test_binarize_partial_apply_gap():
+    window = SlidingWindow(start=0.0, duration=0.02, step=0.01)
+    binarize = Binarize()
+    binarize.partial_apply(SlidingWindowFeature(np.ones((10, 1)), window))
+    shifted = SlidingWindow(start=0.2, duration=0.02, step=0.01)
+    with pytest.raises(ValueError):
+        binarize.partial_apply(SlidingWindowFeature(np.ones((10, 1)), shifted))
@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+import torch
+
+from pyannote.core import SlidingWindow
+from pyannote.core import SlidingWindowFeature
+
+from pyannote.audio.train.model import Model
+from pyannote.audio.train.model import RESOLUTION_CHUNK
+from pyannote.audio.train.model import RESOLUTION_FRAME
+from pyannote.audio.train.model import _slide_stream
+
+
+class TinyModel(torch.nn.Module):
+    """Frame-level (or chunk-level) model, insensitive to batch composition"""
+
+    alignment = "center"
+    slide = Model.slide
+
+    def __init__(self, resolution=RESOLUTION_FRAME, dimension=2):
+        super().__init__()
+        self.resolution = resolution
+        self.dimension = dimension
+        self.weight = torch.nn.Parameter(torch.linspace(-1.0, 1.0, dimension))
+
+    def forward(self, X, return_intermediate=None):
+        y = torch.tanh(X[:, :, : self.dimension] * self.weight)
+        if self.resolution == RESOLUTION_CHUNK:
+            return y.mean(dim=1)
+        return y
+
+
+def slide_loop(model, features, sliding_window):
+    """Chunk-by-chunk reference implementation of Model.slide
+
+    This is how Model.slide used to work, except that output frames falling
+    outside of the output (e.g. negative indices, which used to be wrapped
+    around to the end of the output) are now ignored.
+    """
+
+    support = features.extent
+    if support.duration < sliding_window.duration:
+        chunks = [support]
+        fixed = support.duration
+    else:
+        chunks = list(sliding_window(support, align_last=True))
+        fixed = sliding_window.duration
+
+    fX = []
+    with torch.no_grad():
+        for chunk in chunks:
+            X = features.crop(chunk, mode="center", fixed=fixed)
+            fX.append(model(torch.tensor(X[np.newaxis], dtype=torch.float32))[0])
+    fX = np.stack([f.numpy() for f in fX])
+
+    if model.resolution == RESOLUTION_CHUNK:
+        return SlidingWindowFeature(fX, sliding_window)
+
+    resolution = features.sliding_window
+    n_frames = resolution.samples(chunks[-1].end, mode="center")
+    data = np.zeros((n_frames, model.dimension), dtype=np.float32)
+    k = np.zeros((n_frames, 1), dtype=np.int32)
+    for chunk, fX_ in zip(chunks, fX):
+        indices = resolution.crop(chunk, mode=model.alignment, fixed=fixed)
+        valid = (indices >= 0) & (indices < n_frames)
+        data[indices[valid]] += fX_[valid]
+        k[indices[valid]] += 1
+
+    return SlidingWindowFeature(data / np.maximum(k, 1), resolution)
+
+
+def random_features(rng):
+    """Random features, sometimes shorter than the sliding window"""
+
+    n_frames = int(rng.integers(1, 300))
+    window = SlidingWindow(
+        start=rng.choice([0.0, rng.random() * 0.05]), duration=0.025, step=0.01
+    )
+    data = rng.standard_normal((n_frames, 3)).astype(np.float32)
+    return SlidingWindowFeature(data, window)
+
+
+def assert_same(actual, expected):
+    assert actual.sliding_window.start == pytest.approx(expected.sliding_window.start)
+    assert actual.sliding_window.step == pytest.approx(expected.sliding_window.step)
+    assert actual.data.shape == expected.data.shape
+    np.testing.assert_allclose(actual.data, expected.data, rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize("resolution", [RESOLUTION_FRAME, RESOLUTION_CHUNK])
+def test_slide(resolution):
+    rng = np.random.default_rng(0)
+    model = TinyModel(resolution=resolution).eval()
+    for _ in range(50):
+        features = random_features(rng)
+        sliding_window = SlidingWindow(
+            duration=0.5, step=float(rng.choice([0.05, 0.125, 0.25]))
+        )
+        batch_size = int(rng.integers(1, 10))
+        expected = slide_loop(model, features, sliding_window)
+        actual = model.slide(
+            features, sliding_window, batch_size=batch_size, device="cpu"
+        )
+        assert_same(actual, expected)
+
+
+def test_slide_stream():
+    rng = np.random.default_rng(1)
+    models = [
+        TinyModel(resolution=RESOLUTION_FRAME).eval(),
+        TinyModel(resolution=RESOLUTION_CHUNK, dimension=3).eval(),
+    ]
+    sliding_window = SlidingWindow(duration=0.5, step=0.125)
+    for _ in range(10):
+        inputs = [(i, random_features(rng)) for i in range(int(rng.integers(1, 8)))]
+        outputs = list(
+            _slide_stream(models, inputs, sliding_window, batch_size=7, device="cpu")
+        )
+
+        # inputs are yielded in order, each of them with one output per model
+        assert [key for key, _ in outputs] == [key for key, _ in inputs]
+        for (_, features), (_, actual) in zip(inputs, outputs):
+            for model, actual_ in zip(models, actual):
+                expected = model.slide(features, sliding_window, device="cpu")
+                assert_same(actual_, expected)
@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+from scipy.cluster.hierarchy import fcluster
+from scipy.cluster.hierarchy import linkage
+
+from pyannote.core import Segment
+from pyannote.core import SlidingWindow
+from pyannote.core import SlidingWindowFeature
+from pyannote.core import Timeline
+from pyannote.metrics.detection import DetectionPrecisionRecallFMeasure
+
+from pyannote.audio.utils.signal import Binarize
+from pyannote.audio.utils.sweep import ClusteringThresholdSweep
+from pyannote.audio.utils.sweep import DetectionThresholdSweep
+
+
+def random_file(rng, cropped_uem=False):
+    """Random detection scores, reference and evaluated regions"""
+
+    n_frames = int(rng.integers(2, 200))
+    window = SlidingWindow(start=rng.random() * 0.05, duration=0.03, step=0.01)
+    # rounded scores make sure that ties are covered as well
+    scores = SlidingWindowFeature(
+        np.round(rng.random(n_frames), 2)[:, np.newaxis], window
+    )
+
+    duration = n_frames * window.step
+    starts = np.sort(rng.random(5) * duration)
+    reference = Timeline([Segment(s, s + rng.random() * 0.5) for s in starts])
+    reference = reference.support()
+
+    if cropped_uem:
+        uem = Timeline([Segment(0.1, 0.8 * duration)])
+    else:
+        uem = Timeline([Segment(0.0, duration + 1.0)])
+
+    return scores, reference, uem
+
+
+def test_detection_threshold_sweep():
+    rng = np.random.default_rng(0)
+    for trial in range(10):
+        files = [random_file(rng, cropped_uem=trial % 2) for _ in range(3)]
+
+        sweep = DetectionThresholdSweep()
+        for scores, reference, uem in files:
+            sweep.add(scores, reference, uem)
+        thresholds, precision, recall, fscore = sweep.compute_metrics()
+
+        for k, threshold in enumerate(thresholds):
+            metric = DetectionPrecisionRecallFMeasure(collar=0.0, skip_overlap=False)
+            binarize = Binarize(onset=threshold, offset=threshold)
+            for scores, reference, uem in files:
+                metric(
+                    reference.to_annotation(generator="string"),
+                    binarize.apply(scores).to_annotation(generator="string"),
+                    uem=uem,
+                )
+            expected = metric.compute_metrics()
+            np.testing.assert_allclose(
+                (precision[k], recall[k], fscore[k]), expected, atol=1e-9
+            )
+
+
+def random_dendrogram(rng):
+    """Random linkage matrix, co-occurrence matrix and present leaves"""
+
+    n_leaves, n_classes = int(rng.integers(2, 15)), int(rng.integers(1, 4))
+    X = rng.normal(size=(n_leaves, 4))
+    # "centroid" method leads to non-monotonic dendrograms
+    Z = linkage(X, method=rng.choice(["average", "centroid"]), metric="euclidean")
+
+    # every class and every leaf has a positive duration
+    cooccurrence = rng.random((n_classes, n_leaves))
+    cooccurrence *= rng.random((n_classes, n_leaves)) < 0.5
+    cooccurrence[np.arange(n_classes), rng.integers(0, n_leaves, n_classes)] += 1.0
+    cooccurrence[rng.integers(0, n_classes, n_leaves), np.arange(n_leaves)] += 1.0
+
+    present = rng.random(n_leaves) < 0.8
+    return Z, cooccurrence, present
+
+
+def purity_coverage(files, threshold, weighted):
+    """Purity and coverage of fcluster(Z, threshold, criterion="distance")"""
+
+    purity, coverage = np.zeros(2), np.zeros(2)
+    for Z, cooccurrence, present in files:
+        clusters = fcluster(Z, threshold, criterion="distance")
+        matrix = np.stack(
+            [cooccurrence[:, clusters == k].sum(axis=1) for k in np.unique(clusters)],
+            axis=1,
+        )
+        counted = [np.any(present[clusters == k]) for k in np.unique(clusters)]
+        if weighted:
+            purity += [np.sum(matrix.max(axis=0)[counted]), np.sum(matrix[:, counted])]
+            coverage += [np.sum(matrix.max(axis=1)), np.sum(matrix)]
+        else:
+            purity += [
+                np.sum((matrix.max(axis=0) / matrix.sum(axis=0))[counted]),
+                np.sum(counted),
+            ]
+            coverage += [np.sum(matrix.max(axis=1) / matrix.sum(axis=1)), len(matrix)]
+    return purity[0] / purity[1], coverage[0] / coverage[1]
+
+
+@pytest.mark.parametrize("weighted", [True, False])
+def test_clustering_threshold_sweep(weighted):
+    rng = np.random.default_rng(0)
+    for _ in range(30):
+        files = [random_dendrogram(rng) for _ in range(3)]
+
+        sweep = ClusteringThresholdSweep(weighted=weighted)
+        for Z, cooccurrence, present in files:
+            sweep.add(Z, cooccurrence, present=present)
+        thresholds, purity, coverage, _ = sweep.compute_metrics()
+
+        # results are the same for any threshold in-between consecutive ones
+        upper = np.hstack([thresholds[1:], [thresholds[-1] + 1.0]])
+        for k, threshold in enumerate(thresholds):
+            for t in [threshold, 0.5 * (max(threshold, 0.0) + upper[k])]:
+                if not np.isfinite(t):
+                    continue
+                expected = purity_coverage(files, t, weighted)
+                np.testing.assert_allclose(
+                    (purity[k], coverage[k]), expected, atol=1e-9
+                )